@@ -3,31 +3,398 @@
 يستخدم Flask لتقديم البيانات من قاعدة SQLite
 """
 
-import sqlite3
+import os
+import re
 import json
 import sys
+import argparse
+import hashlib
+import sqlite3
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timezone
 from pathlib import Path
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, has_request_context, jsonify, request, send_from_directory, stream_with_context
 from flask_cors import CORS
+from werkzeug.security import safe_join
+from werkzeug.serving import is_running_from_reloader
+
+from db_pool import ConnectionPool, DatabaseWatcher
+from payload_cache import PayloadCache
+from compression import CompressedEntry, CompressedStore, choose_encoding
+from prefetch import Prefetcher
+from ayah_index import load_ayah_index
+from divisions import load_divisions
+from serialization import FastJSONProvider, fetch_dicts, tuple_cursor
+import metrics
 
 # إضافة المسار الرئيسي
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+from scripts.arabic_normalize import normalize_arabic
+from scripts.dataset_stats import compute_stats, stats_payload
+from scripts import ndjson_export
+from scripts.font_subsets import DEFAULT_UNIT as FONT_SUBSET_UNIT
+
 app = Flask(__name__, static_folder='.')
+app.json = FastJSONProvider(app)
 CORS(app)
 
-DATABASE_PATH = Path(__file__).parent.parent / "quran_database.db"
+DATABASE_PATH = Path(os.environ.get(
+    'QURAN_DB_PATH', Path(__file__).parent.parent / "quran_database.db"
+))
+
+# سياسة المجمّع: thread (اتصال لكل خيط) أو request (اتصال لكل طلب)
+DB_POOL_POLICY = os.environ.get('QURAN_DB_POOL', 'thread')
+
+# مقاييس Prometheus على /metrics (معطلة افتراضياً: دون أي كلفة)
+METRICS_ENABLED = os.environ.get('QURAN_METRICS') == '1'
+
+# إحصائيات داخلية على /debug/caches (معطلة افتراضياً، ومفعّلة دائماً في خادم التطوير)
+DEBUG_ROUTES = os.environ.get('QURAN_DEBUG_ROUTES') == '1'
+
+db_pool = ConnectionPool(
+    DATABASE_PATH,
+    policy=DB_POOL_POLICY,
+    factory=metrics.TimedConnection if METRICS_ENABLED else sqlite3.Connection,
+)
+
+# ذاكرة الصفحات الجاهزة (بايتات JSON) - الحد بالميغابايت
+PAGE_CACHE_MB = int(os.environ.get('QURAN_PAGE_CACHE_MB', 64))
+
+page_cache = PayloadCache('pages', PAGE_CACHE_MB * 1024 * 1024)
+
+# طابور الجلب المسبق للصفحات المجاورة (0 للتعطيل)
+PREFETCH_QUEUE = int(os.environ.get('QURAN_PREFETCH_QUEUE', 64))
+
+# الاستجابات الجاهزة مع نسخها المضغوطة (gzip/brotli) - الحد بالميغابايت
+COMPRESSED_CACHE_MB = int(os.environ.get('QURAN_COMPRESSED_CACHE_MB', 128))
+
+compressed_store = CompressedStore(COMPRESSED_CACHE_MB * 1024 * 1024)
+
+# توقيتات السور كمصفوفات أعداد صحيحة - الحد بالميغابايت
+TIMINGS_CACHE_MB = int(os.environ.get('QURAN_TIMINGS_CACHE_MB', 16))
+
+timings_cache = PayloadCache('timings', TIMINGS_CACHE_MB * 1024 * 1024)
+
+# نتائج المقارنة بين الروايات (بايتات JSON) - الحد بالميغابايت
+COMPARE_CACHE_MB = int(os.environ.get('QURAN_COMPARE_CACHE_MB', 16))
+
+compare_cache = PayloadCache('compare', COMPARE_CACHE_MB * 1024 * 1024)
+
+# قوائم تشغيل الصفحات لكل قارئ (بايتات JSON) - الحد بالميغابايت
+PLAYLIST_CACHE_MB = int(os.environ.get('QURAN_PLAYLIST_CACHE_MB', 16))
+
+playlist_cache = PayloadCache('playlist', PLAYLIST_CACHE_MB * 1024 * 1024)
+
+# إبطال الاتصالات والذاكرة المؤقتة عند إعادة بناء قاعدة البيانات
+db_watcher = DatabaseWatcher(DATABASE_PATH)
+db_watcher.on_change(db_pool.invalidate)
+db_watcher.on_change(compressed_store.clear)
+db_watcher.on_change(timings_cache.clear)
+db_watcher.on_change(compare_cache.clear)
+db_watcher.on_change(playlist_cache.clear)
+
+# مخطط قاعدة البيانات (الجداول والأعمدة) - يُقرأ مرة واحدة
+_schema = {}
+db_watcher.on_change(_schema.clear)
+
+# مدة تخزين الاستجابات لدى العملاء والوسطاء بالثواني
+CACHE_MAX_AGE = int(os.environ.get('QURAN_CACHE_MAX_AGE', 86400))
+
+# إصدار البيانات (ETag) وتاريخ البناء - يُقرأ مرة واحدة
+_dataset = {}
+db_watcher.on_change(_dataset.clear)
+
+def cache_metrics():
+    """إحصائيات المجمّع والذاكرة المؤقتة لـ /metrics"""
+    caches = [page_cache.stats(), timings_cache.stats(), compare_cache.stats(),
+              playlist_cache.stats(), compressed_store.stats()]
+    pool = db_pool.stats()
+    families = [
+        ('quran_db_connections_opened_total', 'counter', 'SQLite connections opened by the pool',
+         [((('policy', pool['policy']),), pool['opened'])]),
+        ('quran_db_connections_acquired_total', 'counter', 'Connections handed out by the pool',
+         [((('policy', pool['policy']),), pool['acquired'])]),
+        ('quran_db_connections_open', 'gauge', 'SQLite connections currently held by the pool',
+         [((('policy', pool['policy']),), pool['open'])]),
+    ]
+    for name, kind, help in (
+        ('hits', 'counter', 'Cache hits'),
+        ('misses', 'counter', 'Cache misses'),
+        ('evictions', 'counter', 'Cache evictions'),
+        ('entries', 'gauge', 'Cached entries'),
+        ('bytes', 'gauge', 'Cached bytes'),
+    ):
+        suffix = '_total' if kind == 'counter' else ''
+        families.append((f'quran_cache_{name}{suffix}', kind, help,
+                         [((('cache', stats['name']),), stats[name]) for stats in caches]))
+    compressed = compressed_store.stats()
+    families.append(('quran_compression_ratio', 'gauge', 'Raw to encoded size ratio by encoding',
+                     [((('encoding', name),), ratio) for name, ratio in compressed['compression_ratio'].items()]))
+    families.append(('quran_compression_cpu_saved_seconds_total', 'counter',
+                     'Compression time avoided by serving stored encodings',
+                     [((), compressed['cpu_saved_seconds'])]))
+    prefetch = page_prefetcher.stats()
+    for name, kind, help in (
+        ('scheduled', 'counter', 'Adjacent pages queued for prefetch'),
+        ('dropped', 'counter', 'Prefetches dropped because the queue was full'),
+        ('completed', 'counter', 'Pages built in the background'),
+        ('hits', 'counter', 'Page requests served from a prefetched entry'),
+        ('queue', 'gauge', 'Prefetches waiting in the queue'),
+    ):
+        suffix = '_total' if kind == 'counter' else ''
+        families.append((f'quran_prefetch_{name}{suffix}', kind, help, [((), prefetch[name])]))
+    return families
+
+if METRICS_ENABLED:
+    # قبل باقي دوال before_request ليشمل زمن الطلب الرد بـ 304 والاستجابات المخزنة
+    metrics.install(app).collect(cache_metrics)
+
+@app.before_request
+def check_database():
+    """فحص تغيّر ملف قاعدة البيانات"""
+    db_watcher.check()
 
 def get_db():
-    """الحصول على اتصال بقاعدة البيانات"""
-    conn = sqlite3.connect(str(DATABASE_PATH))
-    conn.row_factory = sqlite3.Row
-    return conn
+    """الحصول على اتصال بقاعدة البيانات من المجمّع"""
+    if 'db' not in g:
+        g.db = db_pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exc):
+    """إعادة الاتصال إلى المجمّع بعد انتهاء الطلب"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        db_pool.release(conn)
 
 def dict_from_row(row):
     """تحويل صف قاعدة البيانات إلى قاموس"""
     return dict(zip(row.keys(), row))
 
+def table_columns(table, conn=None):
+    """أعمدة جدول (فارغة إذا لم يوجد) - لدعم قواعد البيانات غير المُرحّلة"""
+    columns = _schema.get(table)
+    if columns is None:
+        cursor = (conn or get_db()).execute(f'PRAGMA table_info({table})')
+        columns = _schema[table] = frozenset(row[1] for row in cursor.fetchall())
+    return columns
+
+def has_column(table, column, conn=None):
+    return column in table_columns(table, conn)
+
+def has_table(table, conn=None):
+    return bool(table_columns(table, conn))
+
+def json_bytes(obj):
+    """ترميز كائن بنفس مخرجات jsonify (لتخزينه جاهزاً)"""
+    return app.json.response(obj).get_data()
+
+def bytes_response(body):
+    """إرسال بايتات JSON جاهزة دون إعادة ترميز"""
+    return app.response_class(body, mimetype=app.json.mimetype)
+
+# ==================== التخزين المؤقت عبر HTTP ====================
+
+# إصدار شكل الاستجابات (تاريخ آخر تغيير، مع .2 لتغيير ثانٍ في نفس اليوم): يدخل في ETag
+# و Last-Modified ومفتاح الاستجابات المضغوطة، فيُحدَّث عند تغيير حقول أي استجابة
+# حتى لا يحصل العملاء والوسطاء على 304 لمحتوى بشكل قديم
+API_VERSION = '2026.10.18.2'
+
+API_CHANGED = datetime(*map(int, API_VERSION.split('.')[:3]), tzinfo=timezone.utc)
+
+def dataset_info():
+    """إصدار البيانات وتاريخ البناء من جدول metadata (أو بصمة الملف لقاعدة قديمة)"""
+    if not _dataset:
+        conn = db_pool.acquire()
+        try:
+            metadata = {}
+            if has_table('metadata', conn):
+                metadata = dict(conn.execute('SELECT key, value FROM metadata').fetchall())
+        finally:
+            db_pool.release(conn)
+        
+        version = metadata.get('dataset_version')
+        if version:
+            built_at = datetime.strptime(metadata['built_at'], '%Y-%m-%dT%H:%M:%SZ')
+            built_at = built_at.replace(tzinfo=timezone.utc)
+        else:
+            version = hashlib.sha256(repr(db_watcher.signature).encode()).hexdigest()[:16]
+            built_at = datetime.fromtimestamp(int(DATABASE_PATH.stat().st_mtime), timezone.utc)
+        _dataset.update(
+            version=version,
+            etag=f'{API_VERSION}-{version}',
+            last_modified=max(built_at, API_CHANGED),
+        )
+    return _dataset
+
+def is_cacheable_request():
+    # ?live=1 يطلب قراءة مباشرة من قاعدة البيانات: لا 304 ولا ذاكرة مؤقتة
+    return (request.method == 'GET' and request.path.startswith('/api/')
+            and request.args.get('live') != '1')
+
+@app.before_request
+def conditional_get():
+    """الرد بـ 304 إذا كانت نسخة العميل حديثة - دون أي استعلام"""
+    if not is_cacheable_request():
+        return None
+    
+    info = dataset_info()
+    if request.if_none_match:
+        # ETag يختلف حسب الترميز (gzip/br) لكن المحتوى نفسه: نُعيد الذي طابق
+        for etag in (info['etag'], *(f"{info['etag']}-{name}" for name in ('gzip', 'br'))):
+            if request.if_none_match.contains_weak(etag):
+                return not_modified(etag)
+    elif request.if_modified_since and request.if_modified_since >= info['last_modified']:
+        return not_modified(info['etag'])
+    return None
+
+def not_modified(etag):
+    """رد 304 بالـ ETag المطابق و Vary مثل رد 200 (حتى لا يخلط الوسطاء بين الترميزات)"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.after_request
+def cache_headers(response):
+    """ETag قوي و Last-Modified و Cache-Control مرتبطة بإصدار البيانات وشكل الاستجابات"""
+    if is_cacheable_request() and response.status_code in (200, 304):
+        info = dataset_info()
+        encoding = response.content_encoding
+        # رد 304 يحمل الـ ETag الذي طابق (not_modified)
+        if 'ETag' not in response.headers:
+            response.set_etag(f"{info['etag']}-{encoding}" if encoding else info['etag'])
+        response.last_modified = info['last_modified']
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE
+    return response
+
+# ==================== الضغط المسبق ====================
+
+# ترويسات لا تُخزَّن مع الاستجابة (تُحسب عند الإرسال)
+UNSTORED_HEADERS = {'content-type', 'content-length', 'content-encoding', 'vary'}
+
+# المسارات المتكررة التي تُخزَّن مع نسخها المضغوطة -> معاملات الاستعلام التي تقرؤها وقيمها الافتراضية
+# (بقية المسارات تُضغط بالمستوى السريع في كل طلب دون تخزين)
+COMPRESSED_ENDPOINTS = {
+    'get_page': {'riwayah': 'hafs'},
+    'get_surah_tafseer': {},
+    'get_surah_translation': {'lang': 'en'},
+    'get_font_subsets': {'unit': FONT_SUBSET_UNIT},
+    'get_page_font_subset': {'unit': FONT_SUBSET_UNIT},
+}
+
+def compressed_key():
+    """مفتاح الاستجابة في compressed_store (أو None لمسار لا يُخزَّن)
+
+    يُبنى من المسار ومعاملاته المعروفة فقط، فمعاملات الاستعلام الأخرى لا تُنشئ نسخاً جديدة
+    """
+    params = COMPRESSED_ENDPOINTS.get(request.endpoint)
+    if params is None:
+        return None
+    return (
+        request.endpoint,
+        tuple(sorted(request.view_args.items())),
+        tuple(request.args.get(name, default) for name, default in params.items()),
+        dataset_info()['etag'],
+    )
+
+def encode_response(response, key, entry):
+    """إرسال الترميز الأفضل الذي يقبله العميل من النسخ المخزنة"""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    body, encoding = compressed_store.body(key, entry, encoding)
+    response.set_data(body)
+    if encoding != 'identity':
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.before_request
+def serve_compressed():
+    """إرسال الاستجابة المخزنة مسبقاً دون تنفيذ المسار"""
+    if not is_cacheable_request():
+        return None
+    key = compressed_key()
+    entry = compressed_store.get(key) if key is not None else None
+    if entry is None:
+        return None
+    g.compressed_hit = True
+    response = app.response_class(mimetype=entry.mimetype, headers=entry.headers)
+    return encode_response(response, key, entry)
+
+@app.after_request
+def store_compressed(response):
+    """ضغط الاستجابة، وتخزينها مع نسخها المضغوطة للمسارات المتكررة (COMPRESSED_ENDPOINTS)"""
+    if (not is_cacheable_request() or response.status_code != 200 or response.is_streamed
+            or response.content_encoding or g.get('compressed_hit')):
+        return response
+    key = compressed_key()
+    raw = response.get_data()
+    if key is None or len(raw) < compressed_store.min_size:
+        # استجابة عابرة: ضغط سريع دون تخزين
+        return encode_response(response, None, CompressedEntry(raw, response.mimetype))
+    headers = [(name, value) for name, value in response.headers
+               if name.lower() not in UNSTORED_HEADERS]
+    entry = compressed_store.put(key, raw, response.mimetype, headers)
+    return encode_response(response, key, entry)
+
+def font_response(filename):
+    """إرسال ملف خط من النسخ المضغوطة المخزنة"""
+    path = safe_join(app.root_path, filename)
+    if path is None or not os.path.isfile(path):
+        return jsonify({'error': 'Font not found'}), 404
+    
+    st = os.stat(path)
+    key = ('font', filename, st.st_mtime_ns)
+    entry = compressed_store.get(key)
+    if entry is None:
+        with open(path, 'rb') as f:
+            entry = compressed_store.put(key, f.read(), 'font/ttf')
+    
+    response = encode_response(app.response_class(mimetype=entry.mimetype), key, entry)
+    encoding = response.content_encoding
+    etag = f'{st.st_mtime_ns:x}-{st.st_size:x}'
+    response.set_etag(f'{etag}-{encoding}' if encoding else etag)
+    response.last_modified = int(st.st_mtime)
+    response.cache_control.public = True
+    response.cache_control.max_age = CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+# أسماء الخطوط المجزأة تتضمن بصمة محتواها: لا تتغير أبداً فتُخزَّن لدى العميل سنة
+FONT_SUBSET_MAX_AGE = 365 * 24 * 3600
+FONT_MIMETYPES = {'.woff2': 'font/woff2', '.woff': 'font/woff'}
+
+def font_subset_response(filename):
+    """إرسال خط مجزأ (WOFF2 مضغوط أصلاً) مع Cache-Control: immutable"""
+    mimetype = FONT_MIMETYPES.get(os.path.splitext(filename)[1])
+    if mimetype is None:
+        return jsonify({'error': 'Font not found'}), 404
+    response = send_from_directory('.', filename, mimetype=mimetype, max_age=FONT_SUBSET_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+def cache_stats():
+    """إحصائيات الذاكرة المؤقتة والضغط والمجمّع"""
+    return jsonify({
+        'pool': db_pool.stats(),
+        'pages': page_cache.stats(),
+        'prefetch': page_prefetcher.stats(),
+        'compressed': compressed_store.stats(),
+        'lookup_tables': lookup_tables_size(),
+    })
+
+def register_debug_routes():
+    """تسجيل /debug/caches (لا تُعرض تفاصيل الخادم الداخلية في الإنتاج)"""
+    if 'cache_stats' not in app.view_functions:
+        app.add_url_rule('/debug/caches', view_func=cache_stats)
+
+if DEBUG_ROUTES:
+    register_debug_routes()
+
 # ==================== الصفحات الثابتة ====================
 
 @app.route('/')
@@ -36,6 +403,10 @@ def index():
 
 @app.route('/<path:filename>')
 def static_files(filename):
+    if filename.startswith('fonts/subsets/'):
+        return font_subset_response(filename)
+    if filename.startswith('fonts/') and filename.endswith('.ttf'):
+        return font_response(filename)
     return send_from_directory('.', filename)
 
 # ==================== API الروايات ====================
@@ -44,11 +415,9 @@ def static_files(filename):
 def get_riwayat():
     """الحصول على قائمة الروايات"""
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('SELECT * FROM riwayat')
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 @app.route('/api/riwayat/<key>')
 def get_riwayah(key):
@@ -57,7 +426,6 @@ def get_riwayah(key):
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM riwayat WHERE key = ?', (key,))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return jsonify(dict_from_row(row))
@@ -71,13 +439,11 @@ def get_surahs():
     riwayah = request.args.get('riwayah', 'hafs')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM surahs WHERE riwayah_key = ? ORDER BY number
     ''', (riwayah,))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 @app.route('/api/surahs/<int:number>')
 def get_surah(number):
@@ -90,7 +456,6 @@ def get_surah(number):
         SELECT * FROM surahs WHERE number = ? AND riwayah_key = ?
     ''', (number, riwayah))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return jsonify(dict_from_row(row))
@@ -106,7 +471,7 @@ def get_ayat():
     page = request.args.get('page')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     
     if sura:
         cursor.execute('''
@@ -121,9 +486,7 @@ def get_ayat():
             SELECT * FROM ayat WHERE riwayah_key = ? LIMIT 100
         ''', (riwayah,))
     
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 @app.route('/api/ayat/<int:sura>/<int:aya>')
 def get_ayah(sura, aya):
@@ -136,7 +499,6 @@ def get_ayah(sura, aya):
         SELECT * FROM ayat WHERE sura_no = ? AND aya_no = ? AND riwayah_key = ?
     ''', (sura, aya, riwayah))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return jsonify(dict_from_row(row))
@@ -144,22 +506,35 @@ def get_ayah(sura, aya):
 
 # ==================== API الأسطر (للعرض المطابق للمصحف) ====================
 
-@app.route('/api/lines')
-def get_lines():
-    """الحصول على الأسطر"""
-    riwayah = request.args.get('riwayah', 'hafs')
-    page = request.args.get('page', 1, type=int)
+LINE_COLUMNS = ('id', 'page', 'line_number', 'sura_no', 'sura_name', 'type', 'text', 'riwayah_key')
+
+def fetch_lines(conn, page, riwayah):
+    """أسطر صفحة مع أرقام آياتها كقائمة"""
+    if not has_column('lines', 'aya_first', conn):
+        return fetch_lines_legacy(conn.cursor(), page, riwayah)
     
-    conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
+    cursor.execute(f'''
+        SELECT {', '.join(LINE_COLUMNS)}, aya_first, aya_last
+        FROM lines WHERE page = ? AND riwayah_key = ? ORDER BY line_number
+    ''', (page, riwayah))
+    
+    lines = []
+    for row in cursor:
+        line = dict(zip(LINE_COLUMNS, row))
+        aya_first, aya_last = row[-2], row[-1]
+        line['aya_numbers'] = [] if aya_first is None else list(range(aya_first, aya_last + 1))
+        lines.append(line)
+    return lines
+
+def fetch_lines_legacy(cursor, page, riwayah):
+    """قراءة aya_numbers كنص JSON (قاعدة بيانات قبل الترحيل)"""
     cursor.execute('''
         SELECT * FROM lines WHERE page = ? AND riwayah_key = ? ORDER BY line_number
     ''', (page, riwayah))
-    rows = cursor.fetchall()
-    conn.close()
     
     lines = []
-    for row in rows:
+    for row in cursor.fetchall():
         line = dict_from_row(row)
         # تحويل aya_numbers من JSON string إلى list
         if line.get('aya_numbers'):
@@ -168,54 +543,239 @@ def get_lines():
             except:
                 line['aya_numbers'] = []
         lines.append(line)
+    return lines
+
+@app.route('/api/lines')
+def get_lines():
+    """الحصول على الأسطر"""
+    riwayah = request.args.get('riwayah', 'hafs')
+    page = request.args.get('page', 1, type=int)
     
-    return jsonify(lines)
+    return jsonify(fetch_lines(get_db(), page, riwayah))
 
-@app.route('/api/page/<int:page_num>')
-def get_page(page_num):
-    """الحصول على صفحة كاملة"""
+@app.route('/api/ayat/<int:sura>/<int:aya>/line')
+def get_ayah_line(sura, aya):
+    """السطر الذي تبدأ فيه الآية"""
     riwayah = request.args.get('riwayah', 'hafs')
     
-    conn = get_db()
-    cursor = conn.cursor()
+    if not has_column('lines', 'aya_first'):
+        return jsonify({'error': 'Database not migrated'}), 501
     
-    # الحصول على الأسطر
+    cursor = get_db().cursor()
     cursor.execute('''
-        SELECT * FROM lines WHERE page = ? AND riwayah_key = ? ORDER BY line_number
-    ''', (page_num, riwayah))
-    lines = cursor.fetchall()
-    
-    # الحصول على معلومات الصفحة
-    cursor.execute('''
-        SELECT DISTINCT sura_no, juz FROM ayat WHERE page = ? AND riwayah_key = ?
-    ''', (page_num, riwayah))
-    page_info = cursor.fetchall()
+        SELECT id, page, line_number, aya_first FROM lines
+        WHERE riwayah_key = ? AND sura_no = ? AND aya_last >= ?
+        ORDER BY aya_last, page, line_number
+        LIMIT 1
+    ''', (riwayah, sura, aya))
+    row = cursor.fetchone()
     
-    conn.close()
+    if row and row['aya_first'] <= aya:
+        return jsonify({
+            'sura_no': sura,
+            'aya_no': aya,
+            'riwayah': riwayah,
+            'line_id': row['id'],
+            'page': row['page'],
+            'line_number': row['line_number']
+        })
+    return jsonify({'error': 'Ayah not found'}), 404
+
+def build_page(conn, page_num, riwayah):
+    """بناء بيانات صفحة كاملة: الأسطر من قاعدة البيانات والسور والتقسيمات من فهرس التقسيمات"""
+    divisions = division_index().get(riwayah)
+    located = divisions.locate_page(page_num) if divisions else None
     
     result = {
         'page': page_num,
         'riwayah': riwayah,
-        'lines': [],
-        'suras': [],
-        'juz': None
+        'lines': fetch_lines(conn, page_num, riwayah),
+        'suras': located['suras'] if located else [],
     }
+    # التقسيم الذي تنتهي فيه الصفحة (بداية جزء أو حزب في وسطها تظهر في الصفحة)
+    for kind in ('juz', 'hizb', 'quarter'):
+        numbers = located[kind] if located else None
+        result[kind] = numbers[-1] if numbers else None
     
-    for line in lines:
-        line_dict = dict_from_row(line)
-        if line_dict.get('aya_numbers'):
-            try:
-                line_dict['aya_numbers'] = json.loads(line_dict['aya_numbers'])
-            except:
-                line_dict['aya_numbers'] = []
-        result['lines'].append(line_dict)
+    return result
+
+@app.route('/api/page/<int:page_num>')
+def get_page(page_num):
+    """الحصول على صفحة كاملة"""
+    riwayah = request.args.get('riwayah', 'hafs')
+    response = bytes_response(page_payload(page_num, riwayah))
     
-    for info in page_info:
-        result['suras'].append(info['sura_no'])
-        if info['juz']:
-            result['juz'] = info['juz']
+    # تلميح للعميل والوسطاء بجلب الصفحتين المجاورتين مبكراً
+    links = [f'</api/page/{n}?riwayah={riwayah}>; rel=prefetch'
+             for n in adjacent_pages(page_num, riwayah)]
+    if links:
+        response.headers['Link'] = ', '.join(links)
+    return response
+
+def page_payload(page_num, riwayah):
+    """بايتات JSON للصفحة من الذاكرة المؤقتة أو من قاعدة البيانات"""
+    key = (riwayah, page_num)
     
-    return jsonify(result)
+    body = page_cache.get(key)
+    if body is None:
+        result = build_page(get_db(), page_num, riwayah)
+        body = json_bytes(result)
+        # لا نخزن الصفحات غير الموجودة
+        if result['lines']:
+            page_cache.put(key, body)
+            page_prefetcher.schedule((riwayah, n) for n in adjacent_pages(page_num, riwayah))
+    elif page_prefetcher.consume(key):
+        # قراءة متتابعة: تجهيز الصفحة التي تلي الصفحة المجلوبة مسبقاً
+        page_prefetcher.schedule((riwayah, n) for n in adjacent_pages(page_num, riwayah))
+    
+    return body
+
+def riwayah_page_counts():
+    """عدد صفحات كل رواية - يُقرأ مرة واحدة"""
+    if not _page_counts:
+        conn = db_pool.acquire()
+        try:
+            rows = conn.execute('SELECT key, total_pages FROM riwayat').fetchall()
+        finally:
+            db_pool.release(conn)
+        _page_counts.update((key, total_pages or 0) for key, total_pages in rows)
+    return _page_counts
+
+def adjacent_pages(page_num, riwayah):
+    """الصفحتان التالية والسابقة ضمن صفحات الرواية"""
+    total = riwayah_page_counts().get(riwayah, 0)
+    return [n for n in (page_num + 1, page_num - 1) if 1 <= n <= total]
+
+def prefetch_page(key):
+    """بناء صفحة في خيط الجلب المسبق (باتصال من المجمّع خارج أي طلب)"""
+    riwayah, page_num = key
+    conn = db_pool.acquire()
+    try:
+        result = build_page(conn, page_num, riwayah)
+    finally:
+        db_pool.release(conn)
+    return json_bytes(result) if result['lines'] else None
+
+_page_counts = {}
+db_watcher.on_change(_page_counts.clear)
+
+def division_index():
+    """فهرس التقسيمات لكل رواية (الجزء والحزب والربع) - يُبنى مرة واحدة"""
+    if not _divisions:
+        conn = db_pool.acquire()
+        try:
+            divisions = load_divisions(conn)
+        finally:
+            db_pool.release(conn)
+        _divisions.update(divisions)
+    return _divisions
+
+_divisions = {}
+db_watcher.on_change(_divisions.clear)
+
+def ayah_index():
+    """الرقم التسلسلي للآيات وجداول البحث لكل رواية - تُبنى مرة واحدة"""
+    if not _ayah_index:
+        conn = db_pool.acquire()
+        try:
+            index = load_ayah_index(conn)
+        finally:
+            db_pool.release(conn)
+        _ayah_index.update(index)
+    return _ayah_index
+
+_ayah_index = {}
+db_watcher.on_change(_ayah_index.clear)
+
+def lookup_tables_size():
+    """ذاكرة فهارس البحث في الذاكرة بالبايت لكل رواية"""
+    return {
+        'ayah_index': {riwayah: index.nbytes() for riwayah, index in ayah_index().items()},
+        'divisions': {riwayah: divisions.nbytes() for riwayah, divisions in division_index().items()},
+    }
+
+page_prefetcher = Prefetcher(page_cache, prefetch_page, PREFETCH_QUEUE)
+
+@db_watcher.on_change
+def clear_pages():
+    """إهمال الجلب المسبق الجاري قبل إفراغ ذاكرة الصفحات (وإلا خزّن صفحة من الملف القديم بعد الإفراغ)"""
+    page_prefetcher.clear()
+    page_cache.clear()
+
+def prewarm_page_cache(riwayat=None):
+    """بناء جميع الصفحات مسبقاً في الذاكرة"""
+    conn = db_pool.acquire()
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT key, total_pages FROM riwayat')
+        count = 0
+        for key, total_pages in cursor.fetchall():
+            if riwayat and key not in riwayat:
+                continue
+            for page_num in range(1, (total_pages or 0) + 1):
+                result = build_page(conn, page_num, key)
+                if result['lines']:
+                    page_cache.put((key, page_num), json_bytes(result))
+                    count += 1
+    finally:
+        db_pool.release(conn)
+    return count
+
+# ==================== API الخطوط المجزأة ====================
+
+def font_subset_dict(row):
+    subset = dict_from_row(row)
+    subset['url'] = f"/fonts/subsets/{subset.pop('file')}"
+    return subset
+
+@app.route('/api/fonts/<riwayah>')
+def get_font_subsets(riwayah):
+    """خطوط الرواية المجزأة (ملف لكل جزء أو صفحة) بدل تحميل الخط الكامل"""
+    unit = request.args.get('unit', FONT_SUBSET_UNIT)
+    
+    conn = get_db()
+    row = conn.execute('SELECT font_file FROM riwayat WHERE key = ?', (riwayah,)).fetchone()
+    if row is None:
+        return jsonify({'error': 'Riwayah not found'}), 404
+    if not has_table('font_subsets', conn):
+        return jsonify({'error': 'Font subsets not built'}), 404
+    
+    rows = conn.execute('''
+        SELECT number, first_page, last_page, file, bytes, glyph_count
+        FROM font_subsets WHERE riwayah_key = ? AND unit = ? ORDER BY number
+    ''', (riwayah, unit)).fetchall()
+    if not rows:
+        return jsonify({'error': 'Font subsets not built'}), 404
+    
+    return jsonify({
+        'riwayah': riwayah,
+        'unit': unit,
+        'font': f"/fonts/{row['font_file']}",
+        'subsets': [font_subset_dict(r) for r in rows]
+    })
+
+@app.route('/api/fonts/<riwayah>/page/<int:page_num>')
+def get_page_font_subset(riwayah, page_num):
+    """الخط المجزأ الذي يغطي صفحة مع الحروف والرموز (glyphs) التي يحتويها"""
+    unit = request.args.get('unit', FONT_SUBSET_UNIT)
+    
+    conn = get_db()
+    if not has_table('font_subsets', conn):
+        return jsonify({'error': 'Font subsets not built'}), 404
+    
+    # الصفحة المشتركة بين جزأين يغطيها الخطان: نختار الأول
+    row = conn.execute('''
+        SELECT number, first_page, last_page, file, bytes, glyph_count, glyphs, codepoints
+        FROM font_subsets
+        WHERE riwayah_key = ? AND unit = ? AND first_page <= ? AND last_page >= ?
+        ORDER BY number LIMIT 1
+    ''', (riwayah, unit, page_num, page_num)).fetchone()
+    if row is None:
+        return jsonify({'error': 'Font subset not found'}), 404
+    
+    subset = font_subset_dict(row)
+    subset.update(riwayah=riwayah, unit=unit, page=page_num)
+    return jsonify(subset)
 
 # ==================== API الأجزاء ====================
 
@@ -225,13 +785,11 @@ def get_juzs():
     riwayah = request.args.get('riwayah', 'hafs')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM juzs WHERE riwayah_key = ? ORDER BY number
     ''', (riwayah,))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 # ==================== API الأحزاب ====================
 
@@ -241,13 +799,11 @@ def get_ahzab():
     riwayah = request.args.get('riwayah', 'hafs')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM ahzab WHERE riwayah_key = ? ORDER BY hizb_num
     ''', (riwayah,))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 @app.route('/api/quarters')
 def get_quarters():
@@ -255,13 +811,321 @@ def get_quarters():
     riwayah = request.args.get('riwayah', 'hafs')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM quarters WHERE riwayah_key = ? ORDER BY quarter_num
     ''', (riwayah,))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
+
+# ==================== API تحديد الموضع ====================
+
+@app.route('/api/locate')
+def locate():
+    """موضع آية (?ref=2:255 أو برقمها التسلسلي ?id=262) أو صفحة (?page=) من فهارس الذاكرة دون استعلام"""
+    riwayah = request.args.get('riwayah', 'hafs')
+    divisions = division_index().get(riwayah)
+    index = ayah_index().get(riwayah)
+    if divisions is None or index is None:
+        return jsonify({'error': 'Riwayah not found'}), 404
+    
+    if 'id' in request.args or 'ref' in request.args:
+        if 'id' in request.args:
+            ayah_id = request.args.get('id', type=int)
+            if ayah_id is None:
+                return jsonify({'error': "Invalid 'id'"}), 400
+        else:
+            try:
+                ayah_id = index.ayah_id(*parse_ayah_ref(request.args.get('ref'), 'ref'))
+            except RangeError as e:
+                return jsonify({'error': str(e)}), e.status
+        position = index.locate(ayah_id) if ayah_id else None
+        if position is None:
+            return jsonify({'error': 'Ayah not found'}), 404
+        return jsonify({'riwayah': riwayah, **position, **divisions.locate_ayah(*index.ref(ayah_id))})
+    
+    page = request.args.get('page', type=int)
+    if page is None:
+        return jsonify({'error': "Specify 'page', 'ref' or 'id'"}), 400
+    # الصفحة قد تحتوي أكثر من جزء أو حزب أو ربع: قوائم بالترتيب
+    located = divisions.locate_page(page)
+    if located is None:
+        return jsonify({'error': 'Page not found'}), 404
+    first_id, last_id = index.page_range(page)
+    return jsonify({'riwayah': riwayah, 'page': page, 'first_id': first_id, 'last_id': last_id, **located})
+
+# ==================== API النطاقات ====================
+
+# عدد الآيات المقروءة من قاعدة البيانات في كل دفعة أثناء البث
+RANGE_CHUNK_SIZE = 256
+
+# تقسيمات تُعرف ببدايتها فقط: النهاية هي بداية التقسيم التالي
+DIVISION_STARTS = {
+    'hizb': ('ahzab', 'hizb_num', 'start_sura', 'start_aya'),
+    'quarter': ('quarters', 'quarter_num', 'sura_no', 'aya_no'),
+}
+
+class RangeError(ValueError):
+    """نطاق غير صالح أو غير موجود"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def parse_ayah_ref(value, name):
+    """تحويل '2:142' إلى (2, 142)"""
+    sura, sep, aya = (value or '').partition(':')
+    if not sep or not sura.isdigit() or not aya.isdigit():
+        raise RangeError(f"Invalid '{name}': expected sura:aya")
+    return int(sura), int(aya)
+
+def resolve_range(conn, args, riwayah):
+    """حدود النطاق: (البداية، النهاية غير المشمولة أو None حتى آخر المصحف)"""
+    if 'juz' in args:
+        number = args.get('juz', type=int)
+        if number is None:
+            raise RangeError("Invalid 'juz'")
+        row = conn.execute('''
+            SELECT start_sura, start_aya, end_sura, end_aya FROM juzs
+            WHERE number = ? AND riwayah_key = ?
+        ''', (number, riwayah)).fetchone()
+        if row is None:
+            raise RangeError('Juz not found', 404)
+        return (row[0], row[1]), (row[2], row[3] + 1)
+
+    for name, (table, number_col, sura_col, aya_col) in DIVISION_STARTS.items():
+        if name not in args:
+            continue
+        number = args.get(name, type=int)
+        if number is None:
+            raise RangeError(f"Invalid '{name}'")
+        rows = conn.execute(f'''
+            SELECT {number_col}, {sura_col}, {aya_col} FROM {table}
+            WHERE {number_col} IN (?, ?) AND riwayah_key = ?
+            ORDER BY {number_col}
+        ''', (number, number + 1, riwayah)).fetchall()
+        if not rows or rows[0][0] != number:
+            raise RangeError(f'{name.capitalize()} not found', 404)
+        end = (rows[1][1], rows[1][2]) if len(rows) > 1 else None
+        return (rows[0][1], rows[0][2]), end
+
+    if 'from' not in args:
+        raise RangeError("Specify 'from' and 'to', 'juz', 'hizb' or 'quarter'")
+    start = parse_ayah_ref(args.get('from'), 'from')
+    if 'to' in args:
+        sura, aya = parse_ayah_ref(args.get('to'), 'to')
+        end = (sura, aya + 1)
+    else:
+        end = None
+    if end is not None and end <= start:
+        raise RangeError("'to' must not precede 'from'")
+    return start, end
+
+def iter_range_ayat(conn, riwayah, start, end):
+    """قراءة آيات النطاق على دفعات (ذاكرة ثابتة مهما كان طول النطاق)"""
+    sql = 'SELECT * FROM ayat WHERE riwayah_key = ? AND (sura_no, aya_no) >= (?, ?)'
+    params = [riwayah, *start]
+    if end is not None:
+        sql += ' AND (sura_no, aya_no) < (?, ?)'
+        params += end
+    cursor = tuple_cursor(conn).execute(sql + ' ORDER BY sura_no, aya_no', params)
+    columns = tuple(column[0] for column in cursor.description)
+    while True:
+        rows = cursor.fetchmany(RANGE_CHUNK_SIZE)
+        if not rows:
+            break
+        yield [dict(zip(columns, row)) for row in rows]
+
+def stream_json_range(chunks, riwayah):
+    """بث كائن JSON: الآيات أولاً ثم العدد والحدود الفعلية في النهاية"""
+    yield app.json.dumps_bytes({'riwayah': riwayah})[:-1] + b',"ayat":['
+    count = 0
+    first = last = None
+    for chunk in chunks:
+        body = b','.join(app.json.dumps_bytes(ayah) for ayah in chunk)
+        yield (b',' if count else b'') + body
+        if first is None:
+            first = chunk[0]
+        last = chunk[-1]
+        count += len(chunk)
+    bounds = {
+        'count': count,
+        'from': f"{first['sura_no']}:{first['aya_no']}" if first else None,
+        'to': f"{last['sura_no']}:{last['aya_no']}" if last else None,
+    }
+    yield b'],' + app.json.dumps_bytes(bounds)[1:]
+
+def stream_ndjson_range(chunks):
+    """بث آية واحدة في كل سطر"""
+    for chunk in chunks:
+        yield b''.join(app.json.dumps_bytes(ayah) + b'\n' for ayah in chunk)
+
+@app.route('/api/range')
+def get_range():
+    """بث آيات نطاق (من:إلى أو جزء أو حزب أو ربع) كـ JSON أو NDJSON"""
+    riwayah = request.args.get('riwayah', 'hafs')
+    output = request.args.get('format', 'json')
+    if output not in ('json', 'ndjson'):
+        return jsonify({'error': "format must be 'json' or 'ndjson'"}), 400
+
+    conn = get_db()
+    try:
+        start, end = resolve_range(conn, request.args, riwayah)
+    except RangeError as e:
+        return jsonify({'error': str(e)}), e.status
+
+    chunks = iter_range_ayat(conn, riwayah, start, end)
+    if output == 'ndjson':
+        body, mimetype = stream_ndjson_range(chunks), 'application/x-ndjson'
+    else:
+        body, mimetype = stream_json_range(chunks, riwayah), app.json.mimetype
+    return app.response_class(stream_with_context(body), mimetype=mimetype)
+
+# ==================== API المقارنة بين الروايات ====================
+
+# الحد الأدنى لنسبة التداخل (من الآية الأقصر) لاعتبار آيتين متقابلتين
+ALIGN_MIN_OVERLAP = 0.5
+
+class SuraAlignment:
+    """آيات سورة في كل الروايات مع مواضع كلماتها لمقابلة الآيات رغم اختلاف العدّ"""
+
+    def __init__(self, rows):
+        self.ayat = defaultdict(list)
+        self.starts = defaultdict(list)
+        self.words = {}
+        for row in rows:
+            riwayah = row['riwayah_key']
+            count = len(normalize_arabic(row['text_emlaey'] or row['text']).split())
+            self.starts[riwayah].append(self.words.get(riwayah, 0))
+            self.words[riwayah] = self.words.get(riwayah, 0) + count
+            self.ayat[riwayah].append(dict_from_row(row))
+
+    def find(self, riwayah, aya_no):
+        """موضع الآية في قائمة الرواية (أو None)"""
+        for i, ayah in enumerate(self.ayat.get(riwayah, ())):
+            if ayah['aya_no'] == aya_no:
+                return i
+        return None
+
+    def span(self, riwayah, index):
+        """مدى كلمات الآية كنسبة من كلمات السورة [بداية، نهاية)"""
+        total = self.words[riwayah] or 1
+        starts = self.starts[riwayah]
+        end = starts[index + 1] if index + 1 < len(starts) else self.words[riwayah]
+        return starts[index] / total, end / total
+
+    def align(self, ref, index, riwayah):
+        """آيات الرواية التي تقابل آية المرجع (قد تكون آية أو أكثر عند الدمج أو التقسيم)"""
+        ayat = self.ayat.get(riwayah)
+        if not ayat:
+            return []
+        if riwayah == ref:
+            return [ayat[index]]
+        start, end = self.span(ref, index)
+        matched, best, best_overlap = [], None, 0.0
+        for i in range(len(ayat)):
+            other_start, other_end = self.span(riwayah, i)
+            overlap = min(end, other_end) - max(start, other_start)
+            if overlap <= 0:
+                continue
+            if overlap > best_overlap:
+                best, best_overlap = i, overlap
+            if overlap >= ALIGN_MIN_OVERLAP * min(end - start, other_end - other_start):
+                matched.append(ayat[i])
+        return matched or ([ayat[best]] if best is not None else [])
+
+def sura_alignment(conn, sura):
+    """آيات السورة في كل الروايات باستعلام واحد على فهرس (sura_no, riwayah_key)"""
+    rows = conn.execute('''
+        SELECT * FROM ayat WHERE sura_no = ? ORDER BY riwayah_key, aya_no
+    ''', (sura,)).fetchall()
+    return SuraAlignment(rows)
+
+def compare_riwayat(conn, requested=None):
+    """الروايات المطلوبة بترتيب جدول الروايات"""
+    keys = [row[0] for row in conn.execute('SELECT key FROM riwayat ORDER BY id')]
+    if requested:
+        keys = [key for key in keys if key in requested]
+    return keys
+
+def compare_ayah(alignment, ref, index, riwayat):
+    """مقابلة آية من رواية المرجع في كل الروايات"""
+    ayah = alignment.ayat[ref][index]
+    result = {'sura_no': ayah['sura_no'], 'aya_no': ayah['aya_no'], 'riwayat': {}}
+    for riwayah in riwayat:
+        matched = alignment.align(ref, index, riwayah)
+        result['riwayat'][riwayah] = {
+            'ayat': matched,
+            'same_number': [a['aya_no'] for a in matched] == [ayah['aya_no']],
+        }
+    return result
+
+def numbering_differs(alignment, riwayat):
+    """هل يختلف عدد آيات السورة بين الروايات المطلوبة"""
+    return len({len(alignment.ayat.get(riwayah, ())) for riwayah in riwayat}) > 1
+
+def compare_request_args():
+    ref = request.args.get('ref', 'hafs')
+    requested = request.args.get('riwayat')
+    requested = tuple(sorted(r for r in requested.split(',') if r)) if requested else None
+    return ref, requested
+
+@app.route('/api/compare/<int:sura>/<int:aya>')
+def compare_ayah_route(sura, aya):
+    """نفس الآية في كل الروايات (الترقيم بحسب رواية المرجع ref)"""
+    ref, requested = compare_request_args()
+    key = ('ayah', sura, aya, ref, requested)
+    
+    body = compare_cache.get(key)
+    if body is None:
+        conn = get_db()
+        alignment = sura_alignment(conn, sura)
+        index = alignment.find(ref, aya)
+        if index is None:
+            return jsonify({'error': 'Ayah not found'}), 404
+        riwayat = compare_riwayat(conn, requested)
+        result = compare_ayah(alignment, ref, index, riwayat)
+        result['ref'] = ref
+        result['numbering_differs'] = numbering_differs(alignment, riwayat)
+        result['aya_counts'] = {r: len(alignment.ayat.get(r, ())) for r in riwayat}
+        body = json_bytes(result)
+        compare_cache.put(key, body)
+    
+    return bytes_response(body)
+
+@app.route('/api/compare/page/<int:page_num>')
+def compare_page_route(page_num):
+    """آيات صفحة من رواية المرجع مع ما يقابلها في كل الروايات"""
+    ref, requested = compare_request_args()
+    key = ('page', page_num, ref, requested)
+    
+    body = compare_cache.get(key)
+    if body is None:
+        conn = get_db()
+        page_ayat = conn.execute('''
+            SELECT sura_no, aya_no FROM ayat WHERE page = ? AND riwayah_key = ?
+            ORDER BY sura_no, aya_no
+        ''', (page_num, ref)).fetchall()
+        if not page_ayat:
+            return jsonify({'error': 'Page not found'}), 404
+        
+        riwayat = compare_riwayat(conn, requested)
+        alignments = {}
+        ayat = []
+        for sura, aya in page_ayat:
+            if sura not in alignments:
+                alignments[sura] = sura_alignment(conn, sura)
+            alignment = alignments[sura]
+            ayat.append(compare_ayah(alignment, ref, alignment.find(ref, aya), riwayat))
+        
+        body = json_bytes({
+            'page': page_num,
+            'ref': ref,
+            'numbering_differs': any(numbering_differs(a, riwayat) for a in alignments.values()),
+            'ayat': ayat,
+        })
+        compare_cache.put(key, body)
+    
+    return bytes_response(body)
 
 # ==================== API التفسير ====================
 
@@ -274,7 +1138,6 @@ def get_tafseer(sura, aya):
         SELECT * FROM tafseer WHERE sura_no = ? AND aya_no = ?
     ''', (sura, aya))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return jsonify(dict_from_row(row))
@@ -284,13 +1147,11 @@ def get_tafseer(sura, aya):
 def get_surah_tafseer(sura):
     """الحصول على تفسير سورة كاملة"""
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM tafseer WHERE sura_no = ? ORDER BY aya_no
     ''', (sura,))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 # ==================== API الترجمة ====================
 
@@ -305,7 +1166,6 @@ def get_translation(sura, aya):
         SELECT * FROM translations WHERE sura_no = ? AND aya_no = ? AND language = ?
     ''', (sura, aya, language))
     row = cursor.fetchone()
-    conn.close()
     
     if row:
         return jsonify(dict_from_row(row))
@@ -317,13 +1177,11 @@ def get_surah_translation(sura):
     language = request.args.get('lang', 'en')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     cursor.execute('''
         SELECT * FROM translations WHERE sura_no = ? AND language = ? ORDER BY aya_no
     ''', (sura, language))
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 # ==================== API القراء ====================
 
@@ -333,7 +1191,7 @@ def get_reciters():
     riwayah = request.args.get('riwayah')
     
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     
     if riwayah:
         cursor.execute('''
@@ -342,9 +1200,7 @@ def get_reciters():
     else:
         cursor.execute('SELECT * FROM reciters')
     
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    return jsonify(fetch_dicts(cursor))
 
 @app.route('/api/timings/<int:reciter_id>/<int:sura>')
 def get_timings(reciter_id, sura):
@@ -352,7 +1208,13 @@ def get_timings(reciter_id, sura):
     moshaf_id = request.args.get('moshaf_id', type=int)
     
     conn = get_db()
-    cursor = conn.cursor()
+    if request.args.get('format') == 'compact':
+        timings = load_timings(conn, reciter_id, sura, moshaf_id)
+        if timings is None:
+            return jsonify({'error': 'Timings not found'}), 404
+        return jsonify(compact_timings(reciter_id, sura, timings))
+    
+    cursor = tuple_cursor(conn)
     
     if moshaf_id:
         cursor.execute('''
@@ -366,13 +1228,217 @@ def get_timings(reciter_id, sura):
             WHERE reciter_id = ? AND sura_no = ?
             ORDER BY aya_no
         ''', (reciter_id, sura))
+
+    timings = fetch_dicts(cursor)
+    if not timings:
+        return jsonify({'error': 'Timings not found'}), 404
+    return jsonify(timings)
+
+def monotonic_timings(rows):
+    """صفوف (aya_no, start, end) ببدايات متزايدة تماماً: تُحذف الصفوف الناقصة أو ذات الطول الصفري أو المعكوس
+    (بعض التوقيتات المصدرية كذلك)، ثم تُرتب حسب البداية ولا يبقى من البدايات المتساوية إلا الأولى"""
+    valid = sorted(
+        (row for row in rows if None not in row[1:] and row[2] > row[1]),
+        key=lambda row: (row[1], row[0]),
+    )
+    return [row for i, row in enumerate(valid) if i == 0 or row[1] > valid[i - 1][1]]
+
+class SuraTimings:
+    """توقيتات سورة لقارئ ومصحف كمصفوفات متوازية ببدايات متزايدة تماماً (انظر monotonic_timings)"""
+
+    __slots__ = ('moshaf_id', 'aya_no', 'start_ms', 'end_ms')
+
+    def __init__(self, moshaf_id, rows):
+        rows = monotonic_timings(rows)
+        self.moshaf_id = moshaf_id
+        self.aya_no = array('i', (row[0] for row in rows))
+        self.start_ms = array('i', (row[1] for row in rows))
+        self.end_ms = array('i', (row[2] for row in rows))
+
+    def size(self):
+        return sum(a.itemsize * len(a) for a in (self.aya_no, self.start_ms, self.end_ms))
+
+    def index_at(self, ms):
+        """موضع الآية التي تُتلى عند ms (أو -1 قبل أول آية)"""
+        return bisect_right(self.start_ms, ms) - 1
+
+def load_timings(conn, reciter_id, sura, moshaf_id=None):
+    """توقيتات سورة من الذاكرة (تُبنى مرة واحدة من ayah_timings)"""
+    key = (reciter_id, moshaf_id, sura)
+    timings = timings_cache.get(key)
+    if timings is not None:
+        return timings
     
-    rows = cursor.fetchall()
-    conn.close()
-    return jsonify([dict_from_row(row) for row in rows])
+    if moshaf_id is None:
+        # دون مصحف محدد: أول مصحف للقارئ له توقيتات لهذه السورة
+        row = conn.execute('''
+            SELECT MIN(moshaf_id) FROM ayah_timings WHERE reciter_id = ? AND sura_no = ?
+        ''', (reciter_id, sura)).fetchone()
+        if row[0] is None:
+            return None
+        timings = load_timings(conn, reciter_id, sura, row[0])
+    else:
+        rows = conn.execute('''
+            SELECT aya_no, start_time, end_time FROM ayah_timings
+            WHERE reciter_id = ? AND moshaf_id = ? AND sura_no = ?
+            ORDER BY aya_no
+        ''', (reciter_id, moshaf_id, sura)).fetchall()
+        if not rows:
+            return None
+        timings = SuraTimings(moshaf_id, rows)
+    timings_cache.put(key, timings, timings.size())
+    return timings
+
+def prewarm_timings():
+    """تحميل توقيتات جميع القراء والسور في الذاكرة (بمصحف محدد ودونه)"""
+    conn = db_pool.acquire()
+    try:
+        rows = conn.execute('SELECT DISTINCT reciter_id, moshaf_id, sura_no FROM ayah_timings').fetchall()
+        for reciter_id, moshaf_id, sura in rows:
+            load_timings(conn, reciter_id, sura, moshaf_id)
+        for reciter_id, sura in sorted({(row[0], row[2]) for row in rows}):
+            load_timings(conn, reciter_id, sura)
+    finally:
+        db_pool.release(conn)
+    return len(rows)
+
+def delta_encode(values):
+    """القيمة الأولى كما هي ثم الفرق عن السابقة"""
+    previous = 0
+    deltas = []
+    for value in values:
+        deltas.append(value - previous)
+        previous = value
+    return deltas
+
+def compact_timings(reciter_id, sura, timings):
+    """صيغة مضغوطة: مصفوفات متوازية بترميز الفروق (المجموع التراكمي يعيد القيم)"""
+    return {
+        'reciter_id': reciter_id,
+        'moshaf_id': timings.moshaf_id,
+        'sura_no': sura,
+        'count': len(timings.aya_no),
+        'encoding': 'delta',
+        'aya_no': delta_encode(timings.aya_no),
+        'start_ms': delta_encode(timings.start_ms),
+        'end_ms': delta_encode(timings.end_ms),
+    }
+
+@app.route('/api/timings/<int:reciter_id>/<int:sura>/at')
+def get_timing_at(reciter_id, sura):
+    """الآية التي تُتلى عند لحظة معينة (بحث ثنائي في التوقيتات المخزنة)"""
+    ms = request.args.get('ms', type=int)
+    if ms is None:
+        return jsonify({'error': "Missing or invalid 'ms'"}), 400
+    
+    timings = load_timings(get_db(), reciter_id, sura, request.args.get('moshaf_id', type=int))
+    if timings is None:
+        return jsonify({'error': 'Timings not found'}), 404
+    
+    index = timings.index_at(ms)
+    result = {'reciter_id': reciter_id, 'moshaf_id': timings.moshaf_id, 'sura_no': sura, 'ms': ms}
+    if index < 0:
+        result.update(aya_no=None, start_ms=None, end_ms=None)
+    else:
+        result.update(
+            aya_no=timings.aya_no[index],
+            start_ms=timings.start_ms[index],
+            end_ms=timings.end_ms[index],
+        )
+    result['next_start_ms'] = timings.start_ms[index + 1] if index + 1 < len(timings.aya_no) else None
+    return jsonify(result)
+
+def audio_url(server_url, sura):
+    """رابط ملف السورة: server_url ثم رقم السورة بثلاث خانات (001.mp3)"""
+    return f'{server_url}{sura:03d}.mp3'
+
+def build_playlist(conn, page_num, riwayah, reciter_id, moshaf_id):
+    """مقاطع تلاوة الصفحة بالترتيب (أو None إذا لم يوجد القارئ أو التوقيتات)"""
+    # أول مصحف للقارئ (في الرواية إن حُددت) له توقيتات
+    conditions, params = ['r.reciter_id = ?'], [reciter_id]
+    if moshaf_id:
+        conditions.append('r.moshaf_id = ?')
+        params.append(moshaf_id)
+    if riwayah:
+        conditions.append('r.riwayah_key = ?')
+        params.append(riwayah)
+    reciter = conn.execute(f'''
+        SELECT r.moshaf_id, r.server_url, r.riwayah_key FROM reciters r
+        WHERE {' AND '.join(conditions)} AND EXISTS (
+            SELECT 1 FROM ayah_timings t WHERE t.reciter_id = r.reciter_id AND t.moshaf_id = r.moshaf_id
+        )
+        ORDER BY r.moshaf_id LIMIT 1
+    ''', params).fetchone()
+    if reciter is None or not reciter[1]:
+        return None
+    moshaf_id, server_url, riwayah = reciter
+    
+    # آيات الصفحة مع توقيتاتها؛ الآية 0 (الاستعاذة والبسملة) تسبق الآية الأولى من السورة.
+    # الترتيب بأعمدة ayat يبدأ من فهرس الصفحة (الترتيب بأعمدة التوقيتات يمسح كل توقيتات القارئ)،
+    # وفرز الصفوف القليلة بعده يضمن الآية 0 قبل الآية 1
+    rows = sorted(tuple_cursor(conn).execute('''
+        SELECT t.sura_no, t.aya_no, t.start_time, t.end_time
+        FROM ayat a
+        JOIN ayah_timings t ON t.reciter_id = ? AND t.moshaf_id = ? AND t.sura_no = a.sura_no
+         AND t.aya_no BETWEEN (CASE a.aya_no WHEN 1 THEN 0 ELSE a.aya_no END) AND a.aya_no
+        WHERE a.page = ? AND a.riwayah_key = ?
+        ORDER BY a.sura_no, a.aya_no
+    ''', (reciter_id, moshaf_id, page_num, riwayah)))
+    if not rows:
+        return None
+    
+    segments = [
+        {'url': audio_url(server_url, sura), 'sura_no': sura, 'aya_no': aya,
+         'start_ms': start, 'end_ms': end}
+        for sura, aya, start, end in rows
+    ]
+    return {
+        'page': page_num,
+        'riwayah': riwayah,
+        'reciter_id': reciter_id,
+        'moshaf_id': moshaf_id,
+        'count': len(segments),
+        'duration_ms': sum((s['end_ms'] or 0) - (s['start_ms'] or 0) for s in segments),
+        'segments': segments,
+    }
+
+@app.route('/api/playlist')
+def get_playlist():
+    """مقاطع تلاوة صفحة كاملة بالترتيب (عبر حدود السور) لقارئ ومصحف"""
+    page_num = request.args.get('page', type=int)
+    reciter_id = request.args.get('reciter', type=int)
+    if page_num is None or reciter_id is None:
+        return jsonify({'error': "Missing or invalid 'page' or 'reciter'"}), 400
+    riwayah = request.args.get('riwayah')
+    moshaf_id = request.args.get('moshaf', type=int)
+    key = (riwayah, page_num, reciter_id, moshaf_id)
+    
+    body = playlist_cache.get(key)
+    if body is None:
+        result = build_playlist(get_db(), page_num, riwayah, reciter_id, moshaf_id)
+        if result is None:
+            return jsonify({'error': 'Playlist not found'}), 404
+        body = json_bytes(result)
+        playlist_cache.put(key, body)
+    
+    return bytes_response(body)
 
 # ==================== API البحث ====================
 
+def fts_quote(value):
+    """وضع قيمة بين علامتي تنصيص لاستخدامها في تعبير FTS5"""
+    return '"' + value.replace('"', '""') + '"'
+
+def fts_expression(query):
+    """تحويل نص البحث إلى تعبير FTS5: "عبارة" للبحث بالعبارة و كلمة* للبادئة"""
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', query):
+        prefix = word.endswith('*')
+        text = normalize_arabic(phrase or word.rstrip('*'))
+        if text:
+            terms.append(fts_quote(text) + ('*' if prefix else ''))
+    return ' '.join(terms)
+
 @app.route('/api/search')
 def search():
     """البحث في القرآن"""
@@ -383,74 +1449,397 @@ def search():
     if not query or len(query) < 2:
         return jsonify({'error': 'Query too short'}), 400
     
+    # البحث في عدة روايات دفعة واحدة
+    if riwayah == 'all' or 'riwayat' in request.args:
+        return search_riwayat(query)
+    
     conn = get_db()
-    cursor = conn.cursor()
+    cursor = tuple_cursor(conn)
     
-    # البحث في النص الإملائي
-    cursor.execute('''
-        SELECT a.*, s.name_ar as sura_name 
-        FROM ayat a
-        JOIN surahs s ON a.sura_no = s.number AND a.riwayah_key = s.riwayah_key
-        WHERE a.text_emlaey LIKE ? AND a.riwayah_key = ?
-        LIMIT ?
-    ''', (f'%{query}%', riwayah, limit))
+    if has_table('ayat_fts'):
+        expression = fts_expression(query)
+        if not expression:
+            return jsonify({'error': 'Query too short'}), 400
+        
+        # البحث في الفهرس النصي مرتباً حسب bm25 (عمود الرواية للتصفية فقط)
+        cursor.execute('''
+            SELECT a.*, s.name_ar as sura_name 
+            FROM ayat_fts f
+            JOIN ayat a ON a.id = f.rowid
+            JOIN surahs s ON a.sura_no = s.number AND a.riwayah_key = s.riwayah_key
+            WHERE ayat_fts MATCH ?
+            ORDER BY bm25(ayat_fts, 1.0, 0.0)
+            LIMIT ?
+        ''', (f'text : ({expression}) AND riwayah : {fts_quote(riwayah)}', limit))
+    else:
+        # البحث في النص الإملائي
+        cursor.execute('''
+            SELECT a.*, s.name_ar as sura_name 
+            FROM ayat a
+            JOIN surahs s ON a.sura_no = s.number AND a.riwayah_key = s.riwayah_key
+            WHERE a.text_emlaey LIKE ? AND a.riwayah_key = ?
+            LIMIT ?
+        ''', (f'%{query}%', riwayah, limit))
+    
+    results = fetch_dicts(cursor)
     
+    return jsonify({
+        'query': query,
+        'count': len(results),
+        'results': results
+    })
+
+MAX_SEARCH_PER_PAGE = 100
+
+def search_riwayat(query):
+    """البحث في كل الروايات (أو مجموعة منها) بمرور واحد مع تجميع النتائج حسب الآية"""
+    riwayat = [key for key in request.args.get('riwayat', '').split(',') if key]
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_SEARCH_PER_PAGE)
+    
+    if has_table('ayat_fts'):
+        expression = fts_expression(query)
+        if not expression:
+            return jsonify({'error': 'Query too short'}), 400
+        match = f'text : ({expression})'
+        if riwayat:
+            match += ' AND riwayah : (' + ' OR '.join(fts_quote(key) for key in riwayat) + ')'
+        matches_sql = '''
+            SELECT a.sura_no, a.aya_no, a.riwayah_key, a.page, a.text, a.text_emlaey,
+                   bm25(ayat_fts, 1.0, 0.0) AS score
+            FROM ayat_fts f
+            JOIN ayat a ON a.id = f.rowid
+            WHERE ayat_fts MATCH ?
+        '''
+        params = [match]
+    else:
+        matches_sql = '''
+            SELECT a.sura_no, a.aya_no, a.riwayah_key, a.page, a.text, a.text_emlaey,
+                   0 AS score
+            FROM ayat a
+            WHERE a.text_emlaey LIKE ?
+        '''
+        params = [f'%{query}%']
+        if riwayat:
+            matches_sql += f" AND a.riwayah_key IN ({', '.join('?' * len(riwayat))})"
+            params += riwayat
+    
+    # المطابقات تُحسب مرة واحدة ثم تُجمّع حسب (السورة، الآية) وتُقسّم إلى صفحات
+    cursor = get_db().cursor()
+    cursor.execute(f'''
+        WITH matches AS MATERIALIZED ({matches_sql}),
+        groups AS (
+            SELECT sura_no, aya_no, MIN(score) AS score, COUNT(*) OVER () AS total
+            FROM matches
+            GROUP BY sura_no, aya_no
+            ORDER BY score, sura_no, aya_no
+            LIMIT ? OFFSET ?
+        )
+        SELECT g.total, m.sura_no, m.aya_no, m.riwayah_key, m.page, m.text, m.text_emlaey,
+               s.name_ar AS sura_name
+        FROM groups g
+        JOIN matches m ON m.sura_no = g.sura_no AND m.aya_no = g.aya_no
+        LEFT JOIN surahs s ON s.number = m.sura_no AND s.riwayah_key = m.riwayah_key
+        ORDER BY g.score, g.sura_no, g.aya_no, m.riwayah_key
+    ''', params + [per_page, (page - 1) * per_page])
     rows = cursor.fetchall()
-    conn.close()
+    
+    results = []
+    for row in rows:
+        if not results or (results[-1]['sura_no'], results[-1]['aya_no']) != (row['sura_no'], row['aya_no']):
+            results.append({
+                'sura_no': row['sura_no'],
+                'aya_no': row['aya_no'],
+                'sura_name': row['sura_name'],
+                'riwayat': [],
+                'matches': []
+            })
+        results[-1]['riwayat'].append(row['riwayah_key'])
+        results[-1]['matches'].append({
+            'riwayah': row['riwayah_key'],
+            'page': row['page'],
+            'text': row['text'],
+            'text_emlaey': row['text_emlaey']
+        })
     
     return jsonify({
         'query': query,
-        'count': len(rows),
-        'results': [dict_from_row(row) for row in rows]
+        'riwayat': riwayat or 'all',
+        'page': page,
+        'per_page': per_page,
+        'total': rows[0]['total'] if rows else 0,
+        'count': len(results),
+        'results': results
     })
 
-# ==================== API الإحصائيات ====================
+# ==================== API التوافق (مواضع الكلمات) ====================
 
-@app.route('/api/stats')
-def get_stats():
-    """الحصول على إحصائيات قاعدة البيانات"""
+MAX_CONCORDANCE_PER_PAGE = 500
+
+@app.route('/api/concordance')
+def concordance():
+    """كل مواضع كلمة في رواية من جدول الكلمات (word* لكل الكلمات التي تبدأ بها)"""
+    word = request.args.get('word', '')
+    riwayah = request.args.get('riwayah', 'hafs')
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 100, type=int), 1), MAX_CONCORDANCE_PER_PAGE)
+    
+    if not has_table('words'):
+        return jsonify({'error': 'Database not migrated'}), 501
+    
+    prefix = word.endswith('*')
+    normalized = normalize_arabic(word.rstrip('*'))
+    if not normalized or ' ' in normalized:
+        return jsonify({'error': 'Specify a single word'}), 400
+    
+    # البادئة مجال في الفهرس: كل الأشكال بين normalized و normalized + أكبر حرف
+    if prefix:
+        condition, params = 'w.normalized >= ? AND w.normalized < ?', [normalized, normalized + '\uffff']
+    else:
+        condition, params = 'w.normalized = ?', [normalized]
+    params.append(riwayah)
+    
     conn = get_db()
-    cursor = conn.cursor()
+    forms = fetch_dicts(tuple_cursor(conn).execute(f'''
+        SELECT w.normalized, COUNT(*) AS count FROM words w
+        WHERE {condition} AND w.riwayah_key = ?
+        GROUP BY w.normalized
+    ''', params))
+    
+    # نص الكلمة يُقتطع من الآية بمواضعها (substr يبدأ من 1)؛ دون INDEXED BY يفضّل المخطط
+    # المفتاح الأساسي (كل كلمات الرواية) لأن الفهرس لا يغطي أعمدة المواضع
+    occurrences = fetch_dicts(tuple_cursor(conn).execute(f'''
+        SELECT w.sura_no, w.aya_no, w.position, a.page, w.normalized,
+               substr(a.text, w.text_start + 1, w.text_end - w.text_start) AS text,
+               substr(a.text_emlaey, w.emlaey_start + 1, w.emlaey_end - w.emlaey_start) AS text_emlaey,
+               w.text_start, w.text_end, w.emlaey_start, w.emlaey_end
+        FROM words w INDEXED BY idx_words_normalized
+        JOIN ayat a ON a.sura_no = w.sura_no AND a.riwayah_key = w.riwayah_key AND a.aya_no = w.aya_no
+        WHERE {condition} AND w.riwayah_key = ?
+        ORDER BY w.normalized, w.sura_no, w.aya_no, w.position
+        LIMIT ? OFFSET ?
+    ''', params + [per_page, (page - 1) * per_page]))
+    
+    return jsonify({
+        'word': word,
+        'normalized': normalized,
+        'riwayah': riwayah,
+        'page': page,
+        'per_page': per_page,
+        'total': sum(form['count'] for form in forms),
+        'forms': forms,
+        'count': len(occurrences),
+        'occurrences': occurrences
+    })
+
+# ==================== API الطلبات المجمّعة ====================
+
+MAX_BATCH_SIZE = 100
+
+def values_clause(count, width=2):
+    """جزء VALUES لاستعلام (a, b) IN (VALUES ...)"""
+    row = '(' + ', '.join('?' * width) + ')'
+    return ', '.join([row] * count)
+
+def batch_fragment(status, data=None, error=None, raw=None):
+    """جزء JSON لنتيجة طلب فرعي (raw: بايتات جاهزة مثل الصفحات المخزنة)"""
+    if raw is None:
+        raw = json_bytes(data if error is None else {'error': error})
+    return b'{"data":' + raw.rstrip() + b',"status":' + str(status).encode() + b'}'
+
+def batch_ayat(conn, riwayah, refs):
+    cursor = tuple_cursor(conn).execute(f'''
+        SELECT * FROM ayat
+        WHERE riwayah_key = ? AND (sura_no, aya_no) IN (VALUES {values_clause(len(refs))})
+    ''', [riwayah] + [n for ref in refs for n in ref])
+    return {(ayah['sura_no'], ayah['aya_no']): ayah for ayah in fetch_dicts(cursor)}
+
+def batch_tafseer(conn, refs):
+    cursor = tuple_cursor(conn).execute(f'''
+        SELECT * FROM tafseer WHERE (sura_no, aya_no) IN (VALUES {values_clause(len(refs))})
+    ''', [n for ref in refs for n in ref])
+    result = {}
+    for row in fetch_dicts(cursor):
+        result.setdefault((row['sura_no'], row['aya_no']), row)
+    return result
+
+def batch_translations(conn, language, refs):
+    cursor = tuple_cursor(conn).execute(f'''
+        SELECT * FROM translations
+        WHERE language = ? AND (sura_no, aya_no) IN (VALUES {values_clause(len(refs))})
+    ''', [language] + [n for ref in refs for n in ref])
+    result = {}
+    for row in fetch_dicts(cursor):
+        result.setdefault((row['sura_no'], row['aya_no']), row)
+    return result
+
+def batch_timings(conn, reciter_id, moshaf_id, suras):
+    params = [reciter_id] + ([moshaf_id] if moshaf_id else []) + suras
+    cursor = tuple_cursor(conn).execute(f'''
+        SELECT * FROM ayah_timings
+        WHERE reciter_id = ? {'AND moshaf_id = ?' if moshaf_id else ''}
+          AND sura_no IN ({', '.join('?' * len(suras))})
+        ORDER BY sura_no, aya_no
+    ''', params)
+    result = {sura: [] for sura in suras}
+    for row in fetch_dicts(cursor):
+        result[row['sura_no']].append(row)
+    return result
+
+# نوع الطلب -> (مفتاح التجميع، المفتاح داخل المجموعة، رسالة عدم الوجود)
+# التوقيتات تُرجع قائمة (قد تكون فارغة) لكل سورة مثل /api/timings
+BATCH_TYPES = {
+    'ayah': (
+        lambda item: str(item.get('riwayah', 'hafs')),
+        lambda item: (int(item['sura']), int(item['aya'])),
+        'Ayah not found'
+    ),
+    'tafseer': (
+        lambda item: None,
+        lambda item: (int(item['sura']), int(item['aya'])),
+        'Tafseer not found'
+    ),
+    'translation': (
+        lambda item: str(item.get('lang', 'en')),
+        lambda item: (int(item['sura']), int(item['aya'])),
+        'Translation not found'
+    ),
+    'timings': (
+        lambda item: (int(item['reciter_id']), int(item['moshaf_id']) if item.get('moshaf_id') else None),
+        lambda item: int(item['sura']),
+        None
+    ),
+}
+
+def run_batch_group(conn, kind, group, keys):
+    """تنفيذ مجموعة طلبات فرعية من نفس النوع باستعلام واحد"""
+    keys = sorted(set(keys))
+    if kind == 'ayah':
+        return batch_ayat(conn, group, keys)
+    if kind == 'tafseer':
+        return batch_tafseer(conn, keys)
+    if kind == 'translation':
+        return batch_translations(conn, group, keys)
+    return batch_timings(conn, group[0], group[1], keys)
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """تنفيذ عدة طلبات (صفحات، آيات، تفسير، ترجمة، توقيتات) في طلب واحد"""
+    payload = request.get_json(silent=True)
+    items = payload.get('requests') if isinstance(payload, dict) else None
     
-    stats = {}
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected {"requests": [...]}'}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch too large (max {MAX_BATCH_SIZE})'}), 413
     
-    # عدد الروايات
-    cursor.execute('SELECT COUNT(*) FROM riwayat')
-    stats['riwayat_count'] = cursor.fetchone()[0]
+    conn = get_db()
+    parts = [None] * len(items)
+    groups = defaultdict(list)
     
-    # عدد الآيات الإجمالي
-    cursor.execute('SELECT COUNT(*) FROM ayat')
-    stats['total_ayat'] = cursor.fetchone()[0]
+    # التحقق من الطلبات الفرعية وتجميعها حسب النوع
+    for i, item in enumerate(items):
+        kind = item.get('type') if isinstance(item, dict) else None
+        try:
+            if kind == 'page':
+                page_num = int(item['page'])
+                parts[i] = batch_fragment(200, raw=page_payload(page_num, str(item.get('riwayah', 'hafs'))))
+            elif kind in BATCH_TYPES:
+                group_of, key_of, _ = BATCH_TYPES[kind]
+                # المفتاح والمجموعة أولاً حتى لا يُنشئ طلب غير صالح مجموعة فارغة
+                group, key = group_of(item), key_of(item)
+                groups[(kind, group)].append((i, key))
+            else:
+                parts[i] = batch_fragment(400, error=f'Unknown type: {kind}')
+        except (KeyError, TypeError, ValueError):
+            parts[i] = batch_fragment(400, error='Invalid request')
     
-    # عدد الأسطر
-    cursor.execute('SELECT COUNT(*) FROM lines')
-    stats['total_lines'] = cursor.fetchone()[0]
+    # استعلام واحد لكل مجموعة
+    for (kind, group), members in groups.items():
+        found = run_batch_group(conn, kind, group, [key for _, key in members])
+        not_found = BATCH_TYPES[kind][2]
+        for i, key in members:
+            if key in found:
+                parts[i] = batch_fragment(200, found[key])
+            else:
+                parts[i] = batch_fragment(404, error=not_found)
     
-    # عدد التفاسير
-    cursor.execute('SELECT COUNT(*) FROM tafseer')
-    stats['tafseer_count'] = cursor.fetchone()[0]
+    return bytes_response(b'{"responses":[' + b','.join(parts) + b']}\n')
+
+# ==================== API التصدير ====================
+
+@app.route('/api/export/<dataset>')
+def export_dataset(dataset):
+    """تصدير جدول كامل بصيغة NDJSON مع مؤشر للاستئناف"""
+    limit = request.args.get('limit', type=int)
     
-    # عدد الترجمات
-    cursor.execute('SELECT COUNT(*) FROM translations')
-    stats['translations_count'] = cursor.fetchone()[0]
+    if dataset not in ndjson_export.DATASETS:
+        return jsonify({'error': 'Unknown dataset', 'datasets': sorted(ndjson_export.DATASETS)}), 404
+    try:
+        dataset, after, riwayah = ndjson_export.resolve_request(
+            dataset, request.args.get('riwayah'), request.args.get('cursor'))
+    except ndjson_export.ExportError as e:
+        return jsonify({'error': str(e)}), 400
+    if limit is not None and limit < 1:
+        return jsonify({'error': 'limit must be positive'}), 400
+    
+    conn = get_db()
+    body = (
+        ndjson_export.dumps(row).encode('utf-8')
+        for row in ndjson_export.iter_rows(conn, dataset, after, riwayah, limit)
+    )
+    response = app.response_class(stream_with_context(body), mimetype='application/x-ndjson')
     
-    # عدد القراء
-    cursor.execute('SELECT COUNT(DISTINCT reciter_id) FROM reciters')
-    stats['reciters_count'] = cursor.fetchone()[0]
+    # مؤشر الصفحة التالية معروف مسبقاً من الفهرس (قبل بث الصفوف)
+    if limit is not None:
+        end = ndjson_export.page_end(conn, dataset, after, riwayah, limit)
+        if end is not None:
+            cursor = ndjson_export.encode_cursor(dataset, end, riwayah)
+            response.headers['X-Next-Cursor'] = cursor
+            response.headers['Link'] = f'<{request.path}?cursor={cursor}&limit={limit}>; rel="next"'
+    return response
+
+# ==================== API الإحصائيات ====================
+
+@app.route('/api/stats')
+def get_stats():
+    """الحصول على إحصائيات قاعدة البيانات"""
+    conn = get_db()
     
-    # عدد التوقيتات
-    cursor.execute('SELECT COUNT(*) FROM ayah_timings')
-    stats['timings_count'] = cursor.fetchone()[0]
+    # الجدول المحسوب عند البناء (استعلام واحد)، أو العدّ المباشر للتحقق ولقاعدة قديمة
+    if request.args.get('live') == '1' or not has_table('dataset_stats'):
+        rows = compute_stats(conn)
+    else:
+        rows = conn.execute('SELECT scope, key, name, value FROM dataset_stats').fetchall()
     
-    conn.close()
-    return jsonify(stats)
+    return jsonify(stats_payload(rows))
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="خادم API للقرآن الكريم متعدد الروايات")
+    parser.add_argument("--host", default="0.0.0.0", help="عنوان الاستماع")
+    parser.add_argument("--port", type=int, default=5000, help="المنفذ")
+    parser.add_argument(
+        "--prewarm",
+        action="store_true",
+        help="بناء صفحات جميع الروايات في الذاكرة قبل بدء الخدمة"
+    )
+    parser.add_argument(
+        "--page-cache-mb",
+        type=int,
+        default=PAGE_CACHE_MB,
+        help="الحد الأقصى لذاكرة الصفحات بالميغابايت"
+    )
+    return parser
 
 if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    page_cache.max_bytes = args.page_cache_mb * 1024 * 1024
+    
     print("=" * 60)
     print("خادم API للقرآن الكريم متعدد الروايات")
     print("=" * 60)
     print(f"\nقاعدة البيانات: {DATABASE_PATH}")
-    print(f"\nالرابط: http://localhost:5000")
+    print(f"\nالرابط: http://localhost:{args.port}")
     print("\nنقاط النهاية المتاحة:")
     print("  - GET /api/riwayat              - قائمة الروايات")
     print("  - GET /api/surahs               - قائمة السور")
@@ -461,7 +1850,15 @@ if __name__ == '__main__':
     print("  - GET /api/reciters             - القراء")
     print("  - GET /api/search?q=...         - البحث")
     print("  - GET /api/stats                - الإحصائيات")
+    print("  - GET /debug/caches             - إحصائيات الذاكرة المؤقتة (وضع التطوير)")
     print("\n" + "=" * 60)
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
-
+    register_debug_routes()
+    
+    # في وضع debug تعمل الخدمة في العملية الفرعية لأداة إعادة التحميل
+    if args.prewarm and is_running_from_reloader():
+        app.debug = True
+        count = prewarm_page_cache()
+        print(f"\n✓ تم تحميل {count} صفحة في الذاكرة ({page_cache.size / (1024 * 1024):.1f} MB)")
+    
+    app.run(host=args.host, port=args.port, debug=True)
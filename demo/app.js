@@ -103,13 +103,79 @@ const API = {
         return this.get('/stats');
     },
     
+    async getFonts(riwayah = state.currentRiwayah) {
+        return this.get(`/fonts/${riwayah}`);
+    },
+    
     async getTimings(reciterId, sura, moshafId) {
-        return this.get(`/timings/${reciterId}/${sura}?moshaf_id=${moshafId}`);
+        const data = await this.get(`/timings/${reciterId}/${sura}?moshaf_id=${moshafId}&format=compact`);
+        return data ? decodeTimings(data) : null;
     }
 };
 
+// فك الصيغة المضغوطة (مصفوفات بترميز الفروق) إلى قائمة توقيتات
+function decodeTimings(data) {
+    const timings = [];
+    let ayaNo = 0, start = 0, end = 0;
+    for (let i = 0; i < data.count; i++) {
+        ayaNo += data.aya_no[i];
+        start += data.start_ms[i];
+        end += data.end_ms[i];
+        // البحث الثنائي يفترض بدايات متزايدة تماماً
+        if (timings.length && start <= timings[timings.length - 1].start_time) continue;
+        timings.push({ aya_no: ayaNo, start_time: start, end_time: end });
+    }
+    return timings;
+}
+
+// موضع آخر توقيت يبدأ قبل currentMs (بحث ثنائي؛ الخادم يرسل البدايات متزايدة تماماً - monotonic_timings)
+function findTimingIndex(timings, currentMs) {
+    let low = 0, high = timings.length - 1, found = -1;
+    while (low <= high) {
+        const mid = (low + high) >> 1;
+        if (timings[mid].start_time <= currentMs) {
+            found = mid;
+            low = mid + 1;
+        } else {
+            high = mid - 1;
+        }
+    }
+    return found;
+}
+
 // ==================== Rendering Functions ====================
 
+// ==================== الخطوط المجزأة ====================
+
+// قائمة الخطوط المجزأة لكل رواية والخطوط المحمّلة (وعود حتى لا تُطلب مرتين)
+const subsetFonts = { manifests: {}, faces: {} };
+
+function fullFontFamily(riwayah) {
+    return `Uthmanic_${riwayah.charAt(0).toUpperCase()}${riwayah.slice(1)}`;
+}
+
+// تحميل الخط المجزأ الذي يغطي الصفحة (بضع عشرات KB بدل الخط الكامل)
+async function loadPageFont(pageNum, riwayah = state.currentRiwayah) {
+    if (!(riwayah in subsetFonts.manifests)) {
+        subsetFonts.manifests[riwayah] = API.getFonts(riwayah);
+    }
+    const manifest = await subsetFonts.manifests[riwayah];
+    const subset = manifest && manifest.subsets.find(
+        s => pageNum >= s.first_page && pageNum <= s.last_page
+    );
+    if (!subset) return null;
+    
+    // الأجزاء التي تشترك في ملف واحد تشترك في نفس الخط
+    const family = `${fullFontFamily(riwayah)}_${subset.url.split('/').pop().split('.')[0]}`;
+    if (!(family in subsetFonts.faces)) {
+        const face = new FontFace(family, `url(${subset.url})`);
+        subsetFonts.faces[family] = face.load()
+            .then(loaded => { document.fonts.add(loaded); return true; })
+            .catch(() => false);
+    }
+    return (await subsetFonts.faces[family]) ? family : null;
+}
+
 async function loadPage(pageNum) {
     state.currentPage = pageNum;
     elements.pageInput.value = pageNum;
@@ -117,8 +183,11 @@ async function loadPage(pageNum) {
     // عرض التحميل
     elements.mushafContent.innerHTML = '<div class="loading">جاري التحميل...</div>';
     
-    // تحميل الصفحة
-    const pageData = await API.getPage(pageNum);
+    // تحميل الصفحة وخطها المجزأ معاً
+    const [pageData, fontFamily] = await Promise.all([
+        API.getPage(pageNum),
+        loadPageFont(pageNum)
+    ]);
     
     if (!pageData || !pageData.lines) {
         elements.mushafContent.innerHTML = '<div class="loading">خطأ في تحميل الصفحة</div>';
@@ -129,12 +198,16 @@ async function loadPage(pageNum) {
     updatePageInfo(pageData);
     
     // عرض الأسطر
-    renderLines(pageData.lines);
+    renderLines(pageData.lines, fontFamily);
 }
 
-function renderLines(lines) {
+function renderLines(lines, fontFamily = null) {
     elements.mushafContent.innerHTML = '';
     elements.mushafContent.className = `mushaf-content ${state.currentRiwayah}`;
+    // الخط الكامل احتياطي فقط: لا يُحمَّل ما دام الخط المجزأ يغطي كل حروف الصفحة
+    elements.mushafContent.style.fontFamily = fontFamily
+        ? `'${fontFamily}', '${fullFontFamily(state.currentRiwayah)}', serif`
+        : '';
     
     // التأكد من وجود 15 سطر
     const displayLines = [...lines];
@@ -188,10 +261,11 @@ async function updatePageInfo(pageData) {
     // تحديث الجزء
     if (pageData.juz) {
         elements.pageInfoJuz.textContent = `الجزء ${pageData.juz}`;
-        
-        // حساب الحزب
-        const hizb = Math.ceil((pageData.juz * 2) - (state.currentPage > 300 ? 0 : 1));
-        elements.pageInfoHizb.textContent = `الحزب ${Math.min(hizb, 60)}`;
+    }
+    
+    // الحزب من فهرس التقسيمات في الخادم
+    if (pageData.hizb) {
+        elements.pageInfoHizb.textContent = `الحزب ${pageData.hizb}`;
     }
 }
 
@@ -557,16 +631,10 @@ function handleTimeUpdate() {
     elements.currentTime.textContent = formatTime(state.audio.currentTime);
     
     // تحديد الآية الحالية من التوقيتات
-    if (state.ayahTimings.length > 0) {
-        for (let i = state.ayahTimings.length - 1; i >= 0; i--) {
-            if (currentMs >= state.ayahTimings[i].start_time) {
-                if (state.currentAyah !== state.ayahTimings[i].aya_no) {
-                    state.currentAyah = state.ayahTimings[i].aya_no;
-                    highlightCurrentAyah();
-                }
-                break;
-            }
-        }
+    const index = findTimingIndex(state.ayahTimings, currentMs);
+    if (index >= 0 && state.currentAyah !== state.ayahTimings[index].aya_no) {
+        state.currentAyah = state.ayahTimings[index].aya_no;
+        highlightCurrentAyah();
     }
 }
 
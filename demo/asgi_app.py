@@ -0,0 +1,208 @@
+"""
+وضع ASGI لخادم API
+يعرض نفس مسارات Flask ويشغّل عمل قاعدة البيانات على مجموعة خيوط محدودة
+
+التشغيل:
+    cd demo
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import io
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import api_server
+
+# عدد الخيوط التي تنفّذ الطلبات (اتصال SQLite واحد لكل خيط)
+ASGI_THREADS = int(os.environ.get('QURAN_ASGI_THREADS', 8))
+# الحد الأقصى للطلبات المنتظرة قبل الرفض بـ 503
+ASGI_MAX_PENDING = int(os.environ.get('QURAN_ASGI_MAX_PENDING', 256))
+# عدد أجزاء الاستجابة المخزنة قبل إيقاف الخيط مؤقتاً (ضغط عكسي)
+STREAM_BUFFER = 16
+
+_END = object()
+
+
+def build_environ(scope, body):
+    """تحويل نطاق ASGI إلى بيئة WSGI"""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    path = scope.get('raw_path') or scope['path'].encode('utf-8')
+    root_path = scope.get('root_path', '').encode('utf-8')
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.decode('latin-1'),
+        'PATH_INFO': path.split(b'?', 1)[0].decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+        elif name == 'CONTENT_LENGTH':
+            environ['CONTENT_LENGTH'] = value
+        else:
+            key = f'HTTP_{name}'
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+class AsgiAdapter:
+    """تشغيل تطبيق WSGI تحت خادم ASGI مع حد للتزامن"""
+
+    def __init__(self, wsgi_app, threads=ASGI_THREADS, max_pending=ASGI_MAX_PENDING):
+        self.wsgi_app = wsgi_app
+        self.threads = threads
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='quran-asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if os.environ.get('QURAN_PREWARM') == '1':
+                    loop = asyncio.get_running_loop()
+                    await loop.run_in_executor(self.executor, api_server.prewarm_page_cache)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                api_server.db_pool.close_all()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        if self.pending >= self.max_pending:
+            await send_error(send, 503, b'Server busy')
+            return
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=STREAM_BUFFER)
+        environ = build_environ(scope, body)
+
+        self.pending += 1
+        closed = []
+        try:
+            future = loop.run_in_executor(self.executor, self.run_wsgi, environ, queue, loop, closed)
+            started = False
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is _END:
+                        break
+                    if isinstance(item, tuple):
+                        status, headers, body = item
+                        await send({
+                            'type': 'http.response.start',
+                            'status': int(status.split(' ', 1)[0]),
+                            'headers': [
+                                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                                for name, value in headers
+                            ],
+                        })
+                        started = True
+                        if body is not None:
+                            # استجابة كاملة (غير متدفقة)
+                            await send({'type': 'http.response.body', 'body': body})
+                            started = False
+                            break
+                    elif item:
+                        await send({'type': 'http.response.body', 'body': item, 'more_body': True})
+            except BaseException:
+                # انقطع العميل: إيقاف الخيط وتفريغ ما ينتظره
+                closed.append(True)
+                while not queue.empty():
+                    queue.get_nowait()
+                raise
+            await future
+            if started:
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            self.pending -= 1
+
+    def run_wsgi(self, environ, queue, loop, closed):
+        """تنفيذ تطبيق WSGI في خيط وإرسال الأجزاء إلى حلقة الأحداث"""
+        def put(item):
+            if closed:
+                raise ConnectionAbortedError('client disconnected')
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        response = []
+
+        def start_response(status, headers, exc_info=None):
+            response[:] = [status, headers]
+
+        streaming = False
+        delivered = False
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                # Flask يُرجع دائماً مكرّراً (ClosingIterator) لا قائمة: قراءة جزأين مسبقاً تكشف
+                # الاستجابة ذات الجزء الواحد (أغلب الاستجابات) فتُرسل بانتقال واحد إلى حلقة الأحداث
+                chunks = iter(result)
+                first = next(chunks, b'')
+                second = next(chunks, _END)
+                if second is _END:
+                    loop.call_soon_threadsafe(queue.put_nowait, (response[0], response[1], first))
+                    delivered = True
+                    return
+                streaming = True
+                put((response[0], response[1], None))
+                put(first)
+                put(second)
+                for chunk in chunks:
+                    put(chunk)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            if streaming:
+                if not closed:
+                    put(_END)
+            elif not delivered:
+                # خطأ قبل الاستجابة: إنهاء الانتظار ثم يُرفع الاستثناء من future
+                loop.call_soon_threadsafe(queue.put_nowait, _END)
+
+
+async def send_error(send, status, body):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'text/plain'), (b'content-length', str(len(body)).encode())],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+app = AsgiAdapter(api_server.app)
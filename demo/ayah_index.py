@@ -0,0 +1,101 @@
+"""
+الرقم التسلسلي للآيات وجداول البحث في الذاكرة لكل رواية
+كل آية تأخذ رقماً من 1 إلى عدد آيات الرواية بترتيب المصحف، وتُحفظ خصائصها في مصفوفات (array)
+مفهرسة بهذا الرقم: السورة والآية والصفحة والجزء والسطر، مع جدول بدايات السور وحدود الصفحات،
+فالانتقال بين الآية ورقمها وصفحتها والآية التالية أو السابقة عملية حسابية دون أي استعلام
+"""
+
+from array import array
+from collections import defaultdict
+
+
+class RiwayahAyahIndex:
+    """جداول رقم الآية لرواية واحدة (الموضع 0 في كل مصفوفة غير مستخدم)"""
+
+    __slots__ = ('sura_offset', 'sura', 'aya', 'page', 'juz', 'line', 'page_first', 'page_last')
+
+    def __init__(self, rows):
+        """rows: (sura_no, aya_no, page, juz, line_start) مرتبة حسب السورة ثم الآية"""
+        self.sura = array('B', [0])
+        self.aya = array('H', [0])
+        self.page = array('H', [0])
+        self.juz = array('B', [0])
+        self.line = array('B', [0])
+        for sura, aya, page, juz, line in rows:
+            self.sura.append(sura)
+            self.aya.append(aya)
+            self.page.append(page or 0)
+            self.juz.append(juz or 0)
+            self.line.append(line or 0)
+
+        # السورة -> رقم آخر آية قبلها: رقم الآية = sura_offset[السورة] + رقمها في السورة،
+        # وعدد آيات السورة = sura_offset[السورة + 1] - sura_offset[السورة]
+        # (آيات كل سورة متتالية من 1 في كل الروايات)
+        suras = max(self.sura, default=0)
+        counts = [0] * (suras + 2)
+        for sura in self.sura[1:]:
+            counts[sura] += 1
+        self.sura_offset = array('H', [0]) * (suras + 2)
+        for sura in range(1, suras + 1):
+            self.sura_offset[sura + 1] = self.sura_offset[sura] + counts[sura]
+
+        # الصفحة -> رقم أول آية وآخر آية فيها (0 لصفحة دون آيات)
+        size = max(self.page, default=0) + 1
+        self.page_first = array('H', [0]) * size
+        self.page_last = array('H', [0]) * size
+        for ayah_id in range(1, len(self.page)):
+            page = self.page[ayah_id]
+            if not self.page_first[page]:
+                self.page_first[page] = ayah_id
+            self.page_last[page] = ayah_id
+
+    def __len__(self):
+        return len(self.sura) - 1
+
+    def ayah_id(self, sura, aya):
+        """رقم الآية التسلسلي (أو None إذا لم تكن في الرواية)"""
+        if not 0 < sura < len(self.sura_offset) - 1:
+            return None
+        ayah_id = self.sura_offset[sura] + aya
+        return ayah_id if 0 < aya and ayah_id <= self.sura_offset[sura + 1] else None
+
+    def ref(self, ayah_id):
+        """(السورة، الآية) لرقم تسلسلي"""
+        return self.sura[ayah_id], self.aya[ayah_id]
+
+    def locate(self, ayah_id):
+        """موضع الآية في المصحف (أو None لرقم خارج الرواية)"""
+        if not 0 < ayah_id <= len(self):
+            return None
+        return {
+            'id': ayah_id,
+            'ref': f'{self.sura[ayah_id]}:{self.aya[ayah_id]}',
+            'page': self.page[ayah_id],
+            'juz': self.juz[ayah_id],
+            'line': self.line[ayah_id],
+            # الآية السابقة والتالية عبر حدود السور
+            'prev': ayah_id - 1 if ayah_id > 1 else None,
+            'next': ayah_id + 1 if ayah_id < len(self) else None,
+        }
+
+    def page_range(self, page):
+        """(رقم أول آية، رقم آخر آية) في الصفحة (أو None)"""
+        if not 0 < page < len(self.page_first) or not self.page_first[page]:
+            return None
+        return self.page_first[page], self.page_last[page]
+
+    def nbytes(self):
+        arrays = [self.sura_offset, self.sura, self.aya, self.page, self.juz, self.line,
+                  self.page_first, self.page_last]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+def load_ayah_index(conn):
+    """{الرواية: RiwayahAyahIndex} باستعلام واحد على جدول الآيات بترتيب المصحف"""
+    rows = defaultdict(list)
+    for riwayah, *row in conn.execute('''
+        SELECT riwayah_key, sura_no, aya_no, page, juz, line_start FROM ayat
+        ORDER BY riwayah_key, sura_no, aya_no
+    '''):
+        rows[riwayah].append(row)
+    return {riwayah: RiwayahAyahIndex(ayat) for riwayah, ayat in rows.items()}
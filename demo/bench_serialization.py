@@ -0,0 +1,163 @@
+"""
+قياس ترميز JSON لكل مسار API: المكتبة القياسية مقابل orjson
+يستدعي كل مسار بطلباته النموذجية (SAMPLE_REQUESTS في check_query_plans.py) دون ذاكرة مؤقتة،
+ويقيس زمن الطلب كاملاً وزمن الترميز وحده لكل مرمّز، ثم يفشل إذا اختلفت البايتات بينهما
+
+الاستخدام:
+    cd demo
+    python bench_serialization.py
+    python bench_serialization.py --repeat 50 --output serialization.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+import api_server
+import serialization
+from benchmark import percentile
+from check_query_plans import SAMPLE_BATCH, available_requests, sample_ids
+from prefetch import Prefetcher
+
+
+def disable_caches():
+    """كل طلب يُبنى ويُرمَّز من جديد"""
+    for cache in (api_server.page_cache, api_server.timings_cache,
+                  api_server.compare_cache, api_server.playlist_cache,
+                  api_server.compressed_store.cache):
+        cache.clear()
+        cache.max_bytes = 0
+    api_server.page_prefetcher = Prefetcher(api_server.page_cache, api_server.prefetch_page, 0)
+
+
+def sample_requests():
+    """[(المسار، الرابط، جسم POST أو None)]"""
+    conn = api_server.db_pool.acquire()
+    ids = sample_ids(conn)
+    available, _ = available_requests(conn)
+    api_server.db_pool.release(conn)
+
+    requests = []
+    for rule, paths in available.items():
+        requests += [(rule, path.format(**ids), None) for path in paths]
+    batch = {'requests': [
+        {k: (int(v.format(**ids)) if isinstance(v, str) and '{' in v else v) for k, v in item.items()}
+        for item in SAMPLE_BATCH['requests']
+    ]}
+    requests.append(('/api/batch', '/api/batch', batch))
+    return requests
+
+
+def fetch(client, path, body):
+    response = client.post(path, json=body) if body is not None else client.get(path)
+    with response:
+        return response.status_code, response.get_data()
+
+
+def payload_object(data):
+    """الكائن المرمَّز في الاستجابة (أو None لـ NDJSON) لقياس الترميز وحده"""
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(repeat):
+    """قياس كل طلب نموذجي بكل مرمّز متاح"""
+    provider = api_server.app.json
+    encoders = [name for name in serialization.ENCODERS
+                if name == 'json' or serialization.orjson is not None]
+    client = api_server.app.test_client()
+
+    results = []
+    for rule, path, body in sample_requests():
+        entry = {'rule': rule, 'path': path, 'encoders': {}}
+        outputs = {}
+        for name in encoders:
+            provider.encoder = name
+            status, data = fetch(client, path, body)
+            outputs[name] = data
+            request_ms = timed(lambda: fetch(client, path, body), repeat)
+            obj = payload_object(data)
+            encode_ms = timed(lambda: provider.dumps_bytes(obj), repeat) if obj is not None else []
+            entry['status'] = status
+            entry['bytes'] = len(data)
+            entry['encoders'][name] = {
+                'request_p50_ms': round(percentile(request_ms, 50), 3),
+                'encode_p50_ms': round(percentile(encode_ms, 50), 3) if encode_ms else None,
+            }
+        entry['identical'] = len(set(outputs.values())) == 1
+        results.append(entry)
+    provider.encoder = serialization.DEFAULT_ENCODER
+    return encoders, results
+
+
+def print_results(encoders, results):
+    header = ''.join(f"{name + ' طلب':>14}{name + ' ترميز':>14}" for name in encoders)
+    print(f"\n{'الرابط':<58}{'الحجم':>9}{header}")
+    for entry in results:
+        columns = ''
+        for name in encoders:
+            timing = entry['encoders'][name]
+            encode = f"{timing['encode_p50_ms']:.3f}" if timing['encode_p50_ms'] is not None else '-'
+            columns += f"{timing['request_p50_ms']:>14.3f}{encode:>14}"
+        mark = '' if entry['identical'] else '  ✗ مختلف'
+        print(f"{entry['path'][:57]:<58}{entry['bytes']:>9}{columns}{mark}")
+
+    if len(encoders) > 1:
+        totals = {name: sum(e['encoders'][name]['request_p50_ms'] for e in results) for name in encoders}
+        encode_totals = {name: sum(e['encoders'][name]['encode_p50_ms'] or 0 for e in results)
+                         for name in encoders}
+        print(f"\nمجموع p50 للطلبات: " + '، '.join(f"{n} {t:.1f} ms" for n, t in totals.items()))
+        print(f"مجموع p50 للترميز: " + '، '.join(f"{n} {t:.1f} ms" for n, t in encode_totals.items()))
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="قياس ترميز JSON لكل مسار API")
+    parser.add_argument("--repeat", type=int, default=20, help="عدد مرات تكرار كل طلب")
+    parser.add_argument("--output", help="حفظ النتائج في ملف JSON")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    print("=" * 60)
+    print("قياس ترميز JSON لمسارات API")
+    print("=" * 60)
+    print(f"\nقاعدة البيانات: {api_server.DATABASE_PATH}")
+    if serialization.orjson is None:
+        print("⚠ orjson غير مثبتة (pip install orjson): القياس بالمكتبة القياسية فقط")
+
+    disable_caches()
+    encoders, results = run(args.repeat)
+    print_results(encoders, results)
+
+    if args.output:
+        Path(args.output).write_text(
+            json.dumps({'encoders': encoders, 'results': results}, ensure_ascii=False, indent=2),
+            encoding='utf-8'
+        )
+        print(f"\n✓ حُفظت النتائج في {args.output}")
+
+    different = [entry['path'] for entry in results if not entry['identical']]
+    if different:
+        print(f"\n❌ مخرجات مختلفة بين المرمّزات: {', '.join(different)}")
+        sys.exit(1)
+    print("\n✅ المخرجات متطابقة بايتاً ببايت بين المرمّزات")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""
+حزمة قياس الأداء لجميع مسارات API
+تعيد تشغيل مزيج طلبات واقعي (قراءة صفحات متتالية، آيات عشوائية، بحث، توقيتات)
+وتحفظ عدد الطلبات في الثانية و p50/p95/p99 لكل مسار في ملف JSON للمقارنة بين الإصدارات
+
+الاستخدام:
+    cd demo
+    python bench_suite.py --output bench.json
+    python bench_suite.py --http --threads 8 --output after.json --compare before.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import quote
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+import api_server
+from benchmark import RIWAYAT, percentile
+from db_pool import connect_readonly
+
+# نسب السيناريوهات في المزيج
+MIX_WEIGHTS = {
+    'reading': 0.5,
+    'ayah_lookup': 0.2,
+    'timings': 0.2,
+    'search': 0.1,
+}
+
+# عدد الصفحات المتتالية في جلسة قراءة واحدة
+READING_SESSION_PAGES = 10
+
+
+# ==================== مولّدات الطلبات ====================
+# كل سيناريو يُرجع جلسات، والجلسة قائمة (المسار العام، الرابط) تُنفّذ بالترتيب
+
+def reading_sessions(count, rng):
+    """قارئ يفتح صفحة ثم يقرأ الصفحات التالية بالترتيب"""
+    sessions = []
+    while sum(len(s) for s in sessions) < count:
+        riwayah = rng.choice(RIWAYAT)
+        start = rng.randint(1, 604 - READING_SESSION_PAGES)
+        sessions.append([
+            ('/api/page/<n>', f'/api/page/{page}?riwayah={riwayah}')
+            for page in range(start, start + READING_SESSION_PAGES)
+        ])
+    return sessions
+
+
+def ayah_lookup_sessions(count, rng, conn):
+    """آيات عشوائية (ضمن عدد آيات كل سورة)"""
+    # عدد الآي يختلف بين الروايات
+    ayat_counts = {
+        (riwayah, sura): count for riwayah, sura, count in conn.execute(
+            'SELECT riwayah_key, sura_no, MAX(aya_no) FROM ayat GROUP BY riwayah_key, sura_no'
+        )
+    }
+    sessions = []
+    for _ in range(count):
+        sura = rng.randint(1, 114)
+        riwayah = rng.choice(RIWAYAT)
+        aya = rng.randint(1, ayat_counts.get((riwayah, sura), 1))
+        sessions.append([('/api/ayat/<s>/<a>', f'/api/ayat/{sura}/{aya}?riwayah={riwayah}')])
+    return sessions
+
+
+def search_sessions(count, rng, conn):
+    """بحث بكلمات مأخوذة من نص الآيات"""
+    rows = conn.execute(
+        "SELECT text_emlaey FROM ayat WHERE riwayah_key = 'hafs' AND text_emlaey != ''"
+    ).fetchall()
+    words = sorted({w for row in rows for w in row[0].split() if len(w) > 3})
+    return [
+        [('/api/search', f"/api/search?q={quote(rng.choice(words))}&riwayah={rng.choice(RIWAYAT)}")]
+        for _ in range(count)
+    ]
+
+
+def timings_sessions(count, rng, conn):
+    """مشغّل صوتي: توقيتات سورة ثم البحث عن الآية الحالية عدة مرات"""
+    reciters = conn.execute(
+        'SELECT DISTINCT reciter_id, moshaf_id, sura_no FROM ayah_timings ORDER BY 1, 2, 3'
+    ).fetchall()
+    sessions = []
+    while sum(len(s) for s in sessions) < count:
+        reciter_id, moshaf_id, sura = rng.choice(reciters)
+        base = f'/api/timings/{reciter_id}/{sura}'
+        session = [('/api/timings/<r>/<s>', f'{base}?moshaf_id={moshaf_id}&format=compact')]
+        session += [
+            ('/api/timings/<r>/<s>/at', f'{base}/at?moshaf_id={moshaf_id}&ms={rng.randint(0, 600000)}')
+            for _ in range(3)
+        ]
+        sessions.append(session)
+    return sessions
+
+
+def build_scenarios(count, seed, names):
+    """جلسات كل سيناريو (بذور ثابتة: نفس الطلبات في كل تشغيل)"""
+    conn = connect_readonly(api_server.DATABASE_PATH, row_factory=None)
+    generators = {
+        'reading': lambda n, rng: reading_sessions(n, rng),
+        'ayah_lookup': lambda n, rng: ayah_lookup_sessions(n, rng, conn),
+        'search': lambda n, rng: search_sessions(n, rng, conn),
+        'timings': lambda n, rng: timings_sessions(n, rng, conn),
+    }
+    scenarios = {}
+    for i, name in enumerate(generators):
+        if name in names:
+            scenarios[name] = generators[name](count, random.Random(seed + i))
+    if 'mixed' in names:
+        rng = random.Random(seed + len(generators))
+        mixed = []
+        for name, weight in MIX_WEIGHTS.items():
+            mixed += generators[name](int(count * weight), rng)
+        rng.shuffle(mixed)
+        scenarios['mixed'] = mixed
+    conn.close()
+    return scenarios
+
+
+# ==================== المنفّذات ====================
+
+class InProcessDriver:
+    """تنفيذ الطلبات على تطبيق WSGI داخل نفس العملية"""
+
+    name = 'inprocess'
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, path):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = api_server.app.test_client()
+        response = client.get(path)
+        response.close()
+        return response.status_code
+
+    def close(self):
+        pass
+
+
+class HttpDriver:
+    """تنفيذ الطلبات عبر HTTP على خادم يعمل (أو خادم محلي يُشغَّل لهذا الغرض)"""
+
+    name = 'http'
+
+    def __init__(self, url=None):
+        self.server = None
+        if url is None:
+            from werkzeug.serving import make_server
+            self.server = make_server('127.0.0.1', 0, api_server.app, threaded=True)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            url = f'http://127.0.0.1:{self.server.server_port}'
+        self.url = url.rstrip('/')
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.url + path) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+
+
+def run_scenario(driver, sessions, threads):
+    """تنفيذ الجلسات على عدة خيوط وإرجاع (الزمن الكلي، العينات لكل مسار)"""
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+
+    def worker(session):
+        local_samples = []
+        for route, path in session:
+            start = time.perf_counter()
+            status = driver.get(path)
+            local_samples.append((route, (time.perf_counter() - start) * 1000, status))
+        with lock:
+            for route, ms, status in local_samples:
+                samples[route].append(ms)
+                if status >= 400:
+                    errors[route] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, sessions))
+    return time.perf_counter() - start, samples, errors
+
+
+def summarize(elapsed, samples, errors):
+    total = sum(len(v) for v in samples.values())
+    routes = {}
+    for route in sorted(samples):
+        values = samples[route]
+        routes[route] = {
+            'requests': len(values),
+            'rps': round(len(values) / elapsed, 1),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'p50_ms': round(percentile(values, 50), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'p99_ms': round(percentile(values, 99), 3),
+            'errors': errors.get(route, 0),
+        }
+    return {
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(total / elapsed, 1),
+        'routes': routes,
+    }
+
+
+# ==================== النتائج ====================
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_meta(args, driver):
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'database': str(api_server.DATABASE_PATH),
+        # خادم خارجي (--url) قد يستخدم قاعدة بيانات أخرى
+        'dataset_version': None if args.url else api_server.dataset_info()['version'],
+        'driver': driver.name,
+        'threads': args.threads,
+        'requests': args.requests,
+        'seed': args.seed,
+        'cold': args.cold,
+    }
+
+
+def print_results(results):
+    print(f"\n{'السيناريو / المسار':<28}{'الطلبات/ث':>12}{'p50':>10}{'p95':>10}{'p99':>10}{'أخطاء':>8}")
+    for name, scenario in results['scenarios'].items():
+        print(f"{name:<28}{scenario['rps']:>12.0f}")
+        for route, stats in scenario['routes'].items():
+            print(f"   {route:<25}{stats['rps']:>12.0f}{stats['p50_ms']:>8.2f}ms"
+                  f"{stats['p95_ms']:>8.2f}ms{stats['p99_ms']:>8.2f}ms{stats['errors']:>8}")
+
+
+def compare_results(before, after):
+    """مقارنة نتيجتين: نسبة الطلبات في الثانية وفرق p99 لكل مسار"""
+    print(f"\nمقارنة مع {before['meta'].get('commit') or 'النتيجة السابقة'} -> {after['meta'].get('commit') or 'الحالية'}")
+    print(f"{'السيناريو / المسار':<28}{'قبل':>10}{'بعد':>10}{'النسبة':>9}{'p99 قبل':>11}{'p99 بعد':>11}")
+    for name, scenario in after['scenarios'].items():
+        old = before['scenarios'].get(name)
+        if old is None:
+            continue
+        print(f"{name:<28}{old['rps']:>8.0f}/s{scenario['rps']:>8.0f}/s{scenario['rps'] / old['rps']:>8.2f}x")
+        for route, stats in scenario['routes'].items():
+            old_route = old['routes'].get(route)
+            if old_route is None:
+                continue
+            print(f"   {route:<25}{old_route['rps']:>8.0f}/s{stats['rps']:>8.0f}/s"
+                  f"{stats['rps'] / old_route['rps']:>8.2f}x"
+                  f"{old_route['p99_ms']:>9.2f}ms{stats['p99_ms']:>9.2f}ms")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="حزمة قياس أداء جميع مسارات API")
+    parser.add_argument("--requests", type=int, default=2000, help="عدد الطلبات لكل سيناريو")
+    parser.add_argument("--threads", type=int, default=4, help="عدد الخيوط المتزامنة")
+    parser.add_argument("--seed", type=int, default=1, help="بذرة توليد الطلبات")
+    parser.add_argument(
+        "--scenarios",
+        default="reading,ayah_lookup,search,timings,mixed",
+        help="السيناريوهات المطلوبة مفصولة بفواصل",
+    )
+    parser.add_argument("--http", action="store_true", help="تشغيل خادم HTTP محلي بدلاً من التنفيذ داخل العملية")
+    parser.add_argument("--url", help="عنوان خادم يعمل مسبقاً (مثل http://localhost:5000)")
+    parser.add_argument("--cold", action="store_true", help="تعطيل الذاكرة المؤقتة في التطبيق (داخل العملية)")
+    parser.add_argument("--output", help="ملف JSON للنتائج")
+    parser.add_argument("--compare", help="ملف JSON لنتيجة سابقة للمقارنة")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    names = [n.strip() for n in args.scenarios.split(',') if n.strip()]
+
+    if args.cold:
+        for cache in (api_server.page_cache, api_server.timings_cache,
+                      api_server.compare_cache, api_server.playlist_cache,
+                      api_server.compressed_store.cache):
+            cache.max_bytes = 0
+
+    driver = HttpDriver(args.url) if args.http or args.url else InProcessDriver()
+
+    print("=" * 60)
+    print("حزمة قياس أداء API")
+    print("=" * 60)
+    print(f"\nالمنفّذ: {driver.name} | الطلبات: {args.requests} | الخيوط: {args.threads}")
+
+    scenarios = build_scenarios(args.requests, args.seed, names)
+    results = {'meta': run_meta(args, driver), 'scenarios': {}}
+    try:
+        for name, sessions in scenarios.items():
+            # إحماء بنفس الطلبات (فتح الاتصالات وتحميل الذاكرة المؤقتة)
+            run_scenario(driver, sessions[:max(1, len(sessions) // 10)], args.threads)
+            results['scenarios'][name] = summarize(*run_scenario(driver, sessions, args.threads))
+            print(f"   ✓ {name}")
+    finally:
+        driver.close()
+
+    print_results(results)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n✓ النتائج: {args.output}")
+    if args.compare:
+        compare_results(json.loads(Path(args.compare).read_text(encoding='utf-8')), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+"""
+قياس أداء خادم API (عدد الطلبات في الثانية)
+يشغّل التطبيق داخل نفس العملية عبر Flask test client
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import quote
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+import api_server
+from db_pool import ConnectionPool
+
+RIWAYAT = ['hafs', 'warsh', 'qaloun', 'douri', 'shuba', 'sousi']
+
+
+def page_paths(count, seed=1):
+    """مسارات صفحات عشوائية"""
+    rng = random.Random(seed)
+    return [
+        f"/api/page/{rng.randint(1, 604)}?riwayah={rng.choice(RIWAYAT)}"
+        for _ in range(count)
+    ]
+
+
+def ayat_paths(count, seed=2):
+    """مسارات آيات سور عشوائية"""
+    rng = random.Random(seed)
+    return [
+        f"/api/ayat?sura={rng.randint(1, 114)}&riwayah={rng.choice(RIWAYAT)}"
+        for _ in range(count)
+    ]
+
+
+def surah_paths(count, seed=4):
+    """مسارات تفسير وترجمة سور عشوائية"""
+    rng = random.Random(seed)
+    return [
+        rng.choice(('/api/tafseer/{}', '/api/translation/{}?lang=en')).format(rng.randint(1, 114))
+        for _ in range(count)
+    ]
+
+
+def search_paths(count, seed=3):
+    """مسارات بحث بكلمات مأخوذة من نص الآيات"""
+    rng = random.Random(seed)
+    conn = api_server.db_pool.acquire()
+    rows = conn.execute(
+        "SELECT text_emlaey FROM ayat WHERE riwayah_key = 'hafs' AND text_emlaey != ''"
+    ).fetchall()
+    api_server.db_pool.release(conn)
+    words = [w for row in rows for w in row[0].split() if len(w) > 3]
+    return [
+        f"/api/search?q={quote(rng.choice(words))}&riwayah={rng.choice(RIWAYAT)}"
+        for _ in range(count)
+    ]
+
+
+def percentile(samples, p):
+    """القيمة المئوية من عينات مرتبة"""
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def bypass_compressed_store():
+    """تعطيل الاستجابات المضغوطة المخزنة وإرجاع حدها السابق
+
+    كل طلب GET على /api/ يمر بها: دون تعطيلها تقيس المقارنات إصابات الذاكرة لا المسار المقصود
+    """
+    store = api_server.compressed_store
+    max_bytes = store.cache.max_bytes
+    store.clear()
+    store.cache.max_bytes = 0
+    return max_bytes
+
+
+def restore_compressed_store(max_bytes):
+    api_server.compressed_store.cache.max_bytes = max_bytes
+
+
+def measure_latency(paths):
+    """زمن كل طلب بالمللي ثانية"""
+    client = api_server.app.test_client()
+    samples = []
+    for path in paths:
+        start = time.perf_counter()
+        response = client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path}: {response.status_code}")
+    return samples
+
+
+def run_paths(paths, threads=1, headers=None):
+    """تنفيذ الطلبات وإرجاع عدد الطلبات في الثانية"""
+    def worker(chunk):
+        client = api_server.app.test_client()
+        for path in chunk:
+            response = client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"{path}: {response.status_code}")
+
+    chunks = [paths[i::threads] for i in range(threads)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(worker, chunks))
+    elapsed = time.perf_counter() - start
+    return len(paths) / elapsed
+
+
+async def drive_asgi(asgi, paths, concurrency):
+    """تنفيذ الطلبات على تطبيق ASGI داخل نفس العملية"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def request(path):
+        route, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'method': 'GET', 'scheme': 'http', 'http_version': '1.1',
+            'path': route, 'raw_path': route.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [], 'server': ('benchmark', 80), 'client': ('127.0.0.1', 0),
+        }
+        statuses = []
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                statuses.append(message['status'])
+
+        async with semaphore:
+            await asgi(scope, receive, send)
+        if statuses != [200]:
+            raise RuntimeError(f"{path}: {statuses}")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(request(path) for path in paths))
+    return len(paths) / (time.perf_counter() - start)
+
+
+def compare_asgi(requests_count, concurrency):
+    """مقارنة Flask (خيوط) مع وضع ASGI بنفس مزيج الطلبات"""
+    from asgi_app import AsgiAdapter
+
+    paths = page_paths(requests_count) + ayat_paths(requests_count) + search_paths(requests_count // 4)
+    random.Random(4).shuffle(paths)
+    max_bytes, api_server.page_cache.max_bytes = api_server.page_cache.max_bytes, 0
+    store_bytes = bypass_compressed_store()
+
+    flask_rps = run_paths(paths, concurrency)
+    asgi = AsgiAdapter(api_server.app, threads=concurrency)
+    asgi_rps = asyncio.run(drive_asgi(asgi, paths, concurrency * 4))
+    asgi.executor.shutdown()
+
+    api_server.page_cache.max_bytes = max_bytes
+    restore_compressed_store(store_bytes)
+    print(f"\n{'مزيج الطلبات':<16}{'Flask':>14}{'ASGI':>14}{'النسبة':>10}")
+    print(f"{'':<16}{flask_rps:>12.0f}/s{asgi_rps:>12.0f}/s{asgi_rps / flask_rps:>9.2f}x")
+    return flask_rps, asgi_rps
+
+
+def compare_pool_policies(requests_count, threads):
+    """مقارنة سياسة اتصال لكل طلب مع المجمّع"""
+    scenarios = {
+        '/api/page/<n>': page_paths(requests_count),
+        '/api/ayat': ayat_paths(requests_count),
+    }
+    results = {}
+    # تعطيل ذاكرة الصفحات والاستجابات المضغوطة لقياس أثر المجمّع وحده
+    max_bytes, api_server.page_cache.max_bytes = api_server.page_cache.max_bytes, 0
+    store_bytes = bypass_compressed_store()
+    for policy in ('request', 'thread'):
+        api_server.db_pool.close_all()
+        api_server.db_pool = ConnectionPool(api_server.DATABASE_PATH, policy=policy)
+        for name, paths in scenarios.items():
+            run_paths(paths[:20], threads)  # إحماء
+            results[(name, policy)] = run_paths(paths, threads)
+    api_server.page_cache.max_bytes = max_bytes
+    restore_compressed_store(store_bytes)
+    api_server.db_pool.close_all()
+
+    print(f"\n{'المسار':<16}{'قبل (request)':>16}{'بعد (thread)':>16}{'التحسن':>10}")
+    for name in scenarios:
+        before = results[(name, 'request')]
+        after = results[(name, 'thread')]
+        print(f"{name:<16}{before:>14.0f}/s{after:>14.0f}/s{after / before:>9.2f}x")
+    return results
+
+
+def compare_page_cache(requests_count, threads):
+    """مقارنة الصفحات دون ذاكرة مؤقتة ومع ذاكرة محمّلة مسبقاً"""
+    paths = page_paths(requests_count)
+    cache = api_server.page_cache
+    max_bytes = cache.max_bytes
+    store_bytes = bypass_compressed_store()
+
+    cache.clear()
+    cache.max_bytes = 0
+    cold = run_paths(paths, threads)
+
+    cache.max_bytes = max_bytes
+    api_server.prewarm_page_cache()
+    warm = run_paths(paths, threads)
+    restore_compressed_store(store_bytes)
+
+    print(f"\n{'/api/page/<n>':<16}{'دون ذاكرة':>14}{'محمّلة':>14}{'التحسن':>10}")
+    print(f"{'':<16}{cold:>12.0f}/s{warm:>12.0f}/s{warm / cold:>9.2f}x")
+    print(f"   الذاكرة: {cache.size / (1024 * 1024):.1f} MB في {cache.stats()['entries']} صفحة")
+    return cold, warm
+
+
+def compare_search(requests_count):
+    """مقارنة زمن البحث: LIKE (دون فهرس) مقابل FTS5"""
+    paths = search_paths(min(requests_count, 500))
+    if not api_server.has_table('ayat_fts', api_server.db_pool.acquire()):
+        print("\n⚠ فهرس البحث غير موجود: شغّل build_database.py --migrate")
+        return None
+
+    # إخفاء الفهرس مؤقتاً لقياس مسار LIKE القديم
+    store_bytes = bypass_compressed_store()
+    api_server._schema['ayat_fts'] = frozenset()
+    like = measure_latency(paths)
+    api_server._schema.clear()
+    fts = measure_latency(paths)
+    restore_compressed_store(store_bytes)
+
+    print(f"\n{'/api/search':<16}{'p50':>10}{'p99':>10}")
+    for label, samples in (('LIKE', like), ('FTS5', fts)):
+        print(f"{label:<16}{percentile(samples, 50):>8.2f}ms{percentile(samples, 99):>8.2f}ms")
+    return like, fts
+
+
+def compare_compression(requests_count, threads):
+    """مقارنة الضغط عند كل طلب مع إرسال النسخ المضغوطة المخزنة (المسارات المخزنة فقط)"""
+    from compression import ENCODERS
+
+    paths = page_paths(requests_count) + surah_paths(requests_count)
+    random.Random(5).shuffle(paths)
+    store = api_server.compressed_store
+    max_bytes = store.cache.max_bytes
+
+    print(f"\n{'الترميز':<16}{'دون تخزين':>14}{'مخزّن':>14}{'التحسن':>10}")
+    for encoding in ENCODERS:
+        headers = {'Accept-Encoding': encoding}
+        store.clear()
+        store.cache.max_bytes = 0
+        cold = run_paths(paths, threads, headers)
+        store.cache.max_bytes = max_bytes
+        run_paths(paths, threads, headers)  # إحماء
+        store.drain()
+        warm = run_paths(paths, threads, headers)
+        print(f"{encoding:<16}{cold:>12.0f}/s{warm:>12.0f}/s{warm / cold:>9.2f}x")
+
+    stats = store.stats()
+    ratios = ', '.join(f"{name}: {ratio}x" for name, ratio in stats['compression_ratio'].items())
+    print(f"   نسبة الضغط: {ratios}")
+    print(f"   وقت الضغط: {stats['compress_seconds']:.2f}s | الوقت الموفَّر: {stats['cpu_saved_seconds']:.2f}s")
+    return stats
+
+
+def fetch_all(url, paths):
+    """تنفيذ الطلبات عبر HTTP (في عملية عميل منفصلة)"""
+    for path in paths:
+        with urllib.request.urlopen(url + path) as response:
+            response.read()
+    return len(paths)
+
+
+def compare_workers(requests_count, worker_counts, clients):
+    """قابلية التوسع: عدد الطلبات في الثانية لخادم serve.py حسب عدد العمّال"""
+    import serve
+
+    paths = page_paths(requests_count) + ayat_paths(requests_count) + search_paths(requests_count // 4)
+    random.Random(6).shuffle(paths)
+    chunks = [paths[i::clients] for i in range(clients)]
+    script = Path(__file__).parent / 'serve.py'
+
+    print(f"\n{'العمّال':<10}{'الطلبات/ث':>12}{'التوسع':>10}{'المشتركة':>12}{'الخاصة':>12}")
+    baseline = None
+    with ProcessPoolExecutor(max_workers=clients) as executor:
+        for workers in worker_counts:
+            port = free_port()
+            server = subprocess.Popen(
+                [sys.executable, str(script), '--workers', str(workers), '--host', '127.0.0.1', '--port', str(port)],
+                stdout=subprocess.DEVNULL, env={**os.environ, 'QURAN_DB_PATH': str(api_server.DATABASE_PATH)},
+            )
+            url = f'http://127.0.0.1:{port}'
+            try:
+                wait_until_ready(url, server)
+                # إحماء: الذاكرة المضغوطة لكل عامل
+                list(executor.map(fetch_all, [url] * clients, chunks))
+                start = time.perf_counter()
+                list(executor.map(fetch_all, [url] * clients, chunks))
+                rps = len(paths) / (time.perf_counter() - start)
+                memory = serve.memory_report(server.pid)[1:]
+            finally:
+                server.send_signal(signal.SIGTERM)
+                server.wait()
+            baseline = baseline or rps
+            shared = sum(m[2] for m in memory) / max(len(memory), 1)
+            private = sum(m[3] for m in memory) / max(len(memory), 1)
+            print(f"{workers:<10}{rps:>10.0f}/s{rps / baseline:>9.2f}x{shared:>10.1f}MB{private:>10.1f}MB")
+    print(f"   (الذاكرة: متوسط لكل عامل | الأنوية المتاحة: {os.cpu_count()})")
+
+
+def free_port():
+    """منفذ محلي غير مستخدم"""
+    import socket
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, server, timeout=120):
+    """انتظار انتهاء إحماء الخادم وبدء الاستماع"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"serve.py exited with {server.returncode}")
+        try:
+            with urllib.request.urlopen(url + '/api/riwayat') as response:
+                response.read()
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("serve.py did not start")
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="قياس أداء خادم API")
+    parser.add_argument("--requests", type=int, default=2000, help="عدد الطلبات لكل سيناريو")
+    parser.add_argument("--threads", type=int, default=1, help="عدد الخيوط المتزامنة")
+    parser.add_argument(
+        "--workers",
+        help="قياس توسع serve.py فقط لأعداد العمّال المحددة (مثل 1,2,4)"
+    )
+    parser.add_argument("--clients", type=int, default=8, help="عدد عمليات العميل عند قياس --workers")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    print("=" * 60)
+    print("قياس أداء مجمّع الاتصالات")
+    print("=" * 60)
+    print(f"\nقاعدة البيانات: {api_server.DATABASE_PATH}")
+    print(f"الطلبات: {args.requests} | الخيوط: {args.threads}")
+    if args.workers:
+        compare_workers(args.requests, [int(n) for n in args.workers.split(',')], args.clients)
+        return
+    compare_pool_policies(args.requests, args.threads)
+    compare_page_cache(args.requests, args.threads)
+    compare_search(args.requests)
+    compare_compression(args.requests, args.threads)
+    compare_asgi(args.requests, max(args.threads, 4))
+
+
+if __name__ == "__main__":
+    main()
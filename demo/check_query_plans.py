@@ -0,0 +1,271 @@
+"""
+فحص خطط الاستعلامات (EXPLAIN QUERY PLAN) لكل استعلامات API
+يستدعي كل مسار بطلبات نموذجية ويسجّل استعلاماته، ثم يفشل إذا لجأ أي استعلام
+إلى مسح كامل لجدول أو إلى ترتيب مؤقت (TEMP B-TREE)
+
+الاستخدام:
+    cd demo
+    python check_query_plans.py
+    python check_query_plans.py --verbose
+"""
+
+import argparse
+import sqlite3
+import sys
+import threading
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+import api_server
+from db_pool import ConnectionPool
+
+# طلبات نموذجية لكل مسار API (مسار جديد دون طلب هنا يُعدّ فشلاً)
+SAMPLE_REQUESTS = {
+    '/api/riwayat': ['/api/riwayat'],
+    '/api/riwayat/<key>': ['/api/riwayat/warsh'],
+    '/api/surahs': ['/api/surahs?riwayah=warsh'],
+    '/api/surahs/<int:number>': ['/api/surahs/2?riwayah=warsh'],
+    '/api/ayat': ['/api/ayat?sura=2&riwayah=warsh', '/api/ayat?page=5&riwayah=warsh', '/api/ayat?riwayah=warsh'],
+    '/api/ayat/<int:sura>/<int:aya>': ['/api/ayat/2/255?riwayah=warsh'],
+    '/api/ayat/<int:sura>/<int:aya>/line': ['/api/ayat/2/255/line?riwayah=warsh'],
+    '/api/lines': ['/api/lines?page=5&riwayah=warsh'],
+    '/api/page/<int:page_num>': ['/api/page/5?riwayah=warsh'],
+    '/api/fonts/<riwayah>': ['/api/fonts/warsh'],
+    '/api/fonts/<riwayah>/page/<int:page_num>': ['/api/fonts/warsh/page/22'],
+    '/api/juzs': ['/api/juzs?riwayah=warsh'],
+    '/api/ahzab': ['/api/ahzab?riwayah=warsh'],
+    '/api/quarters': ['/api/quarters?riwayah=warsh'],
+    '/api/locate': [
+        '/api/locate?page=22&riwayah=warsh', '/api/locate?ref=2:255&riwayah=warsh', '/api/locate?id=262',
+    ],
+    '/api/range': [
+        '/api/range?from=2:142&to=2:252&riwayah=warsh', '/api/range?juz=2&riwayah=warsh',
+        '/api/range?hizb=3&riwayah=warsh', '/api/range?quarter=5&format=ndjson',
+    ],
+    '/api/compare/<int:sura>/<int:aya>': ['/api/compare/2/255'],
+    '/api/compare/page/<int:page_num>': ['/api/compare/page/5'],
+    '/api/tafseer/<int:sura>/<int:aya>': ['/api/tafseer/2/255'],
+    '/api/tafseer/<int:sura>': ['/api/tafseer/2'],
+    '/api/translation/<int:sura>/<int:aya>': ['/api/translation/2/255'],
+    '/api/translation/<int:sura>': ['/api/translation/2'],
+    '/api/reciters': ['/api/reciters?riwayah=warsh'],
+    '/api/timings/<int:reciter_id>/<int:sura>': [
+        '/api/timings/{reciter}/2', '/api/timings/{reciter}/2?moshaf_id={moshaf}',
+        '/api/timings/{reciter}/3?moshaf_id={moshaf}&format=compact',
+    ],
+    '/api/timings/<int:reciter_id>/<int:sura>/at': ['/api/timings/{reciter}/4/at?ms=60000'],
+    '/api/playlist': [
+        '/api/playlist?page=50&reciter={reciter}', '/api/playlist?page=1&reciter={reciter}&riwayah=hafs',
+        '/api/playlist?page=604&reciter={reciter}&moshaf={moshaf}',
+    ],
+    '/api/search': [
+        '/api/search?q=الرحمن&riwayah=warsh', '/api/search?q=الرحمن&riwayah=all',
+        '/api/search?q="الحمد لله"&riwayat=hafs,warsh',
+    ],
+    '/api/concordance': [
+        '/api/concordance?word=الرحمن&riwayah=warsh', '/api/concordance?word=رحم*&per_page=20&page=2',
+    ],
+    '/api/batch': [],  # POST: انظر SAMPLE_BATCH
+    '/api/export/<dataset>': [
+        '/api/export/ayat?riwayah=warsh&limit=50', '/api/export/lines?riwayah=warsh&limit=50',
+        '/api/export/timings?limit=50',
+    ],
+    '/api/stats': ['/api/stats', '/api/stats?live=1'],
+}
+
+SAMPLE_BATCH = {'requests': [
+    {'type': 'page', 'page': 7, 'riwayah': 'warsh'},
+    {'type': 'ayah', 'sura': 2, 'aya': 255, 'riwayah': 'warsh'},
+    {'type': 'ayah', 'sura': 3, 'aya': 1, 'riwayah': 'warsh'},
+    {'type': 'tafseer', 'sura': 2, 'aya': 255},
+    {'type': 'translation', 'sura': 2, 'aya': 255, 'lang': 'en'},
+    {'type': 'timings', 'reciter_id': '{reciter}', 'sura': 5},
+    {'type': 'timings', 'reciter_id': '{reciter}', 'moshaf_id': '{moshaf}', 'sura': 6},
+]}
+
+# استعلامات تقرأ الجدول كله عمداً: (بداية الاستعلام، السبب)
+ALLOWED_SCANS = [
+    ('SELECT * FROM riwayat', 'جدول صغير يُقرأ كاملاً (6 صفوف)'),
+    ('SELECT key FROM riwayat', 'جدول صغير يُقرأ كاملاً (6 صفوف)'),
+    ('SELECT key, total_pages FROM riwayat', 'جدول صغير يُقرأ كاملاً (6 صفوف)'),
+    ('SELECT COUNT(', 'إحصائيات ?live=1 تعدّ الجداول كاملة عمداً'),
+    ('SELECT riwayah_key, \'ayat\'', 'إحصائيات ?live=1 تعدّ الجداول كاملة عمداً'),
+    ('SELECT reciter_id, \'moshafs\'', 'إحصائيات ?live=1 تعدّ الجداول كاملة عمداً'),
+    ('SELECT scope, key, name, value FROM dataset_stats', 'جدول الإحصائيات يُقرأ كاملاً'),
+    ('SELECT key, value FROM metadata', 'جدول صغير يُقرأ كاملاً'),
+    ('SELECT riwayah_key, number, start_sura', 'فهرس التقسيمات يُبنى مرة واحدة من الجدول كاملاً'),
+    ('SELECT riwayah_key, hizb_num, start_sura', 'فهرس التقسيمات يُبنى مرة واحدة من الجدول كاملاً'),
+    ('SELECT riwayah_key, quarter_num, sura_no', 'فهرس التقسيمات يُبنى مرة واحدة من الجدول كاملاً'),
+    ('SELECT riwayah_key, number, ayat_count FROM surahs', 'فهرس التقسيمات يُبنى مرة واحدة من الجدول كاملاً'),
+    ('SELECT a.*, s.name_ar as sura_name FROM ayat_fts f', 'الترتيب حسب bm25 يُحسب لنتائج المطابقة فقط'),
+    ('WITH matches AS MATERIALIZED', 'تجميع نتائج المطابقة وترتيبها حسب bm25 (لا فهرس للدرجة)'),
+]
+
+
+class RecordingConnection(sqlite3.Connection):
+    """اتصال يسجّل كل استعلام مع معاملاته"""
+
+    queries = []
+    lock = threading.Lock()
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or RecordingCursor)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+
+class RecordingCursor(sqlite3.Cursor):
+    def execute(self, sql, params=()):
+        path = api_server.request.path if api_server.has_request_context() else None
+        with RecordingConnection.lock:
+            RecordingConnection.queries.append((path, sql, tuple(params)))
+        return super().execute(sql, params)
+
+
+def normalize_sql(sql):
+    return ' '.join(sql.split())
+
+
+def table_aliases(sql, tables):
+    """الأسماء المستعارة للجداول الحقيقية في الاستعلام (FROM ayat a -> a)"""
+    words = sql.replace(',', ' ').split()
+    aliases = set()
+    for i, word in enumerate(words[:-1]):
+        if word.upper() in ('FROM', 'JOIN') and words[i + 1] in tables:
+            aliases.add(words[i + 1])
+            if i + 2 < len(words) and words[i + 2].upper() not in RESERVED_WORDS:
+                aliases.add(words[i + 2])
+    return aliases
+
+
+RESERVED_WORDS = {'WHERE', 'JOIN', 'ON', 'ORDER', 'GROUP', 'LIMIT', 'AS', 'INNER', 'LEFT', ')'}
+
+
+def plan_problems(conn, sql, params, tables):
+    """مشكلات خطة الاستعلام: مسح كامل لجدول أو ترتيب مؤقت"""
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    aliases = table_aliases(sql, tables)
+    problems = []
+    for row in rows:
+        detail = row[-1]
+        if detail.startswith('SCAN ') and ' USING ' not in detail:
+            # مسح نتائج وسيطة (VALUES / CTE) أو مطابقة FTS5 ليس مسحاً لجدول
+            if detail.split()[1] in aliases and 'VIRTUAL TABLE' not in detail:
+                problems.append(detail)
+        elif 'USE TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems, [row[-1] for row in rows]
+
+
+def sample_ids(conn):
+    row = conn.execute('SELECT reciter_id, moshaf_id FROM ayah_timings LIMIT 1').fetchone()
+    return {'reciter': row[0], 'moshaf': row[1]}
+
+
+# مسارات تعتمد على جداول لا تُبنى افتراضياً (build_database.py --fonts): تُتخطى إذا لم يوجد الجدول
+OPTIONAL_TABLES = {
+    '/api/fonts/<riwayah>': 'font_subsets',
+    '/api/fonts/<riwayah>/page/<int:page_num>': 'font_subsets',
+}
+
+
+def available_requests(conn):
+    """(SAMPLE_REQUESTS دون مسارات الجداول الاختيارية غير المبنية، المسارات المتخطاة)"""
+    skipped = sorted(rule for rule, table in OPTIONAL_TABLES.items()
+                     if not api_server.has_table(table, conn))
+    return {rule: paths for rule, paths in SAMPLE_REQUESTS.items() if rule not in skipped}, skipped
+
+
+def collect_queries():
+    """تشغيل كل الطلبات النموذجية وإرجاع الاستعلامات المسجلة والمسارات الناقصة والمتخطاة (دون ذاكرة مؤقتة)"""
+    api_server.db_pool.close_all()
+    api_server.db_pool = ConnectionPool(api_server.DATABASE_PATH, factory=RecordingConnection)
+    for cache in (api_server.page_cache, api_server.timings_cache,
+                  api_server.compare_cache, api_server.playlist_cache,
+                  api_server.compressed_store.cache):
+        cache.clear()
+        cache.max_bytes = 0
+
+    conn = api_server.db_pool.acquire()
+    ids = sample_ids(conn)
+    requests, skipped = available_requests(conn)
+    api_server.db_pool.release(conn)
+
+    client = api_server.app.test_client()
+    missing = []
+    for rule in api_server.app.url_map.iter_rules():
+        if rule.rule.startswith('/api/') and rule.rule not in SAMPLE_REQUESTS:
+            missing.append(rule.rule)
+
+    for paths in requests.values():
+        for path in paths:
+            with client.get(path.format(**ids)) as response:
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path}: {response.status_code}")
+    batch = {'requests': [
+        {k: (int(v.format(**ids)) if isinstance(v, str) and '{' in v else v) for k, v in item.items()}
+        for item in SAMPLE_BATCH['requests']
+    ]}
+    with client.post('/api/batch', json=batch) as response:
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/batch: {response.status_code}")
+
+    # نفس الاستعلام بمعاملات مختلفة يُفحص مرة واحدة
+    unique = {}
+    for path, sql, params in RecordingConnection.queries:
+        sql = normalize_sql(sql)
+        if path is None or sql.upper().startswith(('PRAGMA', 'EXPLAIN')) or 'sqlite_master' in sql:
+            continue
+        unique.setdefault(sql, (path, params))
+    return unique, missing, skipped
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="فحص خطط استعلامات API")
+    parser.add_argument("--verbose", action="store_true", help="عرض خطة كل استعلام")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    print("=" * 60)
+    print("فحص خطط استعلامات API")
+    print("=" * 60)
+    print(f"\nقاعدة البيانات: {api_server.DATABASE_PATH}")
+
+    queries, missing, skipped = collect_queries()
+    for rule in skipped:
+        print(f"⚠ تخطي {rule}: الجدول {OPTIONAL_TABLES[rule]} غير مبني")
+    conn = sqlite3.connect(f"file:{api_server.DATABASE_PATH.resolve().as_posix()}?mode=ro", uri=True)
+
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    failures = 0
+    for sql, (path, params) in sorted(queries.items(), key=lambda item: item[1][0]):
+        problems, plan = plan_problems(conn, sql, params, tables)
+        allowed = next((reason for prefix, reason in ALLOWED_SCANS if sql.startswith(prefix)), None)
+        if problems and not allowed:
+            failures += 1
+            print(f"\n✗ {path}\n   {sql[:160]}")
+            for detail in problems:
+                print(f"   ⚠ {detail}")
+        elif args.verbose:
+            mark = f"✓ (مسموح: {allowed})" if problems else "✓"
+            print(f"\n{mark} {path}\n   {sql[:160]}")
+            for detail in plan:
+                print(f"   - {detail}")
+    conn.close()
+
+    for rule in missing:
+        failures += 1
+        print(f"\n✗ لا يوجد طلب نموذجي للمسار {rule} (أضفه إلى SAMPLE_REQUESTS)")
+
+    print(f"\nالاستعلامات المفحوصة: {len(queries)}")
+    if failures:
+        print(f"❌ {failures} مشكلة")
+        sys.exit(1)
+    print("✅ كل الاستعلامات تستخدم الفهارس")
+
+
+if __name__ == "__main__":
+    main()
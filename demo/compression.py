@@ -0,0 +1,222 @@
+"""
+ضغط الاستجابات مسبقاً (gzip / brotli)
+النسخ المضغوطة تُخزَّن بجانب البايتات الأصلية وتُرسل دون إعادة ضغط
+"""
+
+import gzip
+import queue
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from payload_cache import PayloadCache
+
+# مستوى سريع في مسار الطلب (بضعة ms)، ثم يُعاد الضغط بأعلى مستوى في خيط خلفي
+# للاستجابات المخزنة (brotli 11 قد يستغرق مئات ms لتفسير سورة)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+GZIP_BEST_LEVEL = 9
+BROTLI_BEST_QUALITY = 11
+
+# الاستجابات الأصغر من هذا الحجم تُرسل دون ضغط
+MIN_SIZE = 512
+
+# الترميز -> دالة(data, best)
+ENCODERS = {
+    'gzip': lambda data, best=False: gzip.compress(
+        data, GZIP_BEST_LEVEL if best else GZIP_LEVEL, mtime=0),
+}
+if brotli is not None:
+    ENCODERS['br'] = lambda data, best=False: brotli.compress(
+        data, quality=BROTLI_BEST_QUALITY if best else BROTLI_QUALITY)
+
+# ترتيب التفضيل عند تساوي q
+PREFERENCE = ('br', 'gzip', 'identity')
+
+
+def parse_accept_encoding(header):
+    """تحليل ترويسة Accept-Encoding إلى {الترميز: q}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    return accepted
+
+
+def choose_encoding(header):
+    """أفضل ترميز متاح يقبله العميل"""
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*')
+    best, best_q = 'identity', 0.0
+    for name in PREFERENCE:
+        if name != 'identity' and name not in ENCODERS:
+            continue
+        if name in accepted:
+            q = accepted[name]
+        elif wildcard is not None:
+            q = wildcard
+        else:
+            # الإرسال دون ضغط مقبول دائماً ما لم يُرفض صراحة
+            q = 0.001 if name == 'identity' else 0.0
+        # الترتيب يحسم التساوي لصالح الترميز المفضّل
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+class CompressedEntry:
+    """البايتات الأصلية والنسخ المضغوطة لاستجابة واحدة"""
+
+    __slots__ = ('raw', 'mimetype', 'headers', 'encoded', 'cost')
+
+    def __init__(self, raw, mimetype, headers=()):
+        self.raw = raw
+        self.mimetype = mimetype
+        self.headers = list(headers)
+        self.encoded = {}
+        # زمن ضغط كل ترميز بالثواني (الوقت الذي يوفّره كل طلب لاحق)
+        self.cost = {}
+
+    def size(self):
+        return len(self.raw) + sum(len(body) for body in self.encoded.values())
+
+
+class CompressedStore:
+    """ذاكرة LRU للاستجابات مع نسخها المضغوطة
+
+    تُضغط كل نسخة بمستوى سريع عند أول طلب، ثم يعيد خيط خلفي ضغطها بأعلى مستوى
+    (طابور محدود بـ recompress_queue، 0 للتعطيل؛ عند امتلائه يُهمل الطلب الجديد).
+    """
+
+    def __init__(self, max_bytes, min_size=MIN_SIZE, recompress_queue=64):
+        self.cache = PayloadCache('compressed', max_bytes)
+        self.min_size = min_size
+        self.compress_seconds = 0.0
+        self.recompress_seconds = 0.0
+        self.saved_seconds = 0.0
+        self.recompressed = 0
+        self.recompress_dropped = 0
+        self.served = {name: 0 for name in PREFERENCE}
+        self.raw_bytes = {name: 0 for name in ENCODERS}
+        self.encoded_bytes = {name: 0 for name in ENCODERS}
+        self._queue = queue.Queue(recompress_queue) if recompress_queue > 0 else None
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def put(self, key, raw, mimetype, headers=()):
+        entry = CompressedEntry(raw, mimetype, headers)
+        self.cache.put(key, entry, entry.size())
+        return entry
+
+    def body(self, key, entry, encoding):
+        """بايتات الاستجابة بالترميز المطلوب (يُضغط مرة واحدة فقط عند أول طلب)
+
+        key=None: استجابة عابرة غير مخزنة (تُضغط بالمستوى السريع في كل طلب)
+        """
+        if encoding == 'identity' or len(entry.raw) < self.min_size:
+            encoding = 'identity'
+        elif encoding in entry.encoded:
+            with self._lock:
+                self.saved_seconds += entry.cost[encoding]
+        else:
+            start = time.perf_counter()
+            encoded = ENCODERS[encoding](entry.raw)
+            cost = time.perf_counter() - start
+            entry.encoded[encoding] = encoded
+            entry.cost[encoding] = cost
+            if key is not None:
+                self.cache.put(key, entry, entry.size())
+                self._schedule(key, entry, encoding)
+            with self._lock:
+                self.compress_seconds += cost
+                self.raw_bytes[encoding] += len(entry.raw)
+                self.encoded_bytes[encoding] += len(encoded)
+
+        with self._lock:
+            self.served[encoding] += 1
+        if encoding == 'identity':
+            return entry.raw, encoding
+        return entry.encoded[encoding], encoding
+
+    def _schedule(self, key, entry, encoding):
+        """إضافة نسخة إلى طابور إعادة الضغط بأعلى مستوى"""
+        if self._queue is None:
+            return
+        try:
+            self._queue.put_nowait((key, entry, encoding))
+        except queue.Full:
+            with self._lock:
+                self.recompress_dropped += 1
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='recompress', daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            key, entry, encoding = self._queue.get()
+            try:
+                # لا فائدة من ضغط استجابة خرجت من الذاكرة
+                if key in self.cache:
+                    self._recompress(key, entry, encoding)
+            finally:
+                self._queue.task_done()
+
+    def _recompress(self, key, entry, encoding):
+        start = time.perf_counter()
+        encoded = ENCODERS[encoding](entry.raw, best=True)
+        cost = time.perf_counter() - start
+        previous = entry.encoded[encoding]
+        if len(encoded) < len(previous):
+            entry.encoded[encoding] = encoded
+            if key in self.cache:
+                self.cache.put(key, entry, entry.size())
+        with self._lock:
+            self.recompress_seconds += cost
+            self.recompressed += 1
+            self.encoded_bytes[encoding] -= len(previous) - len(entry.encoded[encoding])
+
+    def drain(self):
+        """انتظار انتهاء طابور إعادة الضغط (للقياس والاختبارات)"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self):
+        with self._lock:
+            ratios = {
+                name: round(self.raw_bytes[name] / self.encoded_bytes[name], 2)
+                for name in ENCODERS if self.encoded_bytes[name]
+            }
+            return {
+                **self.cache.stats(),
+                'encodings': list(ENCODERS),
+                'compression_ratio': ratios,
+                'compress_seconds': round(self.compress_seconds, 4),
+                'recompress_seconds': round(self.recompress_seconds, 4),
+                'recompressed': self.recompressed,
+                'recompress_queue': self._queue.qsize() if self._queue is not None else 0,
+                'recompress_dropped': self.recompress_dropped,
+                'cpu_saved_seconds': round(self.saved_seconds, 4),
+                'served': dict(self.served),
+            }
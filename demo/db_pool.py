@@ -0,0 +1,248 @@
+"""
+مجمّع اتصالات SQLite للقراءة فقط
+يفتح قاعدة البيانات مرة واحدة لكل خيط بدلاً من مرة لكل طلب
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from pathlib import Path
+from urllib.parse import quote
+
+# إعدادات PRAGMA المُطبّقة على كل اتصال
+DEFAULT_PRAGMAS = {
+    'mmap_size': 256 * 1024 * 1024,   # ربط الملف بالذاكرة (256 MB)
+    'cache_size': -64 * 1024,         # ذاكرة الصفحات بالكيلوبايت (64 MB)
+    'temp_store': 'MEMORY',           # الجداول المؤقتة في الذاكرة
+    'query_only': 'ON',               # منع أي كتابة
+}
+
+
+def readonly_uri(db_path, immutable=True):
+    """بناء رابط URI لفتح قاعدة البيانات للقراءة فقط"""
+    path = quote(Path(db_path).resolve().as_posix())
+    uri = f"file:{path}?mode=ro"
+    if immutable:
+        # الملف لا يتغير أثناء التشغيل: لا أقفال ولا فحص للتغييرات
+        uri += "&immutable=1"
+    return uri
+
+
+def connect_readonly(db_path, pragmas=None, immutable=True, row_factory=sqlite3.Row,
+                     factory=sqlite3.Connection):
+    """فتح اتصال للقراءة فقط مع إعدادات PRAGMA المحسّنة"""
+    # check_same_thread=False يسمح بإغلاق الاتصالات من خيط آخر عند الإيقاف
+    conn = sqlite3.connect(
+        readonly_uri(db_path, immutable), uri=True, check_same_thread=False, factory=factory
+    )
+    conn.row_factory = row_factory
+    for name, value in (DEFAULT_PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f'PRAGMA {name} = {value}')
+    return conn
+
+
+# ==================== سياسات المجمّع ====================
+
+class PoolPolicy:
+    """الواجهة الأساسية لسياسات توزيع الاتصالات"""
+
+    name = 'base'
+
+    def __init__(self, connect):
+        self.connect = connect
+
+    def acquire(self):
+        raise NotImplementedError
+
+    def release(self, conn):
+        pass
+
+    def invalidate(self):
+        pass
+
+    def open_count(self):
+        """عدد الاتصالات المفتوحة التي يحتفظ بها المجمّع"""
+        return 0
+
+    def close_all(self):
+        pass
+
+
+class PerRequestPolicy(PoolPolicy):
+    """اتصال جديد لكل طلب (السلوك القديم - للمقارنة فقط)"""
+
+    name = 'request'
+
+    def acquire(self):
+        return self.connect()
+
+    def release(self, conn):
+        conn.close()
+
+
+class _ThreadConnection:
+    """اتصال خيط واحد: يُغلق عند انتهاء الخيط (حين يُحذف من threading.local) أو عند الإبطال"""
+
+    __slots__ = ('conn', 'generation', 'close', '__weakref__')
+
+    def __init__(self, conn, generation, connections):
+        self.conn = conn
+        self.generation = generation
+        # لا يشير المُنهي إلى هذا الكائن حتى لا يمنع حذفه
+        self.close = weakref.finalize(self, _close_connection, connections, id(conn), conn)
+        connections[id(conn)] = self.close
+
+
+def _close_connection(connections, key, conn):
+    connections.pop(key, None)
+    conn.close()
+
+
+class ThreadLocalPolicy(PoolPolicy):
+    """اتصال واحد دائم لكل خيط يُغلق بانتهاء الخيط، ويُعاد فتحه تلقائياً بعد fork"""
+
+    name = 'thread'
+
+    def __init__(self, connect):
+        super().__init__(connect)
+        self._local = threading.local()
+        # الاتصالات المفتوحة -> دالة إغلاقها (تُحذف عند الإغلاق)
+        self._connections = {}
+        self.generation = 0
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def acquire(self):
+        slot = getattr(self._local, 'slot', None)
+        if slot is not None and slot.generation != self.generation:
+            # تغيّر ملف قاعدة البيانات: إغلاق الاتصال القديم لهذا الخيط
+            slot.close()
+            slot = None
+        if slot is None:
+            slot = _ThreadConnection(self.connect(), self.generation, self._connections)
+            self._local.slot = slot
+        return slot.conn
+
+    def invalidate(self):
+        self.generation += 1
+
+    def open_count(self):
+        return len(self._connections)
+
+    def close_all(self):
+        for close in list(self._connections.values()):
+            close()
+        self._local = threading.local()
+
+    def _after_fork(self):
+        # لا يجوز استخدام اتصالات SQLite الموروثة من العملية الأم ولا إغلاقها
+        for close in list(self._connections.values()):
+            close.detach()
+        self._connections.clear()
+        self._local = threading.local()
+
+
+POLICIES = {
+    PerRequestPolicy.name: PerRequestPolicy,
+    ThreadLocalPolicy.name: ThreadLocalPolicy,
+}
+
+
+def register_policy(policy_class):
+    """تسجيل سياسة جديدة لاستخدامها بالاسم"""
+    POLICIES[policy_class.name] = policy_class
+    return policy_class
+
+
+# ==================== المجمّع ====================
+
+class ConnectionPool:
+    """مجمّع اتصالات للقراءة فقط بسياسة قابلة للاستبدال"""
+
+    def __init__(self, db_path, policy='thread', pragmas=None, immutable=True,
+                 factory=sqlite3.Connection):
+        self.db_path = Path(db_path)
+        self.pragmas = pragmas
+        self.immutable = immutable
+        self.factory = factory
+        self.opened = 0
+        self.acquired = 0
+        policy_class = POLICIES[policy] if isinstance(policy, str) else policy
+        self.policy = policy_class(self._connect)
+
+    def _connect(self):
+        conn = connect_readonly(self.db_path, self.pragmas, self.immutable, factory=self.factory)
+        self.opened += 1
+        return conn
+
+    def acquire(self):
+        """الحصول على اتصال حسب السياسة"""
+        self.acquired += 1
+        return self.policy.acquire()
+
+    def release(self, conn):
+        """إعادة الاتصال إلى المجمّع"""
+        self.policy.release(conn)
+
+    def invalidate(self):
+        """إعادة فتح الاتصالات عند الطلب التالي (بعد تغيّر الملف)"""
+        self.policy.invalidate()
+
+    def close_all(self):
+        """إغلاق جميع الاتصالات المفتوحة"""
+        self.policy.close_all()
+
+    def stats(self):
+        return {
+            'policy': self.policy.name,
+            'opened': self.opened,
+            'acquired': self.acquired,
+            'open': self.policy.open_count(),
+        }
+
+
+# ==================== مراقبة الملف ====================
+
+def database_signature(db_path):
+    """بصمة ملف قاعدة البيانات (تتغير عند إعادة البناء)"""
+    try:
+        st = os.stat(db_path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class DatabaseWatcher:
+    """مراقبة تغيّر ملف قاعدة البيانات واستدعاء دوال الإبطال"""
+
+    def __init__(self, db_path, interval=1.0):
+        self.db_path = Path(db_path)
+        self.interval = interval
+        self.signature = database_signature(self.db_path)
+        self._checked_at = time.monotonic()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def on_change(self, callback):
+        """تسجيل دالة تُستدعى عند تغيّر الملف"""
+        self._callbacks.append(callback)
+        return callback
+
+    def check(self, force=False):
+        """فحص الملف (مرة واحدة على الأكثر كل interval ثانية ما لم يكن force)"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.interval:
+            return False
+        with self._lock:
+            if not force and now - self._checked_at < self.interval:
+                return False
+            self._checked_at = now
+            signature = database_signature(self.db_path)
+            if signature == self.signature:
+                return False
+            self.signature = signature
+        for callback in self._callbacks:
+            callback()
+        return True
@@ -0,0 +1,120 @@
+"""
+فهرس التقسيمات في الذاكرة: الآية أو الصفحة -> الجزء والحزب والربع
+يُبنى مرة واحدة من جداول juzs و ahzab و quarters وحدود صفحات ayat كمصفوفات مرتبة لكل رواية،
+ثم يجيب بالبحث الثنائي (bisect) دون أي استعلام
+"""
+
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+
+# نوع التقسيم -> (الجدول، عمود الرقم، عمود سورة البداية، عمود آية البداية)
+DIVISIONS = {
+    'juz': ('juzs', 'number', 'start_sura', 'start_aya'),
+    'hizb': ('ahzab', 'hizb_num', 'start_sura', 'start_aya'),
+    'quarter': ('quarters', 'quarter_num', 'sura_no', 'aya_no'),
+}
+
+
+def ayah_key(sura, aya):
+    """موضع الآية في ترتيب المصحف كعدد واحد (أطول سورة 286 آية)"""
+    return sura * 1000 + aya
+
+
+def format_key(key):
+    return f'{key // 1000}:{key % 1000}'
+
+
+class RiwayahDivisions:
+    """بدايات التقسيمات وحدود الصفحات لرواية واحدة"""
+
+    __slots__ = ('starts', 'numbers', 'page_first', 'page_last', 'sura_ayat')
+
+    def __init__(self, divisions, pages, suras):
+        # نوع التقسيم -> مفاتيح آيات البداية (مرتبة) وأرقامها بنفس الترتيب
+        self.starts = {}
+        self.numbers = {}
+        for kind, rows in divisions.items():
+            rows = sorted((ayah_key(sura, aya), number) for number, sura, aya in rows)
+            self.starts[kind] = array('l', [key for key, _ in rows])
+            self.numbers[kind] = array('H', [number for _, number in rows])
+
+        # الصفحة -> مفتاح أول آية وآخر آية فيها (0 لصفحة دون آيات)
+        size = max(pages, default=0) + 1
+        self.page_first = array('l', [0]) * size
+        self.page_last = array('l', [0]) * size
+        for page, (first, last) in pages.items():
+            self.page_first[page] = first
+            self.page_last[page] = last
+
+        # السورة -> عدد آياتها (يختلف بين الروايات)
+        self.sura_ayat = array('H', [0]) * (max(suras, default=0) + 1)
+        for sura, count in suras.items():
+            self.sura_ayat[sura] = count
+
+    def division_at(self, kind, key):
+        """رقم التقسيم الذي يحتوي الآية (أو None قبل أول تقسيم)"""
+        i = bisect_right(self.starts[kind], key) - 1
+        return self.numbers[kind][i] if i >= 0 else None
+
+    def divisions_between(self, kind, first, last):
+        """أرقام التقسيمات التي تتقاطع مع المجال [first, last] بالترتيب"""
+        starts = self.starts[kind]
+        lo = max(bisect_right(starts, first) - 1, 0)
+        hi = bisect_right(starts, last)
+        return list(self.numbers[kind][lo:hi])
+
+    def locate_ayah(self, sura, aya):
+        """{'juz', 'hizb', 'quarter'} للآية (أو None إذا لم تكن في الرواية)"""
+        if not (0 < sura < len(self.sura_ayat) and 0 < aya <= self.sura_ayat[sura]):
+            return None
+        key = ayah_key(sura, aya)
+        return {kind: self.division_at(kind, key) for kind in self.starts}
+
+    def locate_page(self, page):
+        """أول آية وآخر آية والسور والتقسيمات التي تظهر في الصفحة (أو None)"""
+        if not 0 < page < len(self.page_first) or not self.page_first[page]:
+            return None
+        first, last = self.page_first[page], self.page_last[page]
+        located = {
+            'first': format_key(first),
+            'last': format_key(last),
+            'suras': list(range(first // 1000, last // 1000 + 1)),
+        }
+        for kind in self.starts:
+            located[kind] = self.divisions_between(kind, first, last)
+        return located
+
+    def nbytes(self):
+        arrays = [*self.starts.values(), *self.numbers.values(),
+                  self.page_first, self.page_last, self.sura_ayat]
+        return sum(a.itemsize * len(a) for a in arrays)
+
+
+def load_divisions(conn):
+    """{الرواية: RiwayahDivisions} من قاعدة البيانات (الجداول صغيرة وتُقرأ كاملة)"""
+    divisions = defaultdict(lambda: {kind: [] for kind in DIVISIONS})
+    for kind, (table, number_col, sura_col, aya_col) in DIVISIONS.items():
+        for riwayah, number, sura, aya in conn.execute(
+            f'SELECT riwayah_key, {number_col}, {sura_col}, {aya_col} FROM {table}'
+        ):
+            if sura and aya:
+                divisions[riwayah][kind].append((number, sura, aya))
+
+    # فهرس (page, riwayah_key, sura_no, aya_no) يعطي حدود كل صفحة دون ترتيب مؤقت
+    pages = defaultdict(dict)
+    for page, riwayah, first, last in conn.execute('''
+        SELECT page, riwayah_key, MIN(sura_no * 1000 + aya_no), MAX(sura_no * 1000 + aya_no)
+        FROM ayat GROUP BY page, riwayah_key
+    '''):
+        if page:
+            pages[riwayah][page] = (first, last)
+
+    suras = defaultdict(dict)
+    for riwayah, number, count in conn.execute('SELECT riwayah_key, number, ayat_count FROM surahs'):
+        suras[riwayah][number] = count or 0
+
+    return {
+        riwayah: RiwayahDivisions(divisions[riwayah], pages[riwayah], suras[riwayah])
+        for riwayah in pages
+    }
@@ -0,0 +1,291 @@
+"""
+مقاييس الخادم بصيغة Prometheus النصية
+زمن كل مسار وعدد الطلبات حسب الحالة واستعلامات SQLite وإحصائيات الذاكرة المؤقتة
+لا يُسجَّل أي شيء في التطبيق ما لم يُستدعَ install (QURAN_METRICS=1)
+"""
+
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request
+
+# حدود فئات المدرّج التكراري بالثواني
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# عدد تعليمات SQLite بين كل استدعاءين لدالة التقدم
+PROGRESS_STEPS = 1000
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != int(value) else str(int(value))
+    return str(value)
+
+
+class Counter:
+    """عدّاد تراكمي لكل مجموعة تسميات"""
+
+    type = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(float)
+
+    def inc(self, *label_values, amount=1):
+        self.values[label_values] += amount
+
+    def samples(self):
+        for label_values, value in sorted(self.values.items()):
+            yield self.name, tuple(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    """مدرّج تكراري بفئات ثابتة لكل مجموعة تسميات"""
+
+    type = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+
+    def observe(self, *label_values, value):
+        series = self.values.get(label_values)
+        if series is None:
+            series = self.values[label_values] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for label_values, (counts, total, count) in sorted(self.values.items()):
+            labels = tuple(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', labels + (('le', format_value(float(bound))),), cumulative
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), count
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Metrics:
+    """سجل المقاييس مع جامعي قيم خارجيين (المجمّع والذاكرة المؤقتة)"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def collect(self, collector):
+        """تسجيل دالة تُرجع [(الاسم، النوع، الوصف، [(التسميات، القيمة)])] عند كل قراءة"""
+        self.collectors.append(collector)
+        return collector
+
+    def render(self):
+        """المقاييس بصيغة Prometheus النصية"""
+        families = []
+        with self.lock:
+            for metric in self.metrics:
+                families.append((metric.name, metric.type, metric.help, list(metric.samples())))
+        for collector in self.collectors:
+            for name, kind, help, values in collector():
+                families.append((name, kind, help, [(name, labels, value) for labels, value in values]))
+
+        out = []
+        for name, kind, help, samples in families:
+            out.append(f'# HELP {name} {help}')
+            out.append(f'# TYPE {name} {kind}')
+            for sample_name, labels, value in samples:
+                out.append(f'{sample_name}{format_labels(labels)} {format_value(value)}')
+        return '\n'.join(out) + '\n'
+
+
+registry = Metrics()
+
+http_requests = registry.counter(
+    'quran_http_requests_total', 'Requests by route, method and status',
+    labels=('route', 'method', 'status'),
+)
+http_duration = registry.histogram(
+    'quran_http_request_duration_seconds', 'Request latency by route',
+    labels=('route',),
+)
+sqlite_queries = registry.counter(
+    'quran_sqlite_queries_total', 'SQLite queries issued by route',
+    labels=('route',),
+)
+sqlite_statements = registry.counter(
+    'quran_sqlite_statements_total', 'SQLite statements traced by route (including FTS5 internals)',
+    labels=('route',),
+)
+sqlite_duration = registry.histogram(
+    'quran_sqlite_duration_seconds', 'Time spent in SQLite per request by route',
+    labels=('route',),
+)
+sqlite_steps = registry.counter(
+    'quran_sqlite_vm_steps_total', f'SQLite VM instructions by route (in units of {PROGRESS_STEPS})',
+    labels=('route',),
+)
+
+
+# ==================== قياس SQLite ====================
+
+# عدّادات الطلب الحالي (اتصال واحد لكل خيط في المجمّع)
+_local = threading.local()
+
+
+def _reset_request_counters():
+    _local.queries = 0
+    _local.statements = 0
+    _local.steps = 0
+    _local.seconds = 0.0
+
+
+def _on_statement(statement):
+    _local.statements = getattr(_local, 'statements', 0) + 1
+
+
+def _on_progress():
+    _local.steps = getattr(_local, 'steps', 0) + 1
+    return 0  # الاستمرار في تنفيذ الاستعلام
+
+
+def _timed(method, query=False):
+    def wrapper(self, *args):
+        if query:
+            _local.queries = getattr(_local, 'queries', 0) + 1
+        start = time.perf_counter()
+        try:
+            return method(self, *args)
+        finally:
+            _local.seconds = getattr(_local, 'seconds', 0.0) + time.perf_counter() - start
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class TimedCursor(sqlite3.Cursor):
+    """مؤشر يقيس الوقت المستغرق في التنفيذ وجلب الصفوف
+
+    يشمل المرور على المؤشر (for row in cursor) الذي تقرأ به fetch_dicts والبث في
+    /api/range و /api/export: كل صف يُقرأ بخطوة من SQLite
+    """
+
+    execute = _timed(sqlite3.Cursor.execute, query=True)
+    executemany = _timed(sqlite3.Cursor.executemany, query=True)
+    fetchone = _timed(sqlite3.Cursor.fetchone)
+    fetchmany = _timed(sqlite3.Cursor.fetchmany)
+    fetchall = _timed(sqlite3.Cursor.fetchall)
+    __next__ = _timed(sqlite3.Cursor.__next__)
+
+
+class TimedConnection(sqlite3.Connection):
+    """اتصال يعدّ الاستعلامات (trace) وتعليمات SQLite (progress) ويقيس زمنها"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        super().set_trace_callback(_on_statement)
+        self.set_progress_handler(_on_progress, PROGRESS_STEPS)
+
+    def set_trace_callback(self, callback):
+        """callback إضافي يُستدعى بعد عدّاد العبارات (لا يحل محله)"""
+        if callback is None:
+            return super().set_trace_callback(_on_statement)
+
+        def chained(statement):
+            _on_statement(statement)
+            callback(statement)
+        return super().set_trace_callback(chained)
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+
+# ==================== ربط التطبيق ====================
+
+def route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _record(route, method, response_status, start):
+    elapsed = time.perf_counter() - start
+    with registry.lock:
+        http_requests.inc(route, method, str(response_status))
+        http_duration.observe(route, value=elapsed)
+        queries = getattr(_local, 'queries', 0)
+        if queries:
+            sqlite_queries.inc(route, amount=queries)
+            sqlite_statements.inc(route, amount=_local.statements)
+            sqlite_duration.observe(route, value=_local.seconds)
+            sqlite_steps.inc(route, amount=_local.steps)
+
+
+def install(app, path='/metrics'):
+    """تفعيل القياس: يُستدعى قبل تسجيل باقي دوال before_request ليشملها الزمن"""
+
+    @app.before_request
+    def metrics_start():
+        g.metrics_start = time.perf_counter()
+        _reset_request_counters()
+
+    @app.after_request
+    def metrics_record(response):
+        g.metrics_recorded = True
+        args = (route_label(), request.method, response.status_code, g.metrics_start)
+        if response.is_streamed:
+            # الاستجابات المتدفقة (/api/range، /api/export) تقرأ صفوفها بعد after_request:
+            # تُسجَّل عند إغلاق الاستجابة بعد انتهاء البث (في نفس الخيط)
+            response.call_on_close(lambda: _record(*args))
+        else:
+            _record(*args)
+        return response
+
+    @app.teardown_request
+    def metrics_error(exc):
+        # استثناء غير معالج: after_request لا يُستدعى
+        if exc is not None and 'metrics_start' in g and not g.get('metrics_recorded'):
+            g.metrics_recorded = True
+            _record(route_label(), request.method, 500, g.metrics_start)
+
+    def metrics_view():
+        return app.response_class(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule(path, 'metrics', metrics_view)
+    return registry
@@ -0,0 +1,69 @@
+"""
+ذاكرة مؤقتة لاستجابات JSON الجاهزة (بايتات) مع حد للذاكرة وإخراج LRU
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class PayloadCache:
+    """ذاكرة LRU للبايتات المُرمّزة مسبقاً بحد أقصى للحجم (أو لقيم بحجم مُعطى)"""
+
+    def __init__(self, name, max_bytes):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """إرجاع البايتات المخزنة أو None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def put(self, key, body, size=None):
+        """تخزين البايتات مع إخراج الأقدم عند تجاوز الحد"""
+        size = len(body) if size is None else size
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= old[1]
+            self._items[key] = (body, size)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """إفراغ الذاكرة (عند تغيّر قاعدة البيانات)"""
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'name': self.name,
+                'entries': len(self._items),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,105 @@
+"""
+جلب مسبق للصفحات المجاورة في خيط خلفي
+القارئ ينتقل غالباً إلى الصفحة التالية أو السابقة، فتُبنى في الذاكرة المؤقتة قبل طلبها
+"""
+
+import queue
+import threading
+from collections import OrderedDict
+
+
+class Prefetcher:
+    """طابور محدود لمفاتيح تُبنى في الخلفية بدالة build(key) وتُخزَّن في cache
+
+    build تُرجع البايتات أو None (لا شيء يُخزَّن).
+    عند امتلاء الطابور يُهمل الطلب الجديد (لا انتظار في مسار الطلب).
+    """
+
+    def __init__(self, cache, build, max_queue=64, track=4096):
+        self.cache = cache
+        self.build = build
+        self.max_queue = max_queue
+        self.scheduled = 0
+        self.dropped = 0
+        self.completed = 0
+        self.errors = 0
+        self.hits = 0
+        self._queue = queue.Queue(max_queue) if max_queue > 0 else None
+        self._pending = set()
+        # المفاتيح المبنية مسبقاً ولم تُطلب بعد (لقياس الفائدة)
+        self._prefetched = OrderedDict()
+        self._track = track
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._worker = None
+
+    @property
+    def enabled(self):
+        return self._queue is not None
+
+    def schedule(self, keys):
+        """إضافة مفاتيح غير موجودة في الذاكرة إلى الطابور"""
+        if self._queue is None:
+            return
+        for key in keys:
+            if key in self.cache:
+                continue
+            with self._lock:
+                if key in self._pending:
+                    continue
+                try:
+                    self._queue.put_nowait((key, self._generation))
+                except queue.Full:
+                    self.dropped += 1
+                    continue
+                self._pending.add(key)
+                self.scheduled += 1
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='prefetch', daemon=True)
+                    self._worker.start()
+
+    def consume(self, key):
+        """تسجيل طلب مفتاح من الذاكرة: True إذا كان مبنياً مسبقاً"""
+        with self._lock:
+            if self._prefetched.pop(key, None) is None:
+                return False
+            self.hits += 1
+            return True
+
+    def clear(self):
+        """إهمال الطابور والنتائج الجارية (عند تغيّر قاعدة البيانات)"""
+        with self._lock:
+            self._generation += 1
+            self._prefetched.clear()
+
+    def _run(self):
+        while True:
+            key, generation = self._queue.get()
+            try:
+                if generation == self._generation and key not in self.cache:
+                    body = self.build(key)
+                    with self._lock:
+                        # لا نخزن نتيجة بُنيت من قاعدة بيانات تغيّرت أثناء البناء
+                        if body is not None and generation == self._generation:
+                            self.cache.put(key, body)
+                            self._prefetched[key] = True
+                            if len(self._prefetched) > self._track:
+                                self._prefetched.popitem(last=False)
+                            self.completed += 1
+            except Exception:
+                self.errors += 1
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue': self._queue.qsize() if self._queue is not None else 0,
+                'max_queue': self.max_queue,
+                'scheduled': self.scheduled,
+                'dropped': self.dropped,
+                'completed': self.completed,
+                'errors': self.errors,
+                'hits': self.hits,
+            }
@@ -0,0 +1,88 @@
+"""
+ترميز JSON لاستجابات API
+orjson عند تثبيتها (pip install orjson) وإلا مكتبة json القياسية، والمخرجات نفسها بايتاً ببايت:
+UTF-8 دون تهريب الحروف العربية، ومفاتيح مرتبة، ودون مسافات
+
+الصفوف تُقرأ كـ tuples عادية وتُحوَّل إلى قواميس بأسماء أعمدة تُحسب مرة واحدة لكل استعلام
+بدل sqlite3.Row و row.keys() لكل صف
+"""
+
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # اختياري: المكتبة القياسية تعطي نفس البايتات
+    orjson = None
+
+ENCODERS = ('orjson', 'json')
+
+# QURAN_JSON_ENCODER=json لفرض المكتبة القياسية (للمقارنة)
+DEFAULT_ENCODER = os.environ.get('QURAN_JSON_ENCODER') or ('orjson' if orjson else 'json')
+
+
+def tuple_cursor(conn):
+    """مؤشر يُرجع الصفوف كـ tuples (دون كائن sqlite3.Row لكل صف)"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+def fetch_dicts(cursor):
+    """صفوف الاستعلام كقواميس: أسماء الأعمدة من وصف المؤشر مرة واحدة لا من كل صف"""
+    columns = tuple(column[0] for column in cursor.description)
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """مزوّد JSON لـ Flask يستخدم orjson إن وُجدت
+
+    الأنواع غير الأساسية (التواريخ، Decimal، dataclass) تمر في الحالتين بـ default نفسها.
+    الاختلاف الوحيد المعروف: الأعداد العشرية بصيغة الأس (1e16 مقابل 1e+16) -
+    بيانات API لا تحتوي أعداداً عشرية، ويتحقق bench_serialization.py من تطابق كل المسارات.
+    """
+
+    ensure_ascii = False
+    sort_keys = True
+
+    def __init__(self, app, encoder=None):
+        super().__init__(app)
+        self.encoder = encoder or DEFAULT_ENCODER
+
+    @property
+    def encoder(self):
+        return self._encoder
+
+    @encoder.setter
+    def encoder(self, name):
+        if name not in ENCODERS:
+            raise ValueError(f"Unknown JSON encoder: {name}")
+        # orjson غير مثبتة: المكتبة القياسية
+        self._encoder = name if name == 'json' or orjson is not None else 'json'
+        if self._encoder == 'orjson':
+            options = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+                       | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+            self._encode = lambda obj: orjson.dumps(obj, default=self.default, option=options)
+        else:
+            encode = json.JSONEncoder(
+                ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=self.default
+            ).encode
+            self._encode = lambda obj: encode(obj).encode('utf-8')
+
+    def dumps_bytes(self, obj):
+        """ترميز كائن إلى بايتات UTF-8"""
+        return self._encode(obj)
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self._encode(obj).decode('utf-8')
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # وضع التطوير: JSON منسّق للقراءة كما في Flask
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(self._encode(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,288 @@
+"""
+خادم إنتاج متعدد العمليات (prefork) بذاكرة مؤقتة مشتركة
+العملية الرئيسية تحمّل الصفحات والتوقيتات والبيانات الوصفية مرة واحدة ثم تتفرّع إلى
+عمّال يتشاركون هذه الذاكرة (نسخ عند الكتابة) ويستقبلون الطلبات على نفس المنفذ
+
+الاستخدام:
+    cd demo
+    python serve.py --workers 4 --port 8000
+    kill -HUP <pid>    # إعادة تشغيل العمّال تدريجياً (مع إعادة الإحماء إذا تغيّرت قاعدة البيانات)
+    kill -TERM <pid>   # إيقاف لطيف: إكمال الطلبات الجارية ثم الخروج
+"""
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+sys.stdout.reconfigure(encoding='utf-8')
+
+from werkzeug.serving import BaseWSGIServer
+
+import api_server
+
+# مهلة إكمال الطلبات الجارية عند إيقاف عامل (بالثواني)
+GRACEFUL_TIMEOUT = 30
+
+# عدد الخيوط في كل عامل (اتصال SQLite دائم لكل خيط)
+WORKER_THREADS = 8
+
+
+def warm_caches():
+    """تحميل البيانات المشتقة من قاعدة البيانات في العملية الرئيسية قبل التفرّع"""
+    gc.unfreeze()
+    conn = api_server.db_pool.acquire()
+    try:
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables + ['ayat_fts', 'dataset_stats', 'metadata']:
+            api_server.table_columns(table, conn)
+    finally:
+        api_server.db_pool.release(conn)
+    api_server.dataset_info()
+    api_server.riwayah_page_counts()
+    api_server.division_index()
+    api_server.ayah_index()
+    pages = api_server.prewarm_page_cache()
+    timings = api_server.prewarm_timings()
+
+    # لا تُورَّث اتصالات SQLite عبر fork
+    api_server.db_pool.close_all()
+    # نقل الكائنات إلى الجيل الدائم: جامع القمامة في العمّال لا يلمس صفحاتها فتبقى مشتركة
+    gc.collect()
+    gc.freeze()
+    return pages, timings
+
+
+def memory_report(pid):
+    """ذاكرة العملية وأبنائها من /proc: (pid، RSS، المشتركة، الخاصة) بالميغابايت"""
+    pids = [pid]
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        pass
+
+    report = []
+    for child in pids:
+        fields = {}
+        try:
+            with open(f'/proc/{child}/smaps_rollup') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if value.strip().endswith('kB'):
+                        fields[name] = int(value.split()[0])
+        except OSError:
+            continue
+        shared = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+        private = fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+        report.append((child, fields.get('Rss', 0) / 1024, shared / 1024, private / 1024))
+    return report
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """خادم WSGI بعدد ثابت من الخيوط
+
+    خادم werkzeug المتعدد الخيوط ينشئ خيطاً لكل طلب، فيفتح المجمّع (اتصال لكل خيط)
+    اتصالاً جديداً لكل طلب. هنا الخيوط ثابتة فتبقى الاتصالات وذاكرتها ثابتة.
+    """
+
+    multithread = True
+
+    def __init__(self, *args, threads=WORKER_THREADS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='quran-worker')
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+
+def run_worker(sock, threads=WORKER_THREADS, access_log=False):
+    """عامل: خادم WSGI على المقبس الموروث حتى SIGTERM"""
+    if not access_log:
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    host, port = sock.getsockname()[:2]
+    server = PooledWSGIServer(host, port, api_server.app, fd=sock.fileno(), threads=threads)
+
+    def stop(signum, frame):
+        # shutdown ينتظر انتهاء الحلقة فلا يُستدعى من خيطها
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    # serve_forever يغلق المقبس عند الخروج، ثم ننتظر الطلبات الجارية بدل قطعها
+    server.serve_forever()
+    server.executor.shutdown(wait=True)
+
+
+class Master:
+    """العملية الرئيسية: تتفرّع إلى العمّال وتعيد تشغيلهم وتوقفهم"""
+
+    def __init__(self, sock, workers, threads=WORKER_THREADS, graceful_timeout=GRACEFUL_TIMEOUT,
+                 access_log=False):
+        self.sock = sock
+        self.size = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.access_log = access_log
+        self.workers = set()
+        self.reload = False
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                run_worker(self.sock, self.threads, self.access_log)
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self.workers.add(pid)
+        return pid
+
+    def reap(self):
+        """جمع العمّال المنتهين وإرجاع عددهم"""
+        exited = 0
+        while self.workers:
+            try:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            self.workers.discard(pid)
+            exited += 1
+        return exited
+
+    def stop_worker(self, pid):
+        """إيقاف عامل بلطف ثم قسراً بعد انتهاء المهلة"""
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                done = pid
+            if done:
+                self.workers.discard(pid)
+                return
+            time.sleep(0.05)
+        os.kill(pid, signal.SIGKILL)
+        os.waitpid(pid, 0)
+        self.workers.discard(pid)
+
+    def restart(self):
+        """إعادة تشغيل تدريجية: عامل جديد قبل إيقاف كل عامل قديم (دون انقطاع الخدمة)"""
+        if api_server.db_watcher.check(force=True):
+            pages, timings = warm_caches()
+            print(f"✓ تغيّرت قاعدة البيانات: إعادة الإحماء ({pages} صفحة، {timings} سورة)", flush=True)
+        for pid in list(self.workers):
+            self.spawn()
+            self.stop_worker(pid)
+        print(f"✓ أُعيد تشغيل {self.size} عامل", flush=True)
+
+    def run(self):
+        def on_hup(signum, frame):
+            self.reload = True
+
+        def on_stop(signum, frame):
+            self.stopping = True
+
+        signal.signal(signal.SIGHUP, on_hup)
+        signal.signal(signal.SIGTERM, on_stop)
+        signal.signal(signal.SIGINT, on_stop)
+
+        for _ in range(self.size):
+            self.spawn()
+
+        while not self.stopping:
+            # عامل انتهى بشكل غير متوقع: استبداله (بعد مهلة حتى لا يتكرر الانهيار بسرعة)
+            exited = self.reap()
+            if exited and not self.stopping:
+                print(f"⚠ انتهى {exited} عامل بشكل غير متوقع", flush=True)
+                time.sleep(1)
+                for _ in range(exited):
+                    self.spawn()
+            if self.reload:
+                self.reload = False
+                self.restart()
+            time.sleep(0.2)
+
+        # إرسال الإشارة للجميع أولاً ليُكملوا طلباتهم بالتوازي
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.workers):
+            self.stop_worker(pid)
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(description="خادم API متعدد العمليات بذاكرة مشتركة")
+    parser.add_argument("--host", default="0.0.0.0", help="عنوان الاستماع")
+    parser.add_argument("--port", type=int, default=8000, help="المنفذ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="عدد العمليات العاملة")
+    parser.add_argument("--threads", type=int, default=WORKER_THREADS, help="عدد الخيوط في كل عامل")
+    parser.add_argument("--backlog", type=int, default=1024, help="طول طابور الاتصالات")
+    parser.add_argument(
+        "--graceful-timeout",
+        type=float,
+        default=GRACEFUL_TIMEOUT,
+        help="مهلة إكمال الطلبات الجارية عند الإيقاف (بالثواني)"
+    )
+    parser.add_argument("--access-log", action="store_true", help="طباعة سطر لكل طلب")
+    return parser
+
+
+def main():
+    args = build_arg_parser().parse_args()
+    if not hasattr(os, 'fork'):
+        sys.exit("serve.py يتطلب نظاماً يدعم fork (Linux/macOS)؛ استخدم asgi_app.py بدلاً منه")
+
+    print("=" * 60)
+    print("خادم API للقرآن الكريم (متعدد العمليات)")
+    print("=" * 60)
+    print(f"\nقاعدة البيانات: {api_server.DATABASE_PATH}")
+
+    start = time.perf_counter()
+    pages, timings = warm_caches()
+    print(f"✓ الإحماء في {time.perf_counter() - start:.1f} ث: {pages} صفحة "
+          f"({api_server.page_cache.size / (1024 * 1024):.1f} MB) و {timings} سورة توقيتات "
+          f"({api_server.timings_cache.size / (1024 * 1024):.1f} MB)")
+    lookup = api_server.lookup_tables_size()
+    print(f"✓ فهارس الذاكرة لـ {len(lookup['ayah_index'])} رواية: أرقام الآيات "
+          f"{sum(lookup['ayah_index'].values()) / 1024:.0f} KB والتقسيمات "
+          f"{sum(lookup['divisions'].values()) / 1024:.0f} KB")
+
+    sock = socket.create_server((args.host, args.port), backlog=args.backlog)
+    print(f"✓ {args.workers} عامل على http://{args.host}:{sock.getsockname()[1]} (PID {os.getpid()})", flush=True)
+    Master(sock, args.workers, args.threads, args.graceful_timeout, args.access_log).run()
+    sock.close()
+    print("✓ تم الإيقاف")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,11 @@
 اختبار بسيط للتحقق من أن قاعدة البيانات تعمل
 """
 
+import os
 import sqlite3
 from pathlib import Path
 
-db_path = Path(__file__).parent.parent / "quran_database.db"
+db_path = Path(os.environ.get("QURAN_DB_PATH", Path(__file__).parent.parent / "quran_database.db"))
 
 if not db_path.exists():
     print("❌ خطأ: قاعدة البيانات غير موجودة!")
@@ -44,9 +45,172 @@ try:
     print(f"✅ عدد القراء: {reciters_count}")
     
     conn.close()
-    print("\n✅ كل شيء يعمل بشكل صحيح!")
     
 except Exception as e:
     print(f"❌ خطأ: {e}")
     exit(1)
 
+# اختبار التخزين المؤقت عبر HTTP: الرد 304 لا يُنفّذ أي استعلام
+try:
+    os.environ.setdefault('QURAN_DB_PATH', str(db_path))
+    import api_server
+except ImportError as e:
+    print(f"⚠ تخطي اختبار الخادم (المتطلبات غير مثبتة): {e}")
+else:
+    client = api_server.app.test_client()
+    response = client.get('/api/page/1')
+    etag = response.headers.get('ETag')
+    if response.status_code != 200 or not etag:
+        print("❌ خطأ: لا يوجد ETag في استجابة /api/page/1")
+        exit(1)
+    
+    # عدّ الاستعلامات على اتصال المجمّع الخاص بهذا الخيط
+    queries = []
+    pooled = api_server.db_pool.acquire()
+    pooled.set_trace_callback(queries.append)
+    try:
+        client.get('/api/surahs/1')
+        if not queries:
+            print("❌ خطأ: عدّاد الاستعلامات لا يعمل")
+            exit(1)
+        
+        queries.clear()
+        response = client.get('/api/page/1', headers={'If-None-Match': etag})
+        if response.status_code != 304 or queries:
+            print(f"❌ خطأ: 304 متوقع دون استعلامات - الحالة {response.status_code}، الاستعلامات {len(queries)}")
+            exit(1)
+    finally:
+        pooled.set_trace_callback(None)
+        api_server.db_pool.release(pooled)
+    print(f"✅ If-None-Match يُرجع 304 دون أي استعلام (ETag: {etag})")
+
+    # 304 لنسخة مضغوطة يحمل ETag الترميز نفسه و Vary: Accept-Encoding
+    response = client.get('/api/page/1', headers={'Accept-Encoding': 'gzip'})
+    gzip_etag = response.headers.get('ETag')
+    response = client.get('/api/page/1', headers={'Accept-Encoding': 'gzip', 'If-None-Match': gzip_etag})
+    if (response.status_code != 304 or response.headers.get('ETag') != gzip_etag
+            or 'Accept-Encoding' not in response.headers.get('Vary', '')):
+        print(f"❌ خطأ: 304 للنسخة المضغوطة - ETag {response.headers.get('ETag')} بدل {gzip_etag}، "
+              f"Vary: {response.headers.get('Vary')}")
+        exit(1)
+    print(f"✅ 304 يُعيد الـ ETag المطابق ({gzip_etag}) مع Vary: Accept-Encoding")
+
+    # تغيير شكل الاستجابات (API_VERSION) يُبطل ETag القديم حتى دون تغيّر البيانات
+    api_version = api_server.API_VERSION
+    api_server.API_VERSION = f'{api_version}.test'
+    api_server._dataset.clear()
+    try:
+        response = client.get('/api/page/1', headers={'If-None-Match': etag})
+        if response.status_code != 200 or response.headers.get('ETag') == etag:
+            print(f"❌ خطأ: ETag لم يتغير مع API_VERSION - الحالة {response.status_code}")
+            exit(1)
+    finally:
+        api_server.API_VERSION = api_version
+        api_server._dataset.clear()
+    print("✅ تغيير API_VERSION يُبطل ETag القديم")
+
+    # توقيتات غير مرتبة (كما في بعض المصادر): طول صفري، بداية بعد النهاية، بداية مكررة وأخرى متراجعة
+    timings = api_server.SuraTimings(1, [
+        (1, 0, 5000), (2, 5000, 5000), (3, 5000, 9000), (4, 12000, 9500),
+        (5, 9500, 11000), (6, 11000, 14000), (7, 11000, 13000), (8, 14000, None),
+    ])
+    starts = list(timings.start_ms)
+    if starts != sorted(set(starts)) or list(timings.aya_no) != [1, 3, 5, 6]:
+        print(f"❌ خطأ: بدايات التوقيتات غير متزايدة تماماً ({list(timings.aya_no)}: {starts})")
+        exit(1)
+    expected = {0: 1, 4999: 1, 5000: 3, 9499: 3, 9500: 5, 11000: 6, 20000: 6}
+    found = {ms: timings.aya_no[timings.index_at(ms)] for ms in expected}
+    if found != expected or timings.index_at(-1) != -1:
+        print(f"❌ خطأ: البحث الثنائي في التوقيتات أعاد {found}")
+        exit(1)
+    compact = api_server.compact_timings(1, 1, timings)
+    if any(delta <= 0 for delta in compact['start_ms'][1:]):
+        print(f"❌ خطأ: الصيغة المضغوطة ببدايات غير متزايدة {compact['start_ms']}")
+        exit(1)
+    print("✅ التوقيتات غير المرتبة تُصحَّح إلى بدايات متزايدة تماماً (الخادم والصيغة المضغوطة)")
+
+    # قارئ غير موجود: 404 بكل الصيغ
+    for path in ('/api/timings/999999/2', '/api/timings/999999/2?format=compact', '/api/timings/999999/2/at?ms=0'):
+        response = client.get(path)
+        if response.status_code != 404:
+            print(f"❌ خطأ: {path} - الحالة {response.status_code} بدل 404")
+            exit(1)
+    print("✅ توقيتات قارئ غير موجود تُرجع 404 بكل الصيغ")
+
+    # التصدير: رمز استئناف لبيانات أخرى أو تصفية رواية غير مدعومة تُرفض لا تُتجاهل
+    response = client.get('/api/export/timings?limit=2')
+    cursor = response.headers.get('X-Next-Cursor')
+    response.close()
+    for path in (f'/api/export/ayat?cursor={cursor}', f'/api/export/timings?cursor={cursor}&riwayah=warsh',
+                 '/api/export/tafseer?riwayah=warsh'):
+        response = client.get(path)
+        if response.status_code != 400:
+            print(f"❌ خطأ: {path} - الحالة {response.status_code} بدل 400")
+            exit(1)
+    response = client.get(f'/api/export/timings?cursor={cursor}&limit=2')
+    if response.status_code != 200 or len(response.get_data().splitlines()) != 2:
+        print(f"❌ خطأ: الاستئناف برمز صالح - الحالة {response.status_code}")
+        exit(1)
+    print("✅ التصدير يرفض رمز استئناف لبيانات أخرى وتصفية رواية غير مدعومة")
+
+    # طلب فرعي غير صالح وحده في مجموعته يُرجع 400 له فقط لا خطأ 500 للدفعة كلها
+    for requests in ([{'type': 'ayah', 'sura': 2}],
+                     [{'type': 'ayah', 'sura': 2}, {'type': 'ayah', 'sura': 2, 'aya': 255}]):
+        response = client.post('/api/batch', json={'requests': requests})
+        statuses = [part['status'] for part in response.get_json()['responses']] if response.status_code == 200 else []
+        if statuses != [400, 200][:len(requests)]:
+            print(f"❌ خطأ: /api/batch بطلب فرعي غير صالح - الحالة {response.status_code} {statuses}")
+            exit(1)
+    print("✅ الطلبات الفرعية غير الصالحة في /api/batch تُرجع 400 لكل منها")
+
+    # الذاكرة المضغوطة للمسارات المتكررة فقط، ومعاملات الاستعلام الأخرى لا تُنشئ نسخاً جديدة
+    api_server.compressed_store.clear()
+    for path in ('/api/tafseer/2', '/api/tafseer/2?x=1', '/api/tafseer/2?x=2', '/api/surahs', '/api/surahs?x=1'):
+        response = client.get(path, headers={'Accept-Encoding': 'gzip'})
+        if response.status_code != 200 or response.content_encoding != 'gzip':
+            print(f"❌ خطأ: {path} دون ضغط - الحالة {response.status_code}")
+            exit(1)
+    entries = api_server.compressed_store.stats()['entries']
+    if entries != 1:
+        print(f"❌ خطأ: الذاكرة المضغوطة تحتوي {entries} نسخة بدل 1")
+        exit(1)
+    print("✅ الذاكرة المضغوطة تُخزّن المسارات المتكررة فقط بمفتاح معاملاتها المعروفة")
+
+# اختبار قياس SQLite: المرور على المؤشر محسوب، و trace إضافي لا يلغي عدّاد العبارات
+import metrics
+
+conn = sqlite3.connect(str(db_path), factory=metrics.TimedConnection)
+traced = []
+conn.set_trace_callback(traced.append)
+metrics._reset_request_counters()
+cursor = conn.cursor()
+cursor.execute("SELECT text FROM ayat")
+seconds = metrics._local.seconds
+rows = sum(1 for _ in cursor)
+if metrics._local.seconds <= seconds or not rows:
+    print("❌ خطأ: المرور على المؤشر غير محسوب في زمن SQLite")
+    exit(1)
+if not traced or metrics._local.statements != len(traced):
+    print(f"❌ خطأ: trace إضافي ألغى عدّاد العبارات ({metrics._local.statements} مقابل {len(traced)})")
+    exit(1)
+conn.close()
+print(f"✅ قياس SQLite يشمل المرور على المؤشر ({rows} صف) و trace إضافي لا يلغي العدّاد")
+
+# اختبار المجمّع: اتصال كل خيط يُغلق بانتهاء الخيط (خادم بخيط لكل طلب)
+import threading
+from db_pool import ConnectionPool
+
+pool = ConnectionPool(db_path)
+for _ in range(20):
+    worker = threading.Thread(target=lambda: pool.release(pool.acquire()))
+    worker.start()
+    worker.join()
+stats = pool.stats()
+if stats['opened'] != 20 or stats['open'] != 0:
+    print(f"❌ خطأ: اتصالات الخيوط المنتهية لم تُغلق ({stats})")
+    exit(1)
+pool.close_all()
+print("✅ اتصالات الخيوط المنتهية تُغلق تلقائياً")
+
+print("\n✅ كل شيء يعمل بشكل صحيح!")
+
@@ -0,0 +1,38 @@
+"""
+تطبيع النص العربي للبحث
+نفس قواعد normalize_sura_name و deep_normalize في final_smart_extract.py
+مع الإبقاء على المسافات بين الكلمات
+"""
+
+import re
+
+# التشكيل العادي + الألف الخنجرية
+_TASHKEEL = re.compile(r'[\u064B-\u065F\u0670]')
+# علامات الضبط الخاصة بالروايات (مثل ۬ و ۪ و ۖ وغيرها)
+_QURANIC_MARKS = re.compile(r'[\u06D6-\u06ED]')
+# السكون والشدة وغيرها
+_SIGNS = re.compile(r'[\u0610-\u061A]')
+
+# أشكال الألف والهمزة والألف المقصورة
+_LETTERS = str.maketrans({
+    'ٱ': 'ا',
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ء': 'ا',  # مهم لرواية ورش
+    'ؤ': 'و',
+    'ئ': 'ي',
+    'ى': 'ي',
+    'ـ': None,  # حرف التطويل
+})
+
+
+def normalize_arabic(text):
+    """تطبيع نص عربي: حذف التشكيل وتوحيد أشكال الألف والهمزة والياء"""
+    if not text:
+        return ''
+    text = _TASHKEEL.sub('', text)
+    text = _QURANIC_MARKS.sub('', text)
+    text = _SIGNS.sub('', text)
+    text = text.translate(_LETTERS)
+    return ' '.join(text.split())
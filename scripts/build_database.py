@@ -6,8 +6,15 @@ import sqlite3
 import json
 import csv
 import sys
+import argparse
+import hashlib
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+
+from arabic_normalize import normalize_arabic
+from dataset_stats import store_stats
+from word_index import store_words
+import font_subsets
 
 sys.stdout.reconfigure(encoding='utf-8')
 
@@ -105,6 +112,8 @@ def create_database():
             type TEXT NOT NULL,
             text TEXT NOT NULL,
             aya_numbers TEXT,
+            aya_first INTEGER,
+            aya_last INTEGER,
             riwayah_key TEXT NOT NULL,
             FOREIGN KEY (riwayah_key) REFERENCES riwayat(key)
         )
@@ -218,17 +227,52 @@ def create_database():
         )
     ''')
     
+    # جدول البيانات الوصفية (إصدار البيانات وتاريخ البناء)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    
     # إنشاء الفهارس
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ayat_sura ON ayat(sura_no, riwayah_key)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ayat_page ON ayat(page, riwayah_key)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_lines_page ON lines(page, riwayah_key)')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lines_ayah
+        ON lines(riwayah_key, sura_no, aya_last, page, line_number)
+    ''')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_tafseer_sura ON tafseer(sura_no, aya_no)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_translations_sura ON translations(sura_no, aya_no, language)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_timings ON ayah_timings(reciter_id, sura_no)')
+    create_query_indexes(conn)
     
     conn.commit()
     return conn
 
+# فهارس استعلامات API: أعمدة التصفية ثم أعمدة ORDER BY حتى لا يلزم ترتيب مؤقت
+# (يتحقق منها demo/check_query_plans.py)
+QUERY_INDEXES = {
+    'idx_ayat_sura_order': 'ayat(sura_no, riwayah_key, aya_no)',
+    'idx_ayat_page_order': 'ayat(page, riwayah_key, sura_no, aya_no)',
+    'idx_ayat_riwayah': 'ayat(riwayah_key, sura_no, aya_no)',
+    # ترقيم التصدير حسب الرواية (id > ? ORDER BY id)
+    'idx_ayat_riwayah_id': 'ayat(riwayah_key, id)',
+    'idx_lines_page_order': 'lines(page, riwayah_key, line_number)',
+    'idx_lines_riwayah_id': 'lines(riwayah_key, id)',
+    'idx_reciters_riwayah': 'reciters(riwayah_key)',
+    'idx_timings_order': 'ayah_timings(reciter_id, sura_no, aya_no)',
+}
+
+# فهارس سابقة أصبحت بادئة لفهارس أعلاه
+SUPERSEDED_INDEXES = ('idx_ayat_sura', 'idx_ayat_page', 'idx_lines_page', 'idx_timings')
+
+def create_query_indexes(conn):
+    """إنشاء فهارس استعلامات API وحذف الفهارس التي حلت محلها"""
+    for name in SUPERSEDED_INDEXES:
+        conn.execute(f'DROP INDEX IF EXISTS {name}')
+    for name, definition in QUERY_INDEXES.items():
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {definition}')
+    conn.commit()
+    return f"{len(QUERY_INDEXES)} فهرس"
+
 def import_riwayat(conn):
     """استيراد معلومات الروايات"""
     cursor = conn.cursor()
@@ -281,6 +325,12 @@ def import_ayat(conn, riwayah_key, json_path):
     conn.commit()
     return len(data)
 
+def aya_range(aya_numbers):
+    """تحويل قائمة أرقام الآيات في السطر إلى (أول آية، آخر آية)"""
+    if not aya_numbers:
+        return None, None
+    return min(aya_numbers), max(aya_numbers)
+
 def import_lines(conn, riwayah_key, lines_path):
     """استيراد الأسطر من ملف JSON"""
     cursor = conn.cursor()
@@ -288,23 +338,30 @@ def import_lines(conn, riwayah_key, lines_path):
     with open(lines_path, 'r', encoding='utf-8') as f:
         data = json.load(f)
     
+    rows = []
     for line in data:
-        aya_numbers = json.dumps(line.get('aya_numbers', []))
-        cursor.execute('''
-            INSERT INTO lines 
-            (page, line_number, sura_no, sura_name, type, text, aya_numbers, riwayah_key)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        aya_numbers = line.get('aya_numbers', [])
+        # أرقام الآيات في السطر متتالية دائماً: يكفي تخزين الأولى والأخيرة
+        aya_first, aya_last = aya_range(aya_numbers)
+        rows.append((
             line['page'],
             line.get('line', 0),
             line.get('sura_no', 0),
             line.get('sura', ''),
             line.get('type', 'ayat'),
             line['text'],
-            aya_numbers,
+            json.dumps(aya_numbers),
+            aya_first,
+            aya_last,
             riwayah_key
         ))
     
+    cursor.executemany('''
+        INSERT INTO lines 
+        (page, line_number, sura_no, sura_name, type, text, aya_numbers, aya_first, aya_last, riwayah_key)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+    
     conn.commit()
     return len(data)
 
@@ -564,7 +621,183 @@ def import_reciters(conn):
     conn.commit()
     return reciters_count, timings_count
 
-def main():
+def build_search_index(conn):
+    """بناء فهرس البحث النصي FTS5 على النص الإملائي المُطبَّع لكل الروايات"""
+    cursor = conn.cursor()
+    
+    # فهرس بلا محتوى: rowid = ayat.id والنص الأصلي يُقرأ من جدول الآيات
+    cursor.execute('DROP TABLE IF EXISTS ayat_fts')
+    cursor.execute('''
+        CREATE VIRTUAL TABLE ayat_fts USING fts5(
+            text,
+            riwayah,
+            content='',
+            tokenize='unicode61'
+        )
+    ''')
+    
+    cursor.execute('SELECT id, text, text_emlaey, riwayah_key FROM ayat')
+    rows = [
+        (ayah_id, normalize_arabic(text_emlaey or text), riwayah_key)
+        for ayah_id, text, text_emlaey, riwayah_key in cursor.fetchall()
+    ]
+    cursor.executemany(
+        'INSERT INTO ayat_fts (rowid, text, riwayah) VALUES (?, ?, ?)', rows
+    )
+    cursor.execute("INSERT INTO ayat_fts (ayat_fts) VALUES ('optimize')")
+    
+    conn.commit()
+    return len(rows)
+
+def dataset_sources():
+    """ملفات المصدر المستوردة (الموجودة فقط) بترتيب ثابت"""
+    paths = list(RIWAYAT_LINES.values())
+    paths += sorted(str(p) for p in Path('data/quran_index').glob('*.json'))
+    paths += sorted(str(p) for p in Path('data/audio_recitations').glob('*/*.json'))
+    paths += ['english_saheeh.csv']
+    return [p for p in paths if Path(p).exists()]
+
+def store_dataset_version(conn):
+    """حساب إصدار البيانات (بصمة المصادر والمخطط) وتخزينه في جدول metadata"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metadata (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    
+    digest = hashlib.sha256()
+    for path in dataset_sources():
+        digest.update(path.encode('utf-8'))
+        digest.update(Path(path).read_bytes())
+    
+    # الآيات والتفسير مصدرهما بيانات أصلية غير موجودة في المستودع: نأخذ بصمة محتواهما
+    for table, columns in (('ayat', 'riwayah_key, sura_no, aya_no, page, juz, text, text_emlaey'),
+                           ('tafseer', 'sura_no, aya_no, tafseer_text')):
+        for row in cursor.execute(f'SELECT {columns} FROM {table} ORDER BY id'):
+            digest.update(repr(row).encode('utf-8'))
+    
+    # ملفات الخطوط المجزأة (بصمتها في أسمائها) تظهر في /api/fonts
+    if table_exists(conn, 'font_subsets'):
+        for row in cursor.execute('SELECT riwayah_key, unit, number, file FROM font_subsets ORDER BY 1, 2, 3'):
+            digest.update(repr(row).encode('utf-8'))
+    
+    # أي تغيير في المخطط (ترحيل جديد) يغيّر الإصدار أيضاً
+    for row in cursor.execute("SELECT name, sql FROM sqlite_master WHERE name != 'metadata' ORDER BY name"):
+        digest.update(repr(row).encode('utf-8'))
+    
+    version = digest.hexdigest()[:16]
+    built_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    cursor.executemany('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', [
+        ('dataset_version', version),
+        ('built_at', built_at),
+    ])
+    
+    conn.commit()
+    return version
+
+def build_font_subsets(conn):
+    """بناء خطوط المصحف المجزأة لكل جزء (تُتخطى إذا لم تكن fontTools مثبتة)"""
+    if not font_subsets.available():
+        return "تم التخطي: fontTools غير مثبتة (pip install fonttools brotli)"
+    count = font_subsets.store_font_subsets(conn)
+    return f"{count} خط مجزأ"
+
+# ==================== ترحيل قاعدة بيانات موجودة ====================
+
+def column_exists(conn, table, column):
+    """التحقق من وجود عمود في جدول"""
+    cursor = conn.execute(f'PRAGMA table_info({table})')
+    return any(row[1] == column for row in cursor.fetchall())
+
+def table_exists(conn, table):
+    """التحقق من وجود جدول"""
+    cursor = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return cursor.fetchone() is not None
+
+def migrate_lines_aya_range(conn):
+    """تحويل aya_numbers (نص JSON) إلى العمودين aya_first و aya_last"""
+    cursor = conn.cursor()
+    
+    for column in ('aya_first', 'aya_last'):
+        if not column_exists(conn, 'lines', column):
+            cursor.execute(f'ALTER TABLE lines ADD COLUMN {column} INTEGER')
+    
+    cursor.execute('''
+        UPDATE lines SET
+            aya_first = (SELECT MIN(value) FROM json_each(lines.aya_numbers)),
+            aya_last = (SELECT MAX(value) FROM json_each(lines.aya_numbers))
+        WHERE aya_numbers IS NOT NULL AND json_valid(aya_numbers)
+    ''')
+    updated = cursor.rowcount
+    
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_lines_ayah
+        ON lines(riwayah_key, sura_no, aya_last, page, line_number)
+    ''')
+    
+    conn.commit()
+    return updated
+
+# مراحل الترحيل بالترتيب - تعمل على قاعدة بيانات موجودة دون إعادة البناء
+MIGRATIONS = [
+    ('أرقام الآيات في الأسطر', migrate_lines_aya_range),
+    ('فهرس البحث النصي', build_search_index),
+    ('جدول الكلمات', store_words),
+    ('جدول الإحصائيات', store_stats),
+    ('فهارس الاستعلامات', create_query_indexes),
+    # يجب أن يبقى آخر مرحلة: الإصدار يشمل المخطط بعد الترحيل
+    ('إصدار البيانات', store_dataset_version),
+]
+
+# مرحلة اختيارية بطيئة (دقائق): تُشغَّل مع --fonts فقط قبل مرحلة الإصدار
+FONT_MIGRATION = ('الخطوط المجزأة', build_font_subsets)
+
+def migrate(fonts=False):
+    """ترحيل قاعدة البيانات الموجودة إلى المخطط الحالي"""
+    print("=" * 70)
+    print("ترحيل قاعدة بيانات القرآن الكريم")
+    print("=" * 70)
+    
+    if not Path(DATABASE_PATH).exists():
+        print(f"\n   ⚠ قاعدة البيانات غير موجودة: {DATABASE_PATH}")
+        return
+    
+    migrations = MIGRATIONS[:-1] + ([FONT_MIGRATION] if fonts else []) + MIGRATIONS[-1:]
+    conn = sqlite3.connect(DATABASE_PATH)
+    for i, (label, migration) in enumerate(migrations, 1):
+        print(f"\n{i}. {label}...")
+        result = migration(conn)
+        print(f"   ✓ {result}")
+    conn.close()
+    
+    print("\n" + "=" * 70)
+    print("تم الترحيل بنجاح!")
+    print("=" * 70)
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="بناء قاعدة بيانات القرآن الكريم متعدد الروايات"
+    )
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="ترحيل قاعدة البيانات الموجودة بدلاً من إعادة بنائها"
+    )
+    parser.add_argument(
+        "--database",
+        default=DATABASE_PATH,
+        help="مسار ملف قاعدة البيانات"
+    )
+    parser.add_argument(
+        "--fonts",
+        action="store_true",
+        help="بناء الخطوط المجزأة أيضاً (يتطلب fontTools ويستغرق دقائق)"
+    )
+    return parser
+
+def main(fonts=False):
     print("=" * 70)
     print("بناء قاعدة بيانات القرآن الكريم متعدد الروايات")
     print("=" * 70)
@@ -632,6 +865,33 @@ def main():
     print(f"   ✓ {reciters_count} قارئ")
     print(f"   ✓ {timings_count} توقيت")
     
+    # بناء فهرس البحث
+    print("\n7. بناء فهرس البحث النصي...")
+    search_count = build_search_index(conn)
+    print(f"   ✓ {search_count} آية مفهرسة")
+    
+    # الكلمات (لـ /api/concordance)
+    print("\n8. بناء جدول الكلمات...")
+    words_count = store_words(conn)
+    print(f"   ✓ {words_count} كلمة")
+    
+    # الإحصائيات (لـ /api/stats دون COUNT في كل طلب)
+    print("\n9. حساب الإحصائيات...")
+    stats_count = store_stats(conn)
+    print(f"   ✓ {stats_count} إحصائية")
+    
+    # خطوط المصحف المجزأة (لـ /api/fonts)
+    print("\n10. بناء الخطوط المجزأة...")
+    if fonts:
+        print(f"   ✓ {build_font_subsets(conn)}")
+    else:
+        print("   تم التخطي (--fonts لبنائها، أو scripts/font_subsets.py)")
+    
+    # إصدار البيانات (لـ ETag في الخادم)
+    print("\n11. حساب إصدار البيانات...")
+    version = store_dataset_version(conn)
+    print(f"   ✓ {version}")
+    
     # إغلاق الاتصال
     conn.close()
     
@@ -646,5 +906,10 @@ def main():
     print(f"\n   تاريخ الإنشاء: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
 
 if __name__ == "__main__":
-    main()
+    args = build_arg_parser().parse_args()
+    DATABASE_PATH = args.database
+    if args.migrate:
+        migrate(args.fonts)
+    else:
+        main(args.fonts)
 
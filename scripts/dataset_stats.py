@@ -0,0 +1,84 @@
+"""
+إحصائيات قاعدة البيانات
+تُحسب مرة واحدة عند البناء في جدول dataset_stats ويقرؤها الخادم باستعلام واحد
+"""
+
+# الإحصائيات الإجمالية (نفس مفاتيح /api/stats)
+TOTAL_QUERIES = {
+    'riwayat_count': 'SELECT COUNT(*) FROM riwayat',
+    'total_ayat': 'SELECT COUNT(*) FROM ayat',
+    'total_lines': 'SELECT COUNT(*) FROM lines',
+    'tafseer_count': 'SELECT COUNT(*) FROM tafseer',
+    'translations_count': 'SELECT COUNT(*) FROM translations',
+    'reciters_count': 'SELECT COUNT(DISTINCT reciter_id) FROM reciters',
+    'timings_count': 'SELECT COUNT(*) FROM ayah_timings',
+}
+
+# الإحصائيات لكل رواية: (المفتاح، الاسم، القيمة)
+RIWAYAH_QUERY = '''
+    SELECT riwayah_key, 'ayat', COUNT(*) FROM ayat GROUP BY riwayah_key
+    UNION ALL
+    SELECT riwayah_key, 'lines', COUNT(*) FROM lines GROUP BY riwayah_key
+    UNION ALL
+    SELECT riwayah_key, 'reciters', COUNT(DISTINCT reciter_id) FROM reciters GROUP BY riwayah_key
+    UNION ALL
+    SELECT r.riwayah_key, 'timings', COUNT(*)
+    FROM ayah_timings t
+    JOIN reciters r ON r.reciter_id = t.reciter_id AND r.moshaf_id = t.moshaf_id
+    GROUP BY r.riwayah_key
+'''
+
+# الإحصائيات لكل قارئ: (المفتاح، الاسم، القيمة)
+RECITER_QUERY = '''
+    SELECT reciter_id, 'moshafs', COUNT(*) FROM reciters GROUP BY reciter_id
+    UNION ALL
+    SELECT reciter_id, 'suras', COUNT(DISTINCT moshaf_id || ':' || sura_no) FROM ayah_timings GROUP BY reciter_id
+    UNION ALL
+    SELECT reciter_id, 'timings', COUNT(*) FROM ayah_timings GROUP BY reciter_id
+'''
+
+
+def compute_stats(conn):
+    """حساب كل الإحصائيات كصفوف (النطاق، المفتاح، الاسم، القيمة)"""
+    rows = [
+        ('total', '', name, conn.execute(sql).fetchone()[0])
+        for name, sql in TOTAL_QUERIES.items()
+    ]
+    rows += [('riwayah', str(key), name, value) for key, name, value in conn.execute(RIWAYAH_QUERY)]
+    rows += [('reciter', str(key), name, value) for key, name, value in conn.execute(RECITER_QUERY)]
+    return rows
+
+
+def stats_payload(rows):
+    """تحويل صفوف الإحصائيات إلى استجابة /api/stats"""
+    payload = {}
+    breakdowns = {'riwayah': {}, 'reciter': {}}
+    for scope, key, name, value in rows:
+        if scope == 'total':
+            payload[name] = value
+        elif scope in breakdowns:
+            breakdowns[scope].setdefault(key, {})[name] = value
+    payload['riwayat'] = breakdowns['riwayah']
+    payload['reciters'] = breakdowns['reciter']
+    return payload
+
+
+def store_stats(conn):
+    """حساب الإحصائيات وتخزينها في جدول dataset_stats"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dataset_stats (
+            scope TEXT NOT NULL,
+            key TEXT NOT NULL,
+            name TEXT NOT NULL,
+            value INTEGER NOT NULL,
+            PRIMARY KEY (scope, key, name)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('DELETE FROM dataset_stats')
+    rows = compute_stats(conn)
+    cursor.executemany(
+        'INSERT INTO dataset_stats (scope, key, name, value) VALUES (?, ?, ?, ?)', rows
+    )
+    conn.commit()
+    return len(rows)
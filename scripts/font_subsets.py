@@ -0,0 +1,248 @@
+"""
+خطوط مجزأة لكل جزء (أو صفحة) من خطوط المصحف
+يجمع نص أسطر كل وحدة ويحتفظ من خط الرواية بالرموز اللازمة لعرضها فقط (WOFF2)،
+ويسجّل في جدول font_subsets الملف والصفحات والحروف والرموز (glyphs) التي يغطيها
+
+يتطلب: pip install fonttools brotli
+
+الاستخدام:
+    python scripts/font_subsets.py
+    python scripts/font_subsets.py --unit page --riwayah warsh --jobs 4
+"""
+
+import argparse
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+try:
+    from fontTools import subset as ft_subset
+    from fontTools.ttLib import TTFont
+except ImportError:  # اختياري: المرحلة تُتخطى دونه
+    ft_subset = None
+
+try:
+    import brotli  # noqa: F401 - يستخدمه fontTools لضغط WOFF2
+    FLAVOR = 'woff2'
+except ImportError:
+    FLAVOR = 'woff'
+
+DATABASE_PATH = "quran_database.db"
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# خطوط الروايات الكاملة (المصدر)
+FONTS_DIR = ROOT_DIR / 'fonts'
+
+# مجلد الخطوط المجزأة (يقدّمه الخادم على /fonts/subsets/)
+SUBSETS_DIR = ROOT_DIR / 'demo' / 'fonts' / 'subsets'
+
+# الجزء: ملف واحد لعشرين صفحة بحجم قريب من حجم خط صفحة واحدة
+UNITS = ('juz', 'page')
+DEFAULT_UNIT = 'juz'
+
+# ميزات OpenType كلها (التشكيل والوصل وتموضع الحركات) حتى يطابق العرض الخط الكامل
+LAYOUT_FEATURES = ['*']
+
+# خطوط العملية الحالية (تُقرأ مرة واحدة لكل عملية)
+_font_data = {}
+
+
+def available():
+    return ft_subset is not None
+
+
+def create_table(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS font_subsets (
+            riwayah_key TEXT NOT NULL,
+            unit TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            first_page INTEGER NOT NULL,
+            last_page INTEGER NOT NULL,
+            file TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            glyph_count INTEGER NOT NULL,
+            glyphs TEXT NOT NULL,
+            codepoints TEXT NOT NULL,
+            PRIMARY KEY (riwayah_key, unit, number)
+        ) WITHOUT ROWID
+    ''')
+
+
+def unit_pages(conn, riwayah, unit):
+    """[(رقم الوحدة، أول صفحة، آخر صفحة)] للرواية"""
+    if unit == 'juz':
+        return conn.execute('''
+            SELECT number, start_page, end_page FROM juzs WHERE riwayah_key = ? ORDER BY number
+        ''', (riwayah,)).fetchall()
+    return [(page, page, page) for (page,) in conn.execute('''
+        SELECT DISTINCT page FROM lines WHERE riwayah_key = ? ORDER BY page
+    ''', (riwayah,))]
+
+
+def pages_text(conn, riwayah, first_page, last_page):
+    """نص كل الأسطر في مجال صفحات"""
+    rows = conn.execute('''
+        SELECT text FROM lines WHERE riwayah_key = ? AND page BETWEEN ? AND ?
+        ORDER BY page, line_number
+    ''', (riwayah, first_page, last_page))
+    return '\n'.join(row[0] or '' for row in rows)
+
+
+def encode_ranges(numbers):
+    """[0, 1, 2, 5, 7, 8] -> '0-2,5,7-8'"""
+    parts = []
+    start = previous = None
+    for n in sorted(numbers):
+        if previous is not None and n == previous + 1:
+            previous = n
+            continue
+        if start is not None:
+            parts.append(f'{start}-{previous}' if previous != start else str(start))
+        start = previous = n
+    if start is not None:
+        parts.append(f'{start}-{previous}' if previous != start else str(start))
+    return ','.join(parts)
+
+
+def subset_font(font_path, text):
+    """(بايتات الخط المجزأ، أرقام الرموز المحتفظ بها في الخط الأصلي)"""
+    data = _font_data.get(font_path)
+    if data is None:
+        data = _font_data[font_path] = Path(font_path).read_bytes()
+
+    # دون تحديث تاريخ التعديل: نفس النص ينتج نفس الملف (ونفس الاسم) في كل بناء
+    font = TTFont(io.BytesIO(data), recalcTimestamp=False)
+    glyph_ids = {name: gid for gid, name in enumerate(font.getGlyphOrder())}
+    options = ft_subset.Options()
+    options.layout_features = LAYOUT_FEATURES
+    subsetter = ft_subset.Subsetter(options)
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+
+    font.flavor = FLAVOR
+    out = io.BytesIO()
+    font.save(out)
+    return out.getvalue(), sorted(glyph_ids[name] for name in font.getGlyphOrder())
+
+
+def _subset_task(task):
+    font_path, text = task
+    # جداول لا يعرف fontTools تجزئتها (مثل TSIV) تُحذف مع تحذير لكل ملف
+    logging.getLogger('fontTools.subset').setLevel(logging.ERROR)
+    return subset_font(font_path, text)
+
+
+def build_subsets(conn, riwayah, font_path, unit=DEFAULT_UNIT, output_dir=SUBSETS_DIR, jobs=None):
+    """بناء خطوط الرواية المجزأة وإرجاع صفوف جدول font_subsets"""
+    units = unit_pages(conn, riwayah, unit)
+    texts = [pages_text(conn, riwayah, first, last) for _, first, last in units]
+
+    target = Path(output_dir) / riwayah
+    target.mkdir(parents=True, exist_ok=True)
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(_subset_task, [(str(font_path), text) for text in texts])
+        for (number, first, last), text, (data, glyphs) in zip(units, texts, results):
+            # اسم الملف هو بصمة المحتوى: يُخزَّن لدى العملاء دون انتهاء، والوحدات التي
+            # تستخدم نفس الحروف (أغلب الأجزاء) تشترك في ملف واحد يُحمَّل مرة واحدة
+            name = f'{unit}-{hashlib.sha256(data).hexdigest()[:12]}.{FLAVOR}'
+            if not (target / name).exists():
+                (target / name).write_bytes(data)
+            codepoints = ''.join(sorted(set(text) - {'\n'}))
+            rows.append((riwayah, unit, number, first, last, f'{riwayah}/{name}',
+                         len(data), len(glyphs), encode_ranges(glyphs), codepoints))
+
+    # حذف ملفات البناء السابق لنفس الوحدة
+    current = {Path(row[5]).name for row in rows}
+    for path in target.glob(f'{unit}-*'):
+        if path.name not in current:
+            path.unlink()
+    return rows
+
+
+def store_font_subsets(conn, riwayat=None, unit=DEFAULT_UNIT, jobs=None,
+                       fonts_dir=FONTS_DIR, output_dir=SUBSETS_DIR):
+    """بناء الخطوط المجزأة لكل الروايات وتسجيلها في جدول font_subsets"""
+    create_table(conn)
+    count = 0
+    for key, font_file in conn.execute('SELECT key, font_file FROM riwayat ORDER BY id').fetchall():
+        if riwayat and key not in riwayat:
+            continue
+        font_path = Path(fonts_dir) / (font_file or '')
+        if not font_file or not font_path.exists():
+            print(f"      ⚠ خط غير موجود للرواية {key}: {font_path}")
+            continue
+        rows = build_subsets(conn, key, font_path, unit, output_dir, jobs)
+        conn.execute('DELETE FROM font_subsets WHERE riwayah_key = ? AND unit = ?', (key, unit))
+        conn.executemany('INSERT INTO font_subsets VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        conn.commit()
+        full = font_path.stat().st_size
+        average = sum(row[6] for row in rows) / max(len(rows), 1)
+        files = len({row[5] for row in rows})
+        print(f"      ✓ {key}: {len(rows)} {unit} في {files} ملف "
+              f"({average / 1024:.0f} KB لكل ملف مقابل {full / 1024:.0f} KB للخط كاملاً)")
+        count += len(rows)
+    return count
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="بناء خطوط المصحف المجزأة لكل جزء أو صفحة"
+    )
+    parser.add_argument(
+        "--database",
+        default=DATABASE_PATH,
+        help="مسار ملف قاعدة البيانات"
+    )
+    parser.add_argument(
+        "--unit",
+        choices=UNITS,
+        default=DEFAULT_UNIT,
+        help="وحدة التجزئة"
+    )
+    parser.add_argument(
+        "--riwayah",
+        action="append",
+        help="رواية محددة (يمكن تكرارها)"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        help="عدد العمليات المتوازية"
+    )
+    parser.add_argument(
+        "--output",
+        default=str(SUBSETS_DIR),
+        help="مجلد الخطوط المجزأة"
+    )
+    return parser
+
+
+def main():
+    sys.stdout.reconfigure(encoding='utf-8')
+    args = build_arg_parser().parse_args()
+    if not available():
+        sys.exit("fontTools غير مثبتة: pip install fonttools brotli")
+
+    print("=" * 60)
+    print(f"بناء الخطوط المجزأة ({args.unit}، {FLAVOR})")
+    print("=" * 60)
+    conn = sqlite3.connect(args.database)
+    try:
+        count = store_font_subsets(conn, args.riwayah, args.unit, args.jobs, output_dir=args.output)
+    finally:
+        conn.close()
+    print(f"\n✅ {count} خط مجزأ في {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+تصدير البيانات كاملة بصيغة NDJSON (سجل JSON في كل سطر)
+الترقيم بمؤشر على المفتاح الأساسي (id > آخر id) بذاكرة ثابتة، مع رمز استئناف
+
+الاستخدام:
+    python scripts/ndjson_export.py ayat --riwayah warsh --output warsh.ndjson
+    python scripts/ndjson_export.py timings --output timings.ndjson --resume
+"""
+
+import argparse
+import base64
+import json
+import sqlite3
+import sys
+from pathlib import Path
+
+DATABASE_PATH = "quran_database.db"
+
+# البيانات القابلة للتصدير: الاسم -> الجدول (كلها بمفتاح أساسي id)
+DATASETS = {
+    'ayat': 'ayat',
+    'lines': 'lines',
+    'tafseer': 'tafseer',
+    'translations': 'translations',
+    'timings': 'ayah_timings',
+}
+
+# الجداول التي يمكن تصفيتها حسب الرواية
+RIWAYAH_TABLES = {'ayat', 'lines'}
+
+# عدد الصفوف المقروءة في كل استعلام
+BATCH_SIZE = 1000
+
+
+class ExportError(ValueError):
+    """طلب تصدير غير صالح"""
+
+
+class CursorError(ExportError):
+    """رمز استئناف غير صالح"""
+
+
+class FilterError(ExportError):
+    """تصفية لا تدعمها البيانات المطلوبة"""
+
+
+def dumps(row):
+    """سطر NDJSON واحد (UTF-8 مضغوط - نفس المخرجات من الخادم وسطر الأوامر)"""
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')) + '\n'
+
+
+def encode_cursor(dataset, after, riwayah=None):
+    """رمز استئناف: البيانات والتصفية وآخر id مُرسل"""
+    state = {'dataset': dataset, 'after': after}
+    if riwayah:
+        state['riwayah'] = riwayah
+    raw = json.dumps(state, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """فك رمز الاستئناف إلى (dataset, after, riwayah)"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        state = json.loads(raw)
+        dataset, after = state['dataset'], int(state['after'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise CursorError('Invalid cursor') from e
+    if dataset not in DATASETS:
+        raise CursorError('Invalid cursor')
+    return dataset, after, state.get('riwayah')
+
+
+def resolve_request(dataset, riwayah=None, cursor=None):
+    """(dataset, after, riwayah) من المعاملات ورمز الاستئناف، مع رفض التعارض بينها
+
+    رمز الاستئناف لا يستبدل البيانات أو الرواية المحددة صراحةً، وتصفية الرواية
+    لبيانات دون عمود رواية خطأ لا تجاهل.
+    """
+    after, riwayah = 0, riwayah or None
+    if cursor is not None:
+        cursor_dataset, after, cursor_riwayah = decode_cursor(cursor)
+        if dataset is not None and cursor_dataset != dataset:
+            raise CursorError(f"Cursor is for dataset '{cursor_dataset}', not '{dataset}'")
+        if riwayah is not None and riwayah != cursor_riwayah:
+            raise CursorError(f"Cursor is for riwayah '{cursor_riwayah}', not '{riwayah}'")
+        dataset, riwayah = cursor_dataset, cursor_riwayah
+    if riwayah and dataset not in RIWAYAH_TABLES:
+        raise FilterError(f"riwayah filter is only supported for {', '.join(sorted(RIWAYAH_TABLES))}")
+    return dataset, after, riwayah
+
+
+def where_clause(dataset, riwayah=None):
+    """شرط الصفحة التالية (id > ?) مع تصفية الرواية إن وُجدت"""
+    if riwayah and dataset in RIWAYAH_TABLES:
+        return 'id > ? AND riwayah_key = ?', (riwayah,)
+    return 'id > ?', ()
+
+
+def iter_rows(conn, dataset, after=0, riwayah=None, limit=None, batch_size=BATCH_SIZE):
+    """قراءة الصفوف على دفعات بعد id معين (لا OFFSET: كل دفعة تبدأ من الفهرس مباشرة)"""
+    where, extra = where_clause(dataset, riwayah)
+    sql = f'SELECT * FROM {DATASETS[dataset]} WHERE {where} ORDER BY id LIMIT ?'
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = batch_size if remaining is None else min(batch_size, remaining)
+        cursor = conn.execute(sql, (after, *extra, size))
+        columns = [c[0] for c in cursor.description]
+        rows = cursor.fetchall()
+        for row in rows:
+            yield dict(zip(columns, row))
+        if len(rows) < size:
+            return
+        after = rows[-1][columns.index('id')]
+        if remaining is not None:
+            remaining -= len(rows)
+
+
+def page_end(conn, dataset, after=0, riwayah=None, limit=BATCH_SIZE):
+    """آخر id في صفحة من limit صف إذا بقيت صفوف بعدها، وإلا None (من الفهرس فقط)"""
+    table = DATASETS[dataset]
+    where, extra = where_clause(dataset, riwayah)
+    row = conn.execute(
+        f'SELECT id FROM {table} WHERE {where} ORDER BY id LIMIT 1 OFFSET ?',
+        (after, *extra, limit - 1),
+    ).fetchone()
+    if row is None:
+        return None
+    more = conn.execute(
+        f'SELECT 1 FROM {table} WHERE {where} LIMIT 1', (row[0], *extra)
+    ).fetchone()
+    return row[0] if more else None
+
+
+def last_exported_id(path):
+    """(id آخر سطر مكتمل، حجم الملف حتى نهايته) - يقرأ نهاية الملف فقط"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, 2)
+        tail = b''
+        while position > 0:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+            # السطر المكتمل الأخير ينتهي بآخر '\n' (ما بعده سطر منقطع)
+            cut = tail.rfind(b'\n')
+            if cut == -1:
+                continue
+            start = tail.rfind(b'\n', 0, cut) + 1
+            if start > 0 or position == 0:
+                return json.loads(tail[start:cut])['id'], position + cut + 1
+    return 0, 0
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(
+        description="تصدير بيانات القرآن الكريم بصيغة NDJSON"
+    )
+    parser.add_argument(
+        "dataset",
+        nargs="?",
+        choices=sorted(DATASETS),
+        help="البيانات المطلوبة"
+    )
+    parser.add_argument(
+        "--database",
+        default=DATABASE_PATH,
+        help="مسار ملف قاعدة البيانات"
+    )
+    parser.add_argument(
+        "--riwayah",
+        help="تصفية حسب الرواية (ayat و lines فقط)"
+    )
+    parser.add_argument(
+        "--output",
+        help="ملف الإخراج (الافتراضي: المخرج القياسي)"
+    )
+    parser.add_argument(
+        "--cursor",
+        help="رمز استئناف من تصدير سابق"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="المتابعة من آخر سطر مكتمل في ملف الإخراج"
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        help="الحد الأقصى لعدد الصفوف"
+    )
+    return parser
+
+
+def main():
+    parser = build_arg_parser()
+    args = parser.parse_args()
+
+    try:
+        dataset, after, riwayah = resolve_request(args.dataset, args.riwayah, args.cursor)
+    except ExportError as e:
+        parser.error(str(e))
+    if dataset is None:
+        parser.error("dataset or --cursor is required")
+
+    output_path = Path(args.output) if args.output else None
+    mode = 'w'
+    if args.resume:
+        if output_path is None:
+            parser.error("--resume requires --output")
+        if output_path.exists():
+            after, size = last_exported_id(output_path)
+            # حذف السطر الأخير إذا انقطع في منتصفه
+            with open(output_path, 'r+b') as f:
+                f.truncate(size)
+            mode = 'a'
+
+    conn = sqlite3.connect(f"file:{Path(args.database).resolve().as_posix()}?mode=ro", uri=True)
+    out = open(output_path, mode, encoding='utf-8', newline='\n') if output_path else sys.stdout
+    count = 0
+    try:
+        for row in iter_rows(conn, dataset, after, riwayah, args.limit):
+            out.write(dumps(row))
+            after = row['id']
+            count += 1
+    finally:
+        if output_path:
+            out.close()
+        conn.close()
+
+    # ملخص على stderr حتى لا يختلط بمخرجات NDJSON
+    print(f"✓ {count} سجل من {dataset}", file=sys.stderr)
+    print(f"   رمز الاستئناف: {encode_cursor(dataset, after, riwayah)}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+جدول الكلمات (words) لفهرس التوافق
+يقسّم نص كل آية (الرسم العثماني والإملائي) إلى كلمات مع موضعها في الآية وشكلها المُطبَّع
+ومواضع حروفها في النصين، فتُجاب استعلامات الكلمات من الفهرس دون تقسيم النص عند الطلب
+"""
+
+import re
+
+from arabic_normalize import normalize_arabic
+
+# الكلمة: ما بين المسافات (ومنها المسافة غير المنقسمة قبل رقم الآية)
+_TOKEN = re.compile(r'\S+')
+
+
+def tokenize(text):
+    """[(الكلمة، البداية، النهاية)] - أرقام الآيات وعلامات مثل ۞ ليست كلمات"""
+    return [
+        (match.group(), match.start(), match.end())
+        for match in _TOKEN.finditer(text or '')
+        if any(ch.isalpha() for ch in match.group())
+    ]
+
+
+def ayah_words(text, text_emlaey):
+    """صفوف كلمات آية: (الموضع، الشكل المُطبَّع، بداية ونهاية الكلمة في النصين)
+
+    كلمات النصين تتقابل بالترتيب؛ إذا اختلف عددها تبقى مواضع النص الإملائي فارغة
+    ويُطبَّع الرسم العثماني بدلاً منه.
+    """
+    words = tokenize(text)
+    emlaey = tokenize(text_emlaey)
+    aligned = len(emlaey) == len(words)
+
+    rows = []
+    for position, (word, start, end) in enumerate(words, 1):
+        if aligned:
+            plain, emlaey_start, emlaey_end = emlaey[position - 1]
+        else:
+            plain, emlaey_start, emlaey_end = word, None, None
+        rows.append((position, normalize_arabic(plain), start, end, emlaey_start, emlaey_end))
+    return rows
+
+
+def store_words(conn):
+    """بناء جدول الكلمات وفهرسه من جدول الآيات وإرجاع عدد الكلمات"""
+    cursor = conn.cursor()
+    cursor.execute('DROP TABLE IF EXISTS words')
+    cursor.execute('''
+        CREATE TABLE words (
+            riwayah_key TEXT NOT NULL,
+            sura_no INTEGER NOT NULL,
+            aya_no INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            normalized TEXT NOT NULL,
+            text_start INTEGER NOT NULL,
+            text_end INTEGER NOT NULL,
+            emlaey_start INTEGER,
+            emlaey_end INTEGER,
+            PRIMARY KEY (riwayah_key, sura_no, aya_no, position)
+        ) WITHOUT ROWID
+    ''')
+
+    count = 0
+    rows = cursor.execute('SELECT riwayah_key, sura_no, aya_no, text, text_emlaey FROM ayat').fetchall()
+    for riwayah, sura, aya, text, text_emlaey in rows:
+        words = [(riwayah, sura, aya, *word) for word in ayah_words(text, text_emlaey)]
+        cursor.executemany('INSERT INTO words VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', words)
+        count += len(words)
+
+    # كل مواضع كلمة في رواية مرتبة حسب المصحف (أعمدة المفتاح الأساسي تُضاف للفهرس تلقائياً)
+    cursor.execute('CREATE INDEX idx_words_normalized ON words(riwayah_key, normalized)')
+
+    conn.commit()
+    return count